@@ -1,9 +1,14 @@
 # controller.py
 from flask import Blueprint, request, jsonify
+import os
+import sys
 import joblib
-import pandas as pd
-import networkx as nx
-import ast
+
+# Ajouter le répertoire racine du projet à sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from backend.data_analyst.inference import FastPredictor, MicroBatcher
+from backend.data_analyst.routing import get_engine
 
 # Création du Blueprint pour les prédictions
 prediction_bp = Blueprint('prediction', __name__)
@@ -11,31 +16,15 @@ prediction_bp = Blueprint('prediction', __name__)
 # Chargement du modèle et du scaler sauvegardés
 model = joblib.load('modele_trafic.joblib')
 scaler = joblib.load('scaler_trafic.joblib')
+# Prédiction sans DataFrame : ligne préallouée, standardisation et booster intégrés
+predictor = FastPredictor(model, scaler)
+# Micro-lots optionnels (PREDICT_BATCH_WAIT_MS=2) : les requêtes simultanées partagent une prédiction
+batch_wait_ms = os.environ.get('PREDICT_BATCH_WAIT_MS')
+inference = MicroBatcher(predictor, float(batch_wait_ms)) if batch_wait_ms else predictor
 
-def build_graph_from_csv():
-    """
-    Construit un graphe à partir d'un fichier CSV contenant les arcs.
-    Le fichier CSV 'couts_arcs.csv' doit comporter au moins les colonnes :
-      - 'Identifiant noeud amont'
-      - 'Identifiant noeud aval'
-      - 'cost'
-    Pour cet exemple, nous supposons que les coordonnées ne sont pas renseignées et nous
-    utilisons des valeurs fictives.
-    """
-    df_arcs = pd.read_csv('couts_arcs.csv', sep=';')
-    G = nx.Graph()
-    node_coords = {}
-    for idx, row in df_arcs.iterrows():
-        start = row['Identifiant noeud amont']
-        end = row['Identifiant noeud aval']
-        cost = row['cost']
-        # Pour cet exemple, nous attribuons des coordonnées fictives (à remplacer par vos données)
-        if start not in node_coords:
-            node_coords[start] = [0.0, 0.0]
-        if end not in node_coords:
-            node_coords[end] = [0.0, 0.0]
-        G.add_edge(start, end, weight=cost)
-    return G, node_coords
+# Graphe des arcs construit une fois au démarrage, rechargé quand 'couts_arcs.csv' change
+# (le fichier ne contient pas de coordonnées : routage par identifiant de nœud)
+arc_engine = get_engine('couts_arcs.csv', None)
 
 @prediction_bp.route('/predict', methods=['POST'])
 def predict():
@@ -70,15 +59,13 @@ def predict():
     if missing_keys:
         return jsonify({"error": f"Missing keys in input: {missing_keys}"}), 400
 
-    # Préparation des données pour la prédiction
-    feature_keys = ["Debit_Horaire", "Taux d'occupation", "Hour", "Weekday", "Month"]
-    input_data = {key: data[key] for key in feature_keys}
-    df_input = pd.DataFrame([input_data])
-    # Standardisation (le scaler doit avoir été entraîné avec exactement ces colonnes et dans ce même ordre)
-    df_scaled = scaler.transform(df_input)
-    prediction = model.predict(df_scaled)
-    predicted_distance = prediction[0][0]
-    predicted_emission = prediction[0][1]
+    # Features lues dans l'ordre du scaler, standardisées puis évaluées sans DataFrame
+    try:
+        prediction = inference.predict(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    predicted_distance = float(prediction[0])
+    predicted_emission = float(prediction[1])
     
     # Récupération des identifiants pour le routage
     routing_start = data["start_node"]
@@ -91,20 +78,16 @@ def predict():
         "routing_end_node": routing_end
     }
     
-    # Construire le graphe à partir du CSV des arcs
-    G, node_coords = build_graph_from_csv()
-    
-    try:
-        # Calcul de l'itinéraire optimisé par Dijkstra
-        path = nx.dijkstra_path(G, source=routing_start, target=routing_end, weight='weight')
-        total_route_cost = nx.dijkstra_path_length(G, source=routing_start, target=routing_end, weight='weight')
+    # Calcul de l'itinéraire optimisé par Dijkstra sur le graphe partagé
+    path, total_route_cost = arc_engine.shortest_path(routing_start, routing_end)
+    if path is not None:
         # Ici, pour l'estimation du CO2 le long du chemin, nous considérons
         # que la prédiction "predicted_emission" s'applique par segment (ou par arc)
         estimated_total_CO2 = predicted_emission * (len(path) - 1)
         
         response["optimized_path"] = path
         response["total_estimated_CO2"] = estimated_total_CO2
-    except nx.NetworkXNoPath:
+    else:
         response["optimized_path"] = []
         response["total_estimated_CO2"] = None
         response["route_error"] = "No path found between the provided nodes."
@@ -1,3 +1,4 @@
+import math
 import os
 import sys
 
@@ -10,7 +11,8 @@ import pyttsx3 # type: ignore
 import threading
 from huggingface_hub import InferenceClient  # type: ignore
 from backend.services.user_services import UserManager,User
-from backend.data_analyst.ML import predict_route
+from backend.data_analyst.cost_refresh import pricing_for
+from backend.data_analyst.routing import EDGE_COSTS_FILE, NODE_COORDS_FILE, get_engine
 
 
 import joblib
@@ -24,7 +26,13 @@ from sklearn.linear_model import LogisticRegression
 
 
 user = Blueprint('user', __name__)
+# Graphe routier construit une fois au démarrage et partagé par toutes les requêtes
+routing_engine = get_engine(EDGE_COSTS_FILE, NODE_COORDS_FILE)
 userService : UserManager = UserManager()
+# Nombre maximal de cases (origines x destinations) d'une matrice de coûts
+MAX_MATRIX_CELLS = 250_000
+# Modèle qui valorise les arcs selon le contexte du trajet (coûts historiques s'il est absent)
+PRICING_MODEL_FILE = 'best_model2.joblib'
 
 @user.route('/login', methods=['POST'])
 def login():
@@ -81,12 +89,83 @@ def assistant():
 
 
 
+def _departure(texte):
+    """Heure de départ lue dans la requête (None si absente) ; ValueError si elle est invalide."""
+    if texte is None:
+        return None
+    try:
+        departure = pd.Timestamp(texte)
+    except (TypeError, ValueError):
+        departure = pd.NaT
+    if pd.isna(departure):
+        raise ValueError(f"Invalid departure time: {texte}")
+    return departure
+
+
 @user.route('/routes', methods=['GET'])
 def get_routes():
     depart = (48.8600, 2.3200)
     arrivee = (48.8800, 2.3000)
-
-    # Appel de la fonction
-    routes = predict_route(depart, arrivee, model_file='best_model2.joblib')
+    # Heure de départ optionnelle (?departure=2025-03-17T08:00, heure de Paris sans fuseau) : contexte des coûts
+    try:
+        departure = _departure(request.args.get('departure'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Itinéraire calculé sur le graphe déjà chargé, valorisé par le modèle pour l'heure de départ
+    routes = routing_engine.route(depart, arrivee, departure=departure,
+                                  pricing=pricing_for(PRICING_MODEL_FILE, departure))
     print(routes)
-    return jsonify(routes)
\ No newline at end of file
+    return jsonify(routes)
+
+
+def _coordinates(valeur):
+    """Liste de (latitude, longitude) lue dans le JSON, ou None si le format est invalide ou non fini."""
+    if not isinstance(valeur, list):
+        return None
+    try:
+        coords = [(float(lat), float(lon)) for lat, lon in valeur]
+    except (TypeError, ValueError, OverflowError):
+        return None
+    # "nan" ou "inf" passent float() : ils sont rejetés comme radius_km
+    if not all(math.isfinite(lat) and math.isfinite(lon) for lat, lon in coords):
+        return None
+    return coords
+
+
+@user.route('/routes/matrix', methods=['POST'])
+def get_route_matrix():
+    # {"origins": [[lat, lon], ...], "destinations": [[lat, lon], ...], "co2": false, "radius_km": null,
+    #  "departure": null}
+    data = request.get_json(silent=True) or {}
+    origins, destinations = _coordinates(data.get('origins')), _coordinates(data.get('destinations'))
+    if origins is None or destinations is None:
+        return jsonify({"error": "origins and destinations must be lists of [lat, lon]"}), 400
+    if len(origins) * len(destinations) > MAX_MATRIX_CELLS:
+        return jsonify({"error": f"Matrix too large: at most {MAX_MATRIX_CELLS} origin/destination pairs"}), 400
+    radius_km = data.get('radius_km')
+    if radius_km is not None:
+        # Rayon fini et strictement positif : ni booléen, ni NaN, ni infini (ni entier hors des flottants)
+        try:
+            if isinstance(radius_km, bool) or not isinstance(radius_km, (int, float)):
+                raise ValueError
+            radius_km = float(radius_km)
+        except (ValueError, OverflowError):
+            return jsonify({"error": f"Invalid radius_km: {radius_km}"}), 400
+        if not math.isfinite(radius_km) or radius_km <= 0:
+            return jsonify({"error": f"Invalid radius_km: {radius_km}"}), 400
+
+    try:
+        departure = _departure(data.get('departure'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Coûts de toutes les paires en un appel : une recherche par nœud, pas par paire
+    try:
+        matrice = routing_engine.cost_matrix(origins, destinations, radius_km, co2=bool(data.get('co2')),
+                                             pricing=pricing_for(PRICING_MODEL_FILE, departure))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if matrice is None:
+        return jsonify({"error": "Route graph not loaded"}), 503
+    return jsonify(matrice)
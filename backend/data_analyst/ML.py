@@ -1,21 +1,48 @@
+import os
+import sys
 import pandas as pd
 import numpy as np
-import ast
+import time
 import joblib
-import networkx as nx
-from math import sqrt
 from xgboost import XGBRegressor
-from sklearn.model_selection import train_test_split, GridSearchCV
+from sklearn.base import clone
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401 (active HalvingGridSearchCV)
+from sklearn.model_selection import train_test_split, GridSearchCV, HalvingGridSearchCV
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import Pipeline
 from sklearn.metrics import r2_score, confusion_matrix, make_scorer
 
+# Ajouter le répertoire racine du projet à sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from backend.data_analyst.cost_refresh import EDGE_FEATURES_FILE, EdgeFeatureTable, pricing_for
+from backend.data_analyst.external_training import (BATCH_ROWS, evaluate_streaming, export_aux_csv,
+                                                    train_booster)
+from backend.data_analyst.feature_store import FEATURE_STORE_DIR, FeatureStore, code_fingerprint
+from backend.data_analyst.geo import SPATIAL_FEATURES, spatial_features
+from backend.data_analyst.instrumentation import RunReport
+from backend.data_analyst.routing import (EDGE_COSTS_FILE, NODE_COORDS_FILE, build_route_graph, closest_node,  # noqa: F401
+                                          find_route, get_engine)
+from backend.data_analyst.schema import parse_timestamps
+from backend.data_analyst.time_costs import TimeDependentCosts, arc_means, time_costs_path
+from backend.data_analyst.storage import (ARC_KEY, find_arcs_table, iter_traffic, load_arc_table, read_traffic,
+                                          resolve_traffic_path)
+from backend.data_analyst.weather import WEATHER_FEATURES, WeatherIndex
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Colonnes des comptages horaires utilisées par l'entraînement
+TRAIN_COLUMNS = [ARC_KEY, 'Date et heure de comptage', 'Debit_Horaire', "Taux d'occupation",
+                 'Etat trafic', 'Emission_CO2']
+# Colonnes de la table des arcs (une ligne par arc)
+ARC_TRAIN_COLUMNS = [ARC_KEY, 'Identifiant noeud amont', 'Identifiant noeud aval',
+                     'geo_shape', 'distance_arc']
+
 # --- Préparation des features temporelles
 
 def extract_time_features(df):
-    df['DateTime'] = pd.to_datetime(
-        df['Date et heure de comptage'], format='%Y-%m-%d %H:%M:%S', errors='coerce'
-    )
+    # Déjà en datetime64 avec read_traffic ; sinon chaque horodatage distinct n'est analysé qu'une fois
+    df['DateTime'] = parse_timestamps(df['Date et heure de comptage'])
     df['Hour'] = df['DateTime'].dt.hour.ffill()
     df['Weekday'] = df['DateTime'].dt.weekday.ffill()
     df['Month'] = df['DateTime'].dt.month.ffill()
@@ -30,15 +57,10 @@ def extract_time_features(df):
 # --- Préparation des features spatiales
 
 def extract_spatial_features(df):
-    def _euclid(row):
-        pts = ast.literal_eval(row['geo_shape'])
-        p0, p1 = pts[0], pts[-1]
-        return sqrt((p1[0] - p0[0])**2 + (p1[1] - p0[1])**2)
-    df['euclid_dist'] = df.apply(_euclid, axis=1)
-    df['start_lon'] = df['geo_shape'].apply(lambda s: ast.literal_eval(s)[0][0])
-    df['start_lat'] = df['geo_shape'].apply(lambda s: ast.literal_eval(s)[0][1])
-    df['end_lon'] = df['geo_shape'].apply(lambda s: ast.literal_eval(s)[-1][0])
-    df['end_lat'] = df['geo_shape'].apply(lambda s: ast.literal_eval(s)[-1][1])
+    # Une seule analyse vectorisée par géométrie distincte (une ligne par arc sur la table des arcs)
+    features = spatial_features(df['geo_shape'])
+    for col in SPATIAL_FEATURES:
+        df[col] = features[col].to_numpy()
     return df
 
 # --- Score de robustesse (<10% d'erreur relative)
@@ -49,106 +71,387 @@ def robust_score(y_true, y_pred):
 
 # --- Entraînement et évaluation du modèle
 
-def train_model():
+# Version de la définition des features : à incrémenter quand leur sens change sans que
+# le code de build_features ne change (par exemple une table de correspondance externe)
+FEATURE_VERSION = 5
+# Colonnes annexes gardées avec la matrice (exports node_coords.csv / edge_costs.csv / edge_costs.td.npz)
+EXPORT_COLUMNS = ['Identifiant noeud amont', 'Identifiant noeud aval',
+                  'start_lon', 'start_lat', 'end_lon', 'end_lat', 'cost', 'hour_of_week', 'Emission_CO2']
+# edge_costs.csv : une ligne par arc (les coûts par heure de la semaine sont dans edge_costs.td.npz)
+EDGE_COST_COLUMNS = ['Identifiant noeud amont', 'Identifiant noeud aval', 'cost', 'Emission_CO2']
+
+def edge_cost_table(batches, hourly_costs):
+    """
+    Table edge_costs.csv : une ligne par arc.
+
+    Le coût statique d'un arc est la moyenne de ses 168 heures de la semaine (chaque
+    heure pèse autant, quel que soit son nombre de comptages) ; un arc absent du
+    tenseur (comptages sans date) prend la moyenne de ses comptages. L'émission est
+    la moyenne des comptages.
+
+    Args:
+        batches: Lots (nœud amont, nœud aval, coût, émission) des comptages.
+        hourly_costs (TimeDependentCosts): Tenseur des coûts par heure de la semaine.
+    """
+    arcs, moyennes = arc_means(batches)
+    statiques = hourly_costs.static_for(arcs[:, 0], arcs[:, 1])
+    return pd.DataFrame({EDGE_COST_COLUMNS[0]: arcs[:, 0], EDGE_COST_COLUMNS[1]: arcs[:, 1],
+                         'cost': np.where(np.isnan(statiques), moyennes[:, 0], statiques),
+                         'Emission_CO2': moyennes[:, 1]})
+
+def prepare_feature_tables(data_path, weather_path, report):
+    """
+    Tables communes à toutes les lignes : features des arcs, index météo et stations des arcs.
+    """
+    # La géométrie n'est analysée qu'une fois par arc, puis jointe aux comptages
+    with report.stage('arc_features') as etape:
+        arcs = extract_spatial_features(load_arc_table(data_path, columns=ARC_TRAIN_COLUMNS))
+        etape.add_rows(rows_out=len(arcs))
+    with report.stage('weather_index') as etape:
+        meteo = WeatherIndex.from_csv(weather_path)
+        stations = meteo.arc_stations(arcs, ARC_KEY)
+        etape.details['stations'] = int(len(meteo.stations))
+        etape.add_rows(rows_out=len(meteo))
+    return arcs, meteo, stations
+
+def feature_frame(df, tables, report, medians=None):
+    """
+    Features, cible et colonnes annexes d'un ensemble de comptages (tout le jeu ou un lot).
+
+    Args:
+        df (DataFrame): Comptages (colonnes TRAIN_COLUMNS).
+        tables (tuple): Résultat de prepare_feature_tables.
+        medians (Series): Valeurs de remplacement des manquants (médianes de `df` par défaut).
+
+    Returns:
+        tuple: ((X DataFrame, y Series, colonnes annexes EXPORT_COLUMNS), médianes utilisées).
+    """
     alpha, beta = 0.5, 0.5
-    df = pd.read_csv(' F://pfa//pfaaaa//PFA-impcat-du-trafic-routier//backend//data_analyst//data_cleaned.csv', sep=';')
+    arcs, meteo, stations = tables
     df.columns = df.columns.str.strip()
-    mapping = {'Fluide':1.0,'Pre_sature':1.5,'Ouvert':1.2,'Invalide':2.0}
-    df['etat_factor'] = df['Etat trafic'].map(mapping)
-    df.fillna(df.median(numeric_only=True), inplace=True)
-    df = extract_time_features(df)
-    df = extract_spatial_features(df)
-    df['cost'] = (alpha * df['distance_arc'] + beta * df['Emission_CO2']) * df['etat_factor']
-
-    weather = pd.read_csv(' F://pfa//pfaaaa//PFA-impcat-du-trafic-routier//backend//data_analyst//data_weather_cleaned.csv', sep=';')
-    weather['Date'] = pd.to_datetime(weather['AAAAMMJJ'].astype(str), format='%Y%m%d').dt.date
-    weather = weather[['Date','RR','TN','TX','TM','FF2M','FXI2','DXI2','HXI2']]
-    weather.columns = ['Date','precip','temp_min','temp_max','temp_mean','wind_speed','wind_gust','gust_dir','humidex']
-    df['Date'] = df['DateTime'].dt.date
-    df = df.merge(weather, on='Date', how='left')
-    df.fillna(method='ffill', inplace=True)
+    with report.stage('arc_join', rows_in=len(df)):
+        df = df.merge(arcs, on=ARC_KEY, how='left')
+    with report.stage('time_features', rows_in=len(df)) as etape:
+        mapping = {'Fluide':1.0,'Pre_sature':1.5,'Ouvert':1.2,'Invalide':2.0}
+        df['etat_factor'] = df['Etat trafic'].map(mapping).astype('float32')
+        etape.count('filled_missing', df.isna().sum().sum())
+        if medians is None:
+            medians = df.median(numeric_only=True)
+        df.fillna(medians, inplace=True)
+        df = extract_time_features(df)
+        etape.count('date_failures', df['DateTime'].isna().sum())
+        df['cost'] = (alpha * df['distance_arc'] + beta * df['Emission_CO2']) * df['etat_factor']
+        # Tranche du tenseur des coûts horaires (0 = lundi 0h ; -1 sans date)
+        df['hour_of_week'] = (df['Weekday'] * 24 + df['Hour']).fillna(-1).astype('int16')
+
+    # Jointure « as-of » : dernier relevé de la station la plus proche de chaque arc, sans copie du tableau
+    with report.stage('weather_merge', rows_in=len(df)) as etape:
+        etape.count('rows_without_weather', meteo.attach(df, stations, ARC_KEY))
+        etape.add_rows(rows_out=len(df))
 
     features = ['Debit_Horaire', "Taux d'occupation", 'etat_factor', 'euclid_dist',
                 'sin_hour','cos_hour','sin_weekday','cos_weekday','sin_month','cos_month',
-                'precip','temp_min','temp_max','temp_mean','wind_speed','wind_gust','gust_dir','humidex']
+                *WEATHER_FEATURES]
     df['occ_x_hour'] = df["Taux d'occupation"] * df['sin_hour']
     df['occ_x_etat'] = df["Taux d'occupation"] * df['etat_factor']
-    features += ['occ_x_hour','occ_x_etat','start_lon','start_lat','end_lon','end_lat']
+    features += ['occ_x_hour','occ_x_etat','start_lon','start_lat','end_lon','end_lat',
+                 'chord_km','bearing_deg','length_km','sinuosity']
+    return (df[features], df['cost'], df[EXPORT_COLUMNS]), medians
+
+def build_features(data_path, weather_path, last_days=None, report=None):
+    """
+    Construit la matrice de features et la cible de l'entraînement.
+
+    Returns:
+        tuple: (X DataFrame, y Series, colonnes annexes EXPORT_COLUMNS).
+    """
+    report = report or RunReport('features')
+    with report.stage('read_facts') as etape:
+        df = read_traffic(data_path, columns=TRAIN_COLUMNS, last_days=last_days)
+        etape.add_rows(rows_out=len(df))
+    tables = prepare_feature_tables(data_path, weather_path, report)
+    print(f"Mémoire du jeu d'entraînement : {df.memory_usage(deep=True).sum() / 1e6:.1f} Mo")
+    return feature_frame(df, tables, report)[0]
+
+def iter_feature_batches(data_path, weather_path, last_days=None, batch_rows=500000, report=None):
+    """
+    Version par lots de build_features, en mémoire bornée.
+
+    Les manquants sont remplacés par les médianes du premier lot, gardées pour tous
+    les lots suivants (les médianes exactes demanderaient tout le jeu en mémoire).
+
+    Yields:
+        tuple: (X DataFrame, y Series, colonnes annexes EXPORT_COLUMNS) de chaque lot.
+    """
+    report = report or RunReport('features')
+    tables = prepare_feature_tables(data_path, weather_path, report)
+    medians = None
+    lots = iter_traffic(data_path, columns=TRAIN_COLUMNS, last_days=last_days, batch_rows=batch_rows)
+    while True:
+        with report.stage('read_facts') as etape:
+            df = next(lots, None)
+            etape.add_rows(rows_out=0 if df is None else len(df))
+        if df is None:
+            return
+        lot, medians = feature_frame(df, tables, report, medians)
+        yield lot
+
+def feature_version():
+    """Version des features : FEATURE_VERSION et empreinte du code qui les calcule."""
+    return f'{FEATURE_VERSION}-' + code_fingerprint(build_features, iter_feature_batches, feature_frame,
+                                                    prepare_feature_tables, extract_time_features,
+                                                    extract_spatial_features, spatial_features, WeatherIndex)
+
+def load_features(data_path, weather_path, last_days=None, feature_store=FEATURE_STORE_DIR, rebuild=False,
+                  batch_rows=None, report=None):
+    """
+    Jeu de features relu depuis le magasin, ou construit puis enregistré.
 
-    X = df[features]
-    y = df['cost']
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    Args:
+        batch_rows (int): Construction par lots de `batch_rows` lignes, en mémoire bornée
+            (iter_feature_batches) ; tout le jeu en mémoire si None.
 
+    Returns:
+        FeatureSet: X et y projetés en mémoire.
+    """
+    report = report or RunReport('features')
+    inputs = {'traffic': data_path, 'arcs': find_arcs_table(data_path), 'weather': weather_path}
+    if batch_rows:
+        construire = lambda: iter_feature_batches(data_path, weather_path, last_days, batch_rows, report)
+        # Les médianes de remplacement viennent du premier lot : elles dépendent de sa taille
+        params = {'last_days': last_days, 'batch_rows': batch_rows}
+    else:
+        construire = lambda: build_features(data_path, weather_path, last_days, report)
+        params = {'last_days': last_days}
+    with report.stage('feature_store') as etape:
+        jeu, relu = FeatureStore(feature_store).get_or_build(inputs, feature_version(), construire, params=params,
+                                                             rebuild=rebuild, batches=bool(batch_rows))
+        etape.count('hit' if relu else 'miss')
+        etape.add_rows(rows_out=len(jeu))
+    print(f"Features {'relues depuis' if relu else 'enregistrées dans'} '{jeu.path}'")
+    return jeu
+
+def load_streamed_features(data_path=None, weather_path=None, last_days=None, batch_rows=BATCH_ROWS,
+                           feature_store=FEATURE_STORE_DIR, rebuild=False, report=None):
+    """Jeu de features construit lot par lot (entraînement hors mémoire)."""
+    data_path = data_path or resolve_traffic_path(os.path.join(DATA_DIR, 'data_cleaned'))
+    weather_path = weather_path or os.path.join(DATA_DIR, 'data_weather_cleaned.csv')
+    return load_features(data_path, weather_path, last_days, feature_store, rebuild, batch_rows, report)
+
+# --- Recherche d'hyperparamètres
+
+PARAM_GRID = {
+    'model__n_estimators': [200, 500],
+    'model__max_depth': [10, 15],
+    'model__learning_rate': [0.05, 0.1]
+}
+# 'halving' : successive halving (tous les candidats sur un sous-échantillon, seuls les
+# meilleurs sur plus de lignes) ; 'grid' : grille complète sur toutes les lignes
+SEARCH_MODES = ('halving', 'grid')
+
+def thread_plan(n_fits, n_cores=None, model_threads=None):
+    """
+    Répartition des cœurs entre entraînements parallèles et threads de XGBoost.
+
+    Sans répartition explicite, chaque entraînement de la recherche lancé par joblib
+    prend tous les cœurs : n_jobs * n_cœurs threads se disputent la machine.
+
+    Args:
+        n_fits (int): Nombre d'entraînements indépendants disponibles en parallèle.
+        n_cores (int): Cœurs utilisables (tous par défaut).
+        model_threads (int): Threads par modèle (déduits de n_fits par défaut).
+
+    Returns:
+        tuple: (entraînements en parallèle, threads par modèle), produit <= n_cores.
+    """
+    n_cores = n_cores or os.cpu_count() or 1
+    if model_threads is None:
+        model_threads = max(1, n_cores // max(1, min(n_cores, n_fits)))
+    model_threads = min(model_threads, n_cores)
+    return max(1, n_cores // model_threads), model_threads
+
+def make_search(search='halving', n_cores=None, model_threads=None, cv=None):
+    """
+    Recherche d'hyperparamètres du pipeline (XGBoost, méthode 'hist').
+
+    Returns:
+        tuple: (objet de recherche scikit-learn non entraîné, paramètres d'exécution).
+    """
+    if search not in SEARCH_MODES:
+        raise ValueError(f"Mode de recherche inconnu : {search} (attendu : {', '.join(SEARCH_MODES)})")
+    cv = cv or (5 if search == 'grid' else 3)
+    n_candidats = int(np.prod([len(v) for v in PARAM_GRID.values()]))
+    n_jobs, threads = thread_plan(n_candidats * cv, n_cores, model_threads)
     pipeline = Pipeline([
         ('scaler', StandardScaler()),
-        ('model', XGBRegressor(objective='reg:squarederror', random_state=42))
+        ('model', XGBRegressor(objective='reg:squarederror', random_state=42, tree_method='hist', n_jobs=threads))
     ])
-    param_grid = {
-        'model__n_estimators': [200, 500],
-        'model__max_depth': [10, 15],
-        'model__learning_rate': [0.05, 0.1]
-    }
-    grid = GridSearchCV(
-        pipeline, param_grid, cv=5,
-        scoring=make_scorer(robust_score), refit=True,
-        n_jobs=-1, verbose=1
-    )
-    grid.fit(X_train, y_train)
-    model = grid.best_estimator_
-
-    y_train_pred = model.predict(X_train)
-    y_test_pred = model.predict(X_test)
-    print(f"R² train: {r2_score(y_train, y_train_pred):.4f}")
-    print(f"R² test : {r2_score(y_test, y_test_pred):.4f}")
-    print(f"Robustesse (<10%): {robust_score(y_test, y_test_pred)*100:.2f}%")
-
-    median_cost = y_test.median()
-    cm = confusion_matrix(
-        (y_test > median_cost).astype(int),
-        (y_test_pred > median_cost).astype(int)
-    )
-    print("Matrice de confusion (0=bas,1=haut):")
-    print(cm)
+    options = dict(cv=cv, scoring=make_scorer(robust_score), refit=False, n_jobs=n_jobs, verbose=1)
+    if search == 'grid':
+        recherche = GridSearchCV(pipeline, PARAM_GRID, **options)
+    else:
+        # Tiers des candidats conservé à chaque tour, sur trois fois plus de lignes
+        recherche = HalvingGridSearchCV(pipeline, PARAM_GRID, factor=3, resource='n_samples',
+                                        min_resources='exhaust', random_state=42, **options)
+    return recherche, {'search': search, 'cv': cv, 'n_jobs': n_jobs, 'model_threads': threads}
 
-    joblib.dump(model, 'best_model2.joblib')
-    df[['Identifiant noeud amont','Identifiant noeud aval',
-        'start_lon','start_lat','end_lon','end_lat']].to_csv('node_coords.csv', index=False)
-    df[['Identifiant noeud amont','Identifiant noeud aval','cost']].to_csv('edge_costs.csv', index=False)
+def _train_out_of_core(data_path, weather_path, last_days, feature_store, rebuild, batch_rows, n_cores, report):
+    """Entraînement hors mémoire (voir train_model) : seul un lot est chargé à la fois."""
+    jeu = load_features(data_path, weather_path, last_days, feature_store or FEATURE_STORE_DIR, rebuild,
+                        batch_rows, report)
+    model = train_booster(jeu, batch_rows=batch_rows, n_threads=n_cores, report=report)
+    resultats = evaluate_streaming(model, jeu, batch_rows, report)
+    print(f"R² train: {resultats['r2_train']:.4f}")
+    print(f"R² test : {resultats['r2_test']:.4f}")
+    print(f"Robustesse (<10%): {resultats['robust_test']*100:.2f}%")
+    print("Matrice de confusion (0=bas,1=haut):")
+    print(np.array(resultats['confusion']))
+    with report.stage('export', rows_in=len(jeu)):
+        joblib.dump(model, 'best_model2.joblib')
+        export_aux_csv(jeu, ['Identifiant noeud amont','Identifiant noeud aval',
+                             'start_lon','start_lat','end_lon','end_lat'], 'node_coords.csv', batch_rows)
+        def lots(colonnes):
+            return (tuple(jeu.aux[c][debut:debut + batch_rows] for c in colonnes)
+                    for debut in range(0, len(jeu), batch_rows))
+        horaires = TimeDependentCosts.from_batches(lots(EDGE_COST_COLUMNS[:2] + ['hour_of_week', 'cost']))
+        horaires.save(time_costs_path(EDGE_COSTS_FILE))
+        edge_cost_table(lots(EDGE_COST_COLUMNS), horaires).to_csv('edge_costs.csv', index=False)
+        EdgeFeatureTable.from_features(jeu, batch_rows).save(EDGE_FEATURES_FILE)
     return model
 
-# --- Prédiction d'itinéraire optimal
+def train_model(data_path=None, weather_path=None, last_days=None, report_file='train_model.run.json',
+                profile_stages=None, profiler='cprofile', profile_dir=None, feature_store=FEATURE_STORE_DIR,
+                rebuild_features=False, search='halving', n_cores=None, model_threads=None, out_of_core=False,
+                batch_rows=BATCH_ROWS):
+    """
+    Entraîne le modèle de coût des arcs.
+
+    Args:
+        data_path (str): Jeu Parquet ou CSV des données nettoyées (data_cleaned par défaut).
+        weather_path (str): CSV météo nettoyé.
+        last_days (int): N'entraîner que sur les `last_days` derniers jours (seules ces
+            partitions sont lues sur un jeu Parquet).
+        report_file (str): Rapport d'exécution JSON (durée, CPU, lignes et mémoire par étape).
+        profile_stages (list): Étapes à profiler ('grid_search', ... ou 'all').
+        profiler (str): 'cprofile' ou 'sampling'.
+        profile_dir (str): Répertoire des fichiers de profil.
+        feature_store (str): Magasin de features (None pour toujours recalculer). La
+            matrice est réutilisée tant que les entrées, la fenêtre de dates et le code
+            des features sont inchangés.
+        rebuild_features (bool): Force le recalcul des features.
+        search (str): 'halving' (successive halving, par défaut) ou 'grid' (grille complète).
+        n_cores (int): Cœurs utilisés par la recherche (tous par défaut).
+        model_threads (int): Threads XGBoost par entraînement (répartition automatique par défaut).
+        out_of_core (bool): Entraînement hors mémoire : features construites et lues par
+            lots de `batch_rows` lignes, DMatrix externe de XGBoost et évaluation par lots
+            (hyperparamètres EXTERNAL_PARAMS, sans recherche).
+        batch_rows (int): Lignes par lot en mode hors mémoire.
+    """
+    data_path = data_path or resolve_traffic_path(os.path.join(DATA_DIR, 'data_cleaned'))
+    weather_path = weather_path or os.path.join(DATA_DIR, 'data_weather_cleaned.csv')
+    report = RunReport('train', profile_stages=profile_stages, profiler=profiler, profile_dir=profile_dir,
+                       params={'data_path': data_path, 'weather_path': weather_path, 'last_days': last_days})
+    status, erreur = 'ok', None
+    try:
+        if out_of_core:
+            return _train_out_of_core(data_path, weather_path, last_days, feature_store, rebuild_features,
+                                      batch_rows, n_cores, report)
+        if feature_store:
+            jeu = load_features(data_path, weather_path, last_days, feature_store, rebuild_features, report=report)
+            X, y, annexes = jeu.X, jeu.y, jeu.frame(EXPORT_COLUMNS)
+            noms = jeu.feature_names
+        else:
+            X, y, annexes = build_features(data_path, weather_path, last_days, report)
+            noms = list(X.columns)
+            X, y = X.to_numpy(dtype=np.float32), y.to_numpy()
+
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-def predict_route(start_coord, end_coord, model_file='best_model2.joblib'):
-    edges = pd.read_csv('edge_costs.csv', dtype={'Identifiant noeud amont': int, 'Identifiant noeud aval': int})
-    nodes = pd.read_csv('node_coords.csv', dtype={'Identifiant noeud amont': int, 'Identifiant noeud aval': int})
-
-    G = nx.Graph()
-    merged = edges.merge(nodes, on=['Identifiant noeud amont', 'Identifiant noeud aval'])
-    for _, r in merged.iterrows():
-        u, v = int(r['Identifiant noeud amont']), int(r['Identifiant noeud aval'])
-        G.add_edge(u, v, weight=r['cost'])
-
-    def closest_node(coord):
-        dfn = nodes.assign(
-            dist=lambda df: np.hypot(
-                df['start_lat'] - coord[0], df['start_lon'] - coord[1]
-            )
+        recherche, execution = make_search(search, n_cores, model_threads)
+        with report.stage('grid_search', rows_in=len(X_train)) as etape:
+            debut = time.perf_counter()
+            recherche.fit(X_train, y_train)
+            duree_recherche = time.perf_counter() - debut
+            resultats = recherche.cv_results_
+            etape.count('candidates', getattr(recherche, 'n_candidates_', [len(resultats['params'])])[0])
+            etape.count('fits', len(resultats['params']) * recherche.n_splits_)
+            # Durées d'entraînement par candidat (moyenne sur les plis), mesurées dans les workers de joblib
+            etape.details['candidates'] = [
+                {'params': {k.replace('model__', ''): v for k, v in resultats['params'][i].items()},
+                 'iter': int(resultats['iter'][i]) if 'iter' in resultats else 0,
+                 'n_resources': int(resultats['n_resources'][i]) if 'n_resources' in resultats else len(X_train),
+                 'mean_fit_s': round(float(resultats['mean_fit_time'][i]), 4),
+                 'mean_score_s': round(float(resultats['mean_score_time'][i]), 4),
+                 'mean_test_score': round(float(resultats['mean_test_score'][i]), 4)}
+                for i in range(len(resultats['params']))
+            ]
+            # Réentraînement du meilleur candidat sur toutes les lignes, avec tous les cœurs
+            debut = time.perf_counter()
+            model = clone(recherche.estimator).set_params(**recherche.best_params_,
+                                                          model__n_jobs=n_cores or os.cpu_count() or 1)
+            model.fit(X_train, y_train)
+            etape.details.update(execution, search_s=round(duree_recherche, 4),
+                                 refit_s=round(time.perf_counter() - debut, 4),
+                                 best_score=round(float(recherche.best_score_), 4),
+                                 best_params={k.replace('model__', ''): v for k, v in recherche.best_params_.items()})
+        print(f"Recherche '{search}' : {duree_recherche:.1f}s ({execution['n_jobs']} entraînements x "
+              f"{execution['model_threads']} threads), meilleure robustesse en validation croisée "
+              f"{recherche.best_score_*100:.2f}% avec {etape.details['best_params']}")
+
+        with report.stage('evaluate', rows_in=len(X)):
+            y_train_pred = model.predict(X_train)
+            y_test_pred = model.predict(X_test)
+        print(f"R² train: {r2_score(y_train, y_train_pred):.4f}")
+        print(f"R² test : {r2_score(y_test, y_test_pred):.4f}")
+        print(f"Robustesse (<10%): {robust_score(y_test, y_test_pred)*100:.2f}%")
+
+        median_cost = np.median(y_test)
+        cm = confusion_matrix(
+            (y_test > median_cost).astype(int),
+            (y_test_pred > median_cost).astype(int)
         )
-        return int(dfn.loc[dfn['dist'].idxmin()]['Identifiant noeud amont'])
+        print("Matrice de confusion (0=bas,1=haut):")
+        print(cm)
 
-    src = closest_node(start_coord)
-    tgt = closest_node(end_coord)
+        with report.stage('export', rows_in=len(annexes)):
+            joblib.dump(model, 'best_model2.joblib')
+            annexes[['Identifiant noeud amont','Identifiant noeud aval',
+                     'start_lon','start_lat','end_lon','end_lat']].to_csv('node_coords.csv', index=False)
+            # Coût de chaque arc par heure de la semaine, pour les itinéraires selon l'heure de départ
+            horaires = TimeDependentCosts.from_arrays(annexes['Identifiant noeud amont'],
+                                                      annexes['Identifiant noeud aval'], annexes['hour_of_week'],
+                                                      annexes['cost'])
+            horaires.save(time_costs_path(EDGE_COSTS_FILE))
+            edge_cost_table([tuple(annexes[c] for c in EDGE_COST_COLUMNS)], horaires).to_csv('edge_costs.csv',
+                                                                                           index=False)
+            # Features de chaque arc hors contexte, pour la valorisation du réseau par le modèle
+            EdgeFeatureTable.from_arrays(X, noms, annexes['Identifiant noeud amont'],
+                                         annexes['Identifiant noeud aval'], annexes['hour_of_week']).save(
+                EDGE_FEATURES_FILE)
+        return model
+    except Exception as e:
+        status, erreur = 'error', e
+        raise
+    finally:
+        report.finish(status, erreur)
+        if report_file:
+            print(report.summary())
+            print(f"Rapport d'exécution enregistré sous '{report.save(report_file)}'")
+
+# --- Prédiction d'itinéraire optimal
 
-    if not nx.has_path(G, src, tgt):
-        print(f"Aucun chemin possible entre {src} et {tgt}.")
-        return []
+def predict_route(start_coord, end_coord, model_file='best_model2.joblib', when=None, weather=None):
+    """
+    Itinéraire de coût minimal entre deux coordonnées, servi par le moteur d'itinéraires
+    du processus (graphe construit une fois depuis edge_costs.csv et node_coords.csv,
+    rechargé quand ces fichiers changent).
 
-    path_nodes = nx.dijkstra_path(G, src, tgt, weight='weight')
-    route = []
-    for n in path_nodes:
-        rec = nodes[nodes['Identifiant noeud amont'] == n].iloc[0]
-        route.append([float(rec['start_lat']), float(rec['start_lon'])])
-    return route
+    Les arcs sont valorisés par le modèle pour le contexte (`when`, maintenant par
+    défaut, et `weather`, dict de WEATHER_FEATURES) ; sans modèle ou sans table
+    edge_features.npz, les coûts historiques sont utilisés.
+    """
+    return get_engine(EDGE_COSTS_FILE, NODE_COORDS_FILE).route(start_coord, end_coord, departure=when,
+                                                               pricing=pricing_for(model_file, when, weather))
 
 if __name__ == '__main__':
     model = train_model()
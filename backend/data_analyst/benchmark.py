@@ -0,0 +1,237 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+# Ajouter le répertoire racine du projet à sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from backend.data_analyst import etl
+from backend.data_analyst.emissions import add_emission_columns, select_scenarios
+from backend.data_analyst.generate_synthetic_data import generate_dataset
+from backend.data_analyst.geo import ArcLengthCache
+from backend.data_analyst.instrumentation import peak_rss_mb, reset_peak_rss
+from backend.data_analyst.storage import load_arc_table, open_writer, read_traffic
+
+### Banc de mesure de l'ETL et du calcul d'itinéraire, étape par étape ###
+
+BENCHMARK_DIR = 'benchmark_data'
+RESULTS_DIR = 'benchmark_results'
+# Colonnes lues pour l'extraction des features (les mêmes que l'entraînement)
+FEATURE_COLUMNS = ['Identifiant arc', 'Date et heure de comptage', 'Debit_Horaire', "Taux d'occupation",
+                   'Etat trafic', 'Emission_CO2']
+
+
+class StageTimer:
+    """
+    Mesure la durée et le pic de mémoire de chaque étape.
+
+    Le pic de mémoire résidente est remis à zéro au début de chaque étape (Linux) :
+    la mesure ne ralentit pas les étapes. Avec `trace_memory`, le pic des
+    allocations suivies par tracemalloc est aussi relevé ; tracemalloc ralentit
+    fortement le code riche en objets Python, les durées ne sont alors plus
+    comparables à une exécution sans lui.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = []
+
+    def run(self, name, rows, fonction, *args, **kwargs):
+        rss_pic = reset_peak_rss()
+        if self.trace_memory:
+            tracemalloc.start()
+        debut = time.perf_counter()
+        try:
+            resultat = fonction(*args, **kwargs)
+        finally:
+            duree = time.perf_counter() - debut
+            trace = tracemalloc.get_traced_memory()[1] / 1e6 if self.trace_memory else None
+            if self.trace_memory:
+                tracemalloc.stop()
+        mesure = {
+            'stage': name,
+            'seconds': round(duree, 4),
+            'rows': int(rows),
+            'rows_per_s': round(rows / duree, 1) if duree else None,
+            'peak_rss_mb': peak_rss_mb(since_reset=True) if rss_pic else None,
+            'traced_peak_mb': round(trace, 2) if trace is not None else None,
+        }
+        self.stages.append(mesure)
+        print(f"{name:12s} {duree:8.3f}s  {mesure['rows_per_s'] or 0:>12,.0f} lignes/s"
+              + (f"  pic RSS {mesure['peak_rss_mb']:8.1f} Mo" if mesure['peak_rss_mb'] is not None else '')
+              + (f"  pic tracemalloc {trace:8.1f} Mo" if trace is not None else ''))
+        return resultat
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ensure_dataset(rows, n_arcs, seed, data_dir=BENCHMARK_DIR):
+    """Jeu synthétique de la taille demandée, généré une seule fois puis réutilisé."""
+    cible = os.path.join(data_dir, f'{rows}_{n_arcs}_{seed}')
+    fichiers = {'traffic': os.path.join(cible, 'data_frame.csv'), 'weather': os.path.join(cible, 'data_weather.csv')}
+    if not all(os.path.exists(f) for f in fichiers.values()):
+        print(f"Génération du jeu synthétique ({rows} lignes, {n_arcs} arcs) dans '{cible}'...")
+        fichiers = generate_dataset(cible, rows, n_arcs=n_arcs, seed=seed)
+    return fichiers
+
+
+def _edge_tables(arcs, costs):
+    """Tables des arcs et des coordonnées des nœuds au format de edge_costs.csv / node_coords.csv (une ligne par arc)."""
+    cles = ['Identifiant noeud amont', 'Identifiant noeud aval']
+    edges = arcs[cles].assign(cost=costs)
+    nodes = arcs[cles + ['start_lon', 'start_lat', 'end_lon', 'end_lat']]
+    return edges, nodes
+
+
+def _route_queries(G, nodes, queries, rng, find_route):
+    lat = nodes['start_lat'].to_numpy()
+    lon = nodes['start_lon'].to_numpy()
+    paires = rng.integers(0, len(nodes), (queries, 2))
+    return [find_route(G, nodes, (lat[a], lon[a]), (lat[b], lon[b])) for a, b in paires]
+
+
+def run_benchmark(rows=100000, n_arcs=3000, seed=0, output_format='csv', queries=20, trace_memory=False,
+                  data_dir=BENCHMARK_DIR):
+    """
+    Exécute chaque étape du pipeline séparément sur un jeu synthétique et mesure son débit.
+
+    Étapes : chargement et nettoyage, analyse de 'geo_shape', distances, émissions de
+    CO2, écriture, extraction des features, construction du graphe et requêtes
+    d'itinéraire. Tout s'exécute dans un seul processus, sur un jeu déterminé par
+    (rows, n_arcs, seed) : deux exécutions sur des commits différents sont comparables.
+
+    Args:
+        rows (int): Nombre de lignes du jeu synthétique.
+        n_arcs (int): Nombre d'arcs du réseau synthétique.
+        seed (int): Graine du générateur.
+        output_format (str): Format d'écriture mesuré ('csv' ou 'parquet').
+        queries (int): Nombre de requêtes d'itinéraire.
+        trace_memory (bool): Relève aussi le pic des allocations suivies par tracemalloc
+            (ralentit les étapes : durées non comparables).
+        data_dir (str): Répertoire des jeux synthétiques et des sorties.
+
+    Returns:
+        dict: Rapport (contexte d'exécution et mesures par étape).
+    """
+    # Import tardif : ML charge xgboost, scikit-learn et networkx
+    from backend.data_analyst.ML import build_route_graph, extract_spatial_features, extract_time_features, find_route
+
+    fichiers = ensure_dataset(rows, n_arcs, seed, data_dir)
+    sortie = os.path.join(data_dir, 'output', 'data_cleaned' + ('.csv' if output_format == 'csv' else ''))
+    shutil.rmtree(os.path.dirname(sortie), ignore_errors=True)
+    os.makedirs(os.path.dirname(sortie))
+
+    timer = StageTimer(trace_memory)
+    chunks = timer.run('load', rows, lambda: list(etl.iter_clean_chunks(fichiers['traffic'])))
+    n = sum(len(c) for c in chunks)
+    chunks = timer.run('geo_parse', n, lambda: [etl.process_geo_shape_column(c) for c in chunks])
+
+    # Cache vide : chaque géométrie distincte est mesurée, comme dans un processus neuf
+    etl.arc_length_cache = ArcLengthCache()
+    def distances():
+        for c in chunks:
+            c['distance_arc'] = etl.calculer_distances_arcs(c['geo_shape'])
+    timer.run('distance', n, distances)
+
+    scenarios = select_scenarios()
+    chunks = timer.run('co2', n, lambda: [add_emission_columns(c, scenarios) for c in chunks])
+
+    def write():
+        writer = open_writer(sortie, output_format, split_arcs=True)
+        for c in chunks:
+            writer.write(c)
+        writer.commit()
+    timer.run('write', n, write)
+    del chunks
+
+    def features():
+        df = read_traffic(sortie, columns=FEATURE_COLUMNS)
+        arcs = extract_spatial_features(load_arc_table(sortie))
+        return extract_time_features(df.merge(arcs[['Identifiant arc', 'euclid_dist']], on='Identifiant arc')), arcs
+    df, arcs = timer.run('features', n, features)
+
+    # Coût moyen de chaque arc (le coût de l'entraînement, sans le modèle)
+    cout = df.groupby('Identifiant arc', observed=True)['Emission_CO2'].mean()
+    arcs = arcs.dropna(subset=['start_lon', 'end_lon'])
+    edges, nodes = _edge_tables(arcs, 0.5 * arcs['distance_arc'].to_numpy()
+                                + 0.5 * arcs['Identifiant arc'].map(cout).fillna(0).to_numpy())
+    del df
+    G = timer.run('graph_build', len(edges), build_route_graph, edges, nodes)
+    rng = np.random.default_rng(seed)
+    timer.run('route_query', queries, _route_queries, G, nodes, queries, rng, find_route)
+
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'params': {'rows': rows, 'n_arcs': n_arcs, 'seed': seed, 'output_format': output_format,
+                   'queries': queries, 'trace_memory': trace_memory},
+        'environment': {'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+                        'platform': platform.platform(), 'cpu_count': os.cpu_count()},
+        'clean_rows': n,
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': timer.stages,
+    }
+
+
+def compare_reports(before, after):
+    """Tableau comparatif de deux rapports (durées et rapport d'accélération par étape)."""
+    avant = {s['stage']: s for s in before['stages']}
+    lignes = []
+    for etape in after['stages']:
+        ref = avant.get(etape['stage'])
+        lignes.append({
+            'stage': etape['stage'],
+            'before_s': ref['seconds'] if ref else None,
+            'after_s': etape['seconds'],
+            'speedup': round(ref['seconds'] / etape['seconds'], 2) if ref and etape['seconds'] else None,
+            'before_peak_rss_mb': ref.get('peak_rss_mb') if ref else None,
+            'after_peak_rss_mb': etape.get('peak_rss_mb'),
+        })
+    return pd.DataFrame(lignes)
+
+
+def save_report(report, path=None):
+    """Enregistre le rapport en JSON (benchmark_results/<commit>_<lignes>.json par défaut)."""
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{report['commit'] or 'local'}_{report['params']['rows']}.json")
+    with open(path, 'w', encoding='utf-8') as fichier:
+        json.dump(report, fichier, indent=2, ensure_ascii=False)
+    return path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mesure chaque étape du pipeline sur un jeu synthétique.")
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--arcs', type=int, default=3000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--queries', type=int, default=20)
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="Relève aussi le pic tracemalloc de chaque étape (ralentit les mesures)")
+    parser.add_argument('--output', help="Fichier JSON du rapport")
+    parser.add_argument('--compare', help="Rapport JSON de référence (par exemple d'un autre commit)")
+    args = parser.parse_args()
+
+    rapport = run_benchmark(args.rows, args.arcs, args.seed, args.format, args.queries,
+                            trace_memory=args.trace_memory)
+    print(f"Rapport enregistré dans '{save_report(rapport, args.output)}'")
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as fichier:
+            print(compare_reports(json.load(fichier), rapport).to_string(index=False))
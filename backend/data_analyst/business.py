@@ -1,13 +1,21 @@
-import pandas as pd
+import os
+import sys
 import seaborn as sns
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_pdf import PdfPages
 
-# Charger les données depuis le fichier CSV (à adapter avec le nom de votre fichier)
-df = pd.read_csv('data_cleaned.csv', sep=';')
+# Ajouter le répertoire racine du projet à sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
-# Conversion de la colonne "Date et heure de comptage" en datetime en UTC
-df['Date et heure de comptage'] = pd.to_datetime(df['Date et heure de comptage'], utc=True)
+from backend.data_analyst.storage import read_traffic, resolve_traffic_path
+
+# Charger uniquement les colonnes utilisées par le rapport (jeu Parquet 'data_cleaned/' ou 'data_cleaned.csv')
+colonnes = ['Date et heure de comptage', 'Debit_Horaire', "Taux d'occupation", 'Etat trafic',
+            'Libelle', 'distance_arc', 'Emission_CO2']
+df = read_traffic(resolve_traffic_path('data_cleaned'), columns=colonnes)
+
+# La colonne "Date et heure de comptage" est déjà un datetime64 (UTC) : on précise seulement le fuseau
+df['Date et heure de comptage'] = df['Date et heure de comptage'].dt.tz_localize('UTC')
 
 # Créer le rapport PDF et ajouter les graphiques
 with PdfPages('rapport_trafic.pdf') as pdf:
@@ -0,0 +1,482 @@
+import argparse
+import hashlib
+import heapq
+import json
+import math
+import os
+import sys
+import time
+from dataclasses import dataclass
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+# Ajouter le répertoire racine du projet à sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from backend.data_analyst.csr_graph import MATRIX_BLOCK
+
+### Hiérarchie de contraction : prétraitement hors ligne et requêtes bidirectionnelles ###
+
+# Nœuds réglés au plus par recherche de témoin ; au-delà, le raccourci est ajouté
+# par prudence (la hiérarchie reste exacte, avec quelques raccourcis en trop)
+WITNESS_SETTLED = 60
+CH_SUFFIX = '.ch.npz'
+
+
+def graph_fingerprint(graph):
+    """Empreinte du contenu d'un CSRGraph (nœuds, arêtes et coûts)."""
+    sha = hashlib.sha1()
+    for tableau in (graph.node_ids, graph.indptr, graph.indices, graph.weights):
+        sha.update(np.ascontiguousarray(tableau).tobytes())
+    return sha.hexdigest()[:20]
+
+
+def hierarchy_path(edges_file):
+    """Fichier de la hiérarchie associé à un fichier de coûts (edge_costs.csv -> edge_costs.ch.npz)."""
+    return os.path.splitext(edges_file)[0] + CH_SUFFIX
+
+
+def _witness_search(adjacence, source, exclu, borne, limite):
+    """Distances depuis `source` sans passer par `exclu`, jusqu'à `borne` ou `limite` nœuds réglés."""
+    distance = {source: 0.0}
+    tas = [(0.0, source)]
+    regles = 0
+    while tas:
+        d, u = heapq.heappop(tas)
+        if d > distance[u]:
+            continue
+        if d > borne or regles >= limite:
+            break
+        regles += 1
+        for v, w in adjacence[u].items():
+            if v == exclu:
+                continue
+            nd = d + w
+            if nd < distance.get(v, math.inf):
+                distance[v] = nd
+                heapq.heappush(tas, (nd, v))
+    return distance
+
+
+def _shortcuts(adjacence, v, limite):
+    """Raccourcis nécessaires à la contraction de `v` : liste de (u, x, coût)."""
+    voisins = list(adjacence[v].items())
+    raccourcis = []
+    for i, (u, wu) in enumerate(voisins[:-1]):
+        autres = voisins[i + 1:]
+        distance = _witness_search(adjacence, u, v, wu + max(w for _, w in autres), limite)
+        for x, wx in autres:
+            if distance.get(x, math.inf) > wu + wx:
+                raccourcis.append((u, x, wu + wx))
+    return raccourcis
+
+
+@dataclass
+class ContractionHierarchy:
+    """
+    Hiérarchie de contraction d'un graphe non orienté.
+
+    Les nœuds sont contractés un à un (rang croissant) ; la contraction d'un nœud
+    ajoute un raccourci entre deux voisins quand le seul plus court chemin qui les
+    relie passe par lui. Seules les arêtes montantes (vers un rang plus élevé) sont
+    gardées, en CSR sur les numéros internes du CSRGraph : une requête est une
+    recherche montante depuis chaque extrémité, sur quelques centaines de nœuds.
+    `middle` est le nœud contourné par un raccourci (-1 pour une arête d'origine).
+    """
+    node_ids: np.ndarray  # int64, identique à CSRGraph.node_ids
+    rank: np.ndarray      # int32, ordre de contraction
+    indptr: np.ndarray    # int64, forme (n_nœuds + 1,)
+    indices: np.ndarray   # int32, extrémité haute de chaque arête montante
+    weights: np.ndarray   # float64
+    middle: np.ndarray    # int32
+    graph_key: str = None
+    build_s: float = 0.0
+
+    def __post_init__(self):
+        self._adjacence = None
+        self._montantes = None
+        self._matrice = None
+        self._cles = None
+
+    @classmethod
+    def build(cls, graph, witness_settled=WITNESS_SETTLED, verbose=False):
+        """
+        Contracte tous les nœuds d'un CSRGraph.
+
+        L'ordre suit deux fois la différence d'arêtes (raccourcis ajoutés moins
+        arêtes supprimées) plus le nombre de voisins déjà contractés, recalculée à
+        la sortie de la file (mise à jour paresseuse).
+        """
+        debut = time.perf_counter()
+        n = len(graph)
+        indptr, indices, weights = graph.adjacency
+        adjacence = [{} for _ in range(n)]
+        for u in range(n):
+            voisins = adjacence[u]
+            for j in range(indptr[u], indptr[u + 1]):
+                voisins[indices[j]] = weights[j]
+        milieu = {}
+        supprimes = [0] * n
+        rang = np.full(n, -1, dtype=np.int32)
+        hauts, couts, milieux, bas = [], [], [], []
+
+        def priorite(v, raccourcis):
+            return 2 * (len(raccourcis) - len(adjacence[v])) + supprimes[v]
+
+        file = [(priorite(v, _shortcuts(adjacence, v, witness_settled)), v) for v in range(n)]
+        heapq.heapify(file)
+        suivant = 0
+        while file:
+            _, v = heapq.heappop(file)
+            raccourcis = _shortcuts(adjacence, v, witness_settled)
+            p = priorite(v, raccourcis)
+            if file and p > file[0][0]:
+                heapq.heappush(file, (p, v))
+                continue
+            rang[v] = suivant
+            suivant += 1
+            for u, w in adjacence[v].items():
+                bas.append(v)
+                hauts.append(u)
+                couts.append(w)
+                milieux.append(milieu.get((min(u, v), max(u, v)), -1))
+                del adjacence[u][v]
+                supprimes[u] += 1
+            adjacence[v] = {}
+            for u, x, w in raccourcis:
+                if w < adjacence[u].get(x, math.inf):
+                    adjacence[u][x] = adjacence[x][u] = w
+                    milieu[(min(u, x), max(u, x))] = v
+            if verbose and suivant % 10000 == 0:
+                print(f"{suivant}/{n} nœuds contractés, {len(bas)} arêtes montantes")
+
+        bas = np.asarray(bas, dtype=np.int64)
+        ordre = np.argsort(bas, kind='stable')
+        ch_indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(bas, minlength=n), out=ch_indptr[1:])
+        return cls(graph.node_ids, rang, ch_indptr, np.asarray(hauts, dtype=np.int32)[ordre],
+                   np.asarray(couts, dtype=np.float64)[ordre], np.asarray(milieux, dtype=np.int32)[ordre],
+                   graph_fingerprint(graph), time.perf_counter() - debut)
+
+    def number_of_shortcuts(self):
+        return int((self.middle >= 0).sum())
+
+    def save(self, path):
+        """Enregistre la hiérarchie (.npz non compressé, écriture atomique)."""
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, node_ids=self.node_ids, rank=self.rank, indptr=self.indptr, indices=self.indices,
+                 weights=self.weights, middle=self.middle,
+                 meta=np.array(json.dumps({'graph_key': self.graph_key, 'build_s': self.build_s})))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as fichier:
+            meta = json.loads(str(fichier['meta']))
+            return cls(fichier['node_ids'], fichier['rank'], fichier['indptr'], fichier['indices'],
+                       fichier['weights'], fichier['middle'], meta['graph_key'], meta['build_s'])
+
+    @classmethod
+    def load_for(cls, graph, path):
+        """
+        Hiérarchie enregistrée pour ce graphe, ou None si le fichier est absent ou
+        a été construit pour d'autres coûts.
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            hierarchie = cls.load(path)
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Hiérarchie de contraction illisible ({path}) : {e}")
+            return None
+        if hierarchie.graph_key != graph_fingerprint(graph):
+            print(f"Hiérarchie de contraction périmée ({path}) : recherche A* utilisée.")
+            return None
+        hierarchie.upward  # construit au chargement plutôt qu'à la première requête
+        return hierarchie
+
+    @property
+    def adjacency(self):
+        """indptr, indices, weights, middle et rank en listes Python."""
+        if self._adjacence is None:
+            self._adjacence = (self.indptr.tolist(), self.indices.tolist(), self.weights.tolist(),
+                               self.middle.tolist(), self.rank.tolist())
+        return self._adjacence
+
+    @property
+    def upward(self):
+        """Arêtes montantes de chaque nœud, en listes de (voisin, coût) : parcours des requêtes."""
+        if self._montantes is None:
+            indptr, indices, weights, _, _ = self.adjacency
+            self._montantes = [list(zip(indices[indptr[u]:indptr[u + 1]], weights[indptr[u]:indptr[u + 1]]))
+                               for u in range(len(self.node_ids))]
+        return self._montantes
+
+    def _unpack(self, a, b):
+        """Arête (a, b) de la hiérarchie développée en arêtes d'origine : nœuds après a, jusqu'à b."""
+        indptr, indices, _, milieux, rang = self.adjacency
+        chemin, pile = [], [(a, b)]
+        while pile:
+            u, x = pile.pop()
+            bas, haut = (u, x) if rang[u] < rang[x] else (x, u)
+            j = indptr[bas] + indices[indptr[bas]:indptr[bas + 1]].index(haut)
+            m = milieux[j]
+            if m < 0:
+                chemin.append(x)
+            else:
+                pile.append((m, x))
+                pile.append((u, m))
+        return chemin
+
+    def search(self, source, target):
+        """
+        Plus court chemin entre deux numéros internes : recherche montante depuis
+        chaque extrémité, arrêtée dès que les deux files dépassent le meilleur coût.
+
+        Returns:
+            tuple: (liste des numéros internes, coût total), ou (None, None) sans chemin.
+        """
+        if source == target:
+            return [source], 0.0
+        montantes = self.upward
+        distances = ({source: 0.0}, {target: 0.0})
+        precedents = ({}, {})
+        tas = ([(0.0, source)], [(0.0, target)])
+        meilleur, rencontre = math.inf, None
+        while (tas[0] and tas[0][0][0] < meilleur) or (tas[1] and tas[1][0][0] < meilleur):
+            for sens in (0, 1):
+                if not tas[sens] or tas[sens][0][0] >= meilleur:
+                    continue
+                d, u = heapq.heappop(tas[sens])
+                if d > distances[sens][u]:
+                    continue
+                autre = distances[1 - sens].get(u)
+                if autre is not None and d + autre < meilleur:
+                    meilleur, rencontre = d + autre, u
+                # Arrêt à la demande : un voisin plus haut déjà atteint donne un meilleur
+                # coût, u n'est pas sur un plus court chemin montant
+                voisins, connues = montantes[u], distances[sens]
+                for v, w in voisins:
+                    if connues.get(v, math.inf) + w < d:
+                        break
+                else:
+                    for v, w in voisins:
+                        nd = d + w
+                        if nd < connues.get(v, math.inf):
+                            connues[v] = nd
+                            precedents[sens][v] = u
+                            heapq.heappush(tas[sens], (nd, v))
+        if rencontre is None:
+            return None, None
+
+        montee = [rencontre]
+        while montee[-1] != source:
+            montee.append(precedents[0][montee[-1]])
+        montee.reverse()
+        descente = [rencontre]
+        while descente[-1] != target:
+            descente.append(precedents[1][descente[-1]])
+        chemin = [source]
+        for a, b in zip(montee + descente[1:], montee[1:] + descente[1:]):
+            chemin.extend(self._unpack(a, b))
+        return chemin, meilleur
+
+    def _edges(self, low, high):
+        """Position des arêtes montantes low -> high (tableaux de numéros internes)."""
+        if self._cles is None:
+            n = len(self.node_ids)
+            cles = np.repeat(np.arange(n, dtype=np.int64), np.diff(self.indptr)) * n + self.indices
+            ordre = np.argsort(cles)
+            self._cles = (cles[ordre], ordre)
+        cles, ordre = self._cles
+        return ordre[np.searchsorted(cles, np.asarray(low, dtype=np.int64) * len(self.node_ids) + high)]
+
+    def edge_values(self, graph, values):
+        """
+        Grandeur additive des arêtes du graphe (émissions...) reportée sur les arêtes
+        de la hiérarchie : un raccourci vaut la somme de ses deux moitiés.
+
+        Args:
+            graph (CSRGraph): Graphe de la hiérarchie.
+            values (np.ndarray): Valeur de chaque arête du graphe, alignée sur graph.weights.
+        """
+        bas = np.repeat(np.arange(len(self.node_ids), dtype=np.int64), np.diff(self.indptr))
+        haut = self.indices.astype(np.int64)
+        resultat = np.zeros(len(haut))
+        connues = self.middle < 0
+        resultat[connues] = values[graph._slots(bas[connues], haut[connues])]
+        # Les deux moitiés d'un raccourci partent du nœud contourné, contracté avant ses extrémités
+        raccourcis = np.flatnonzero(~connues)
+        milieux = self.middle[raccourcis]
+        moities = self._edges(milieux, bas[raccourcis]), self._edges(milieux, haut[raccourcis])
+        while len(raccourcis):
+            prets = connues[moities[0]] & connues[moities[1]]
+            resultat[raccourcis[prets]] = resultat[moities[0][prets]] + resultat[moities[1][prets]]
+            connues[raccourcis[prets]] = True
+            raccourcis, moities = raccourcis[~prets], (moities[0][~prets], moities[1][~prets])
+        return resultat
+
+    def _upward_trees(self, nodes, values=None):
+        """
+        Recherches montantes complètes depuis chaque nœud (Dijkstra de scipy sur les
+        arêtes montantes) : distances (inf hors de l'espace de recherche) et, avec
+        `values` (valeur de chaque arête montante), somme des valeurs jusqu'à chaque
+        nœud atteint.
+        """
+        n = len(self.node_ids)
+        if self._matrice is None:
+            self._matrice = csr_matrix((self.weights, self.indices, self.indptr), shape=(n, n))
+        if values is None:
+            return dijkstra(self._matrice, directed=True, indices=nodes), None
+        distances, precedents = dijkstra(self._matrice, directed=True, indices=nodes, return_predecessors=True)
+        lignes, noeuds = np.nonzero(precedents >= 0)
+        ancetres = precedents[lignes, noeuds].astype(np.int64)
+        sommes = np.zeros(distances.shape)
+        sommes[lignes, noeuds] = values[self._edges(ancetres, noeuds)]
+        # Sauts de pointeurs : chaque tour double la longueur de chemin sommée
+        precedents = precedents.astype(np.int64)
+        while len(lignes):
+            suite = ancetres >= 0
+            lignes, noeuds, ancetres = lignes[suite], noeuds[suite], ancetres[suite]
+            sommes[lignes, noeuds] += sommes[lignes, ancetres]
+            precedents[lignes, noeuds] = ancetres = precedents[lignes, ancetres]
+        return distances, sommes
+
+    def cost_matrix(self, sources, targets, values=None):
+        """
+        Coûts des plus courts chemins de chaque source vers chaque cible, par seaux.
+
+        Une recherche montante depuis chaque cible dépose (cible, distance) dans un
+        seau sur chaque nœud atteint ; la recherche montante d'une source lit les
+        seaux des nœuds qu'elle atteint : le coût vers une cible est le minimum de
+        la somme des deux distances.
+
+        Args:
+            sources, targets: Numéros internes.
+            values (np.ndarray): Valeur de chaque arête montante (voir edge_values),
+                sommée le long du plus court chemin de chaque paire.
+
+        Returns:
+            tuple: (coûts, sommes des valeurs ou None), matrices (n_sources, n_cibles) ;
+                inf (NaN pour les sommes) sans chemin.
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        n = len(self.node_ids)
+        couts = np.full((len(sources), len(targets)), np.inf)
+        sommes = np.full(couts.shape, np.nan) if values is not None else None
+        if not len(sources) or not len(targets):
+            return couts, sommes
+        # Seaux des cibles, par blocs : seules les entrées atteintes sont gardées
+        cibles, noeuds, seaux, seaux_valeurs = [], [], [], []
+        for bloc in range(0, len(targets), MATRIX_BLOCK):
+            distances, valeurs = self._upward_trees(targets[bloc:bloc + MATRIX_BLOCK], values)
+            c, v = np.nonzero(np.isfinite(distances))
+            cibles.append(c + bloc)
+            noeuds.append(v)
+            seaux.append(distances[c, v])
+            if values is not None:
+                seaux_valeurs.append(valeurs[c, v])
+        noeuds = np.concatenate(noeuds)
+        ordre = np.argsort(noeuds, kind='stable')
+        cibles, seaux = np.concatenate(cibles)[ordre], np.concatenate(seaux)[ordre]
+        seaux_valeurs = np.concatenate(seaux_valeurs)[ordre] if values is not None else None
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(noeuds, minlength=n), out=indptr[1:])
+
+        for bloc in range(0, len(sources), MATRIX_BLOCK):
+            distances, valeurs = self._upward_trees(sources[bloc:bloc + MATRIX_BLOCK], values)
+            for k, ligne in enumerate(distances):
+                i = bloc + k
+                atteints = np.flatnonzero(np.isfinite(ligne))
+                debut = indptr[atteints]
+                tailles = indptr[atteints + 1] - debut
+                # Entrées des seaux des nœuds atteints, bout à bout
+                entrees = np.repeat(debut - np.cumsum(tailles) + tailles, tailles) + np.arange(tailles.sum())
+                totaux = np.repeat(ligne[atteints], tailles) + seaux[entrees]
+                np.minimum.at(couts[i], cibles[entrees], totaux)
+                if values is not None:
+                    # Valeurs du nœud de rencontre qui réalise le minimum (le dernier en cas d'égalité)
+                    meilleurs = totaux == couts[i][cibles[entrees]]
+                    sommes[i, cibles[entrees[meilleurs]]] = (np.repeat(valeurs[k][atteints], tailles)[meilleurs]
+                                                             + seaux_valeurs[entrees[meilleurs]])
+        return couts, sommes
+
+def benchmark(graph, hierarchy, queries=200, seed=0):
+    """
+    Latence et coûts des requêtes CH comparés à Dijkstra et A* sur le CSRGraph.
+
+    Returns:
+        dict: Latences (ms) par méthode, nombre de coûts différents et de chemins
+            non valides (arête absente du graphe ou coût de chemin différent).
+    """
+    graph.adjacency, hierarchy.upward  # listes de parcours construites avant les mesures
+    rng = np.random.default_rng(seed)
+    paires = rng.integers(0, len(graph), size=(queries, 2)).tolist()
+    latences = {'dijkstra': [], 'astar': [], 'ch': []}
+    references = []
+    for s, t in paires:
+        debut = time.perf_counter()
+        references.append(graph.search(s, t, 'dijkstra'))
+        latences['dijkstra'].append(time.perf_counter() - debut)
+    for s, t in paires:
+        debut = time.perf_counter()
+        graph.search(s, t, 'astar')
+        latences['astar'].append(time.perf_counter() - debut)
+
+    indptr, indices, weights = graph.adjacency
+    differents, invalides = 0, 0
+    for (s, t), (_, cout_ref) in zip(paires, references):
+        debut = time.perf_counter()
+        chemin, cout = hierarchy.search(s, t)
+        latences['ch'].append(time.perf_counter() - debut)
+        if (cout is None) != (cout_ref is None):
+            differents += 1
+            continue
+        if cout is None:
+            continue
+        differents += not math.isclose(cout, cout_ref, rel_tol=1e-9, abs_tol=1e-9)
+        # Le chemin développé doit suivre des arêtes du graphe et en avoir le coût
+        total = 0.0
+        for u, v in zip(chemin, chemin[1:]):
+            voisins = indices[indptr[u]:indptr[u + 1]]
+            if v not in voisins:
+                total = math.nan
+                break
+            total += weights[indptr[u] + voisins.index(v)]
+        invalides += not math.isclose(total, cout_ref, rel_tol=1e-9, abs_tol=1e-9)
+
+    resultats = {'queries': queries, 'different_costs': int(differents), 'invalid_paths': int(invalides)}
+    for methode, valeurs in latences.items():
+        valeurs = np.array(valeurs) * 1000
+        resultats.setdefault('latency_ms', {})[methode] = {
+            'mean': round(float(valeurs.mean()), 3), 'p50': round(float(np.percentile(valeurs, 50)), 3),
+            'p95': round(float(np.percentile(valeurs, 95)), 3)}
+    return resultats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Construit la hiérarchie de contraction d'un fichier de coûts.")
+    parser.add_argument('--edges', default='edge_costs.csv', help="CSV des coûts d'arcs")
+    parser.add_argument('--nodes', default='node_coords.csv', help="CSV des coordonnées ('' : aucun)")
+    parser.add_argument('--output', help="Fichier de la hiérarchie (par défaut <edges>.ch.npz)")
+    parser.add_argument('--witness-settled', type=int, default=WITNESS_SETTLED)
+    parser.add_argument('--benchmark', type=int, default=0, metavar='N', help="Compare N requêtes à Dijkstra et A*")
+    args = parser.parse_args()
+
+    # Import tardif : routing importe ce module
+    from backend.data_analyst.routing import RouteGraph
+    graphe = RouteGraph.from_files(args.edges, args.nodes or None, backend='csr').G
+    print(f"Graphe : {graphe.number_of_nodes()} nœuds, {graphe.number_of_edges()} arêtes")
+    hierarchie = ContractionHierarchy.build(graphe, args.witness_settled, verbose=True)
+    sortie = args.output or hierarchy_path(args.edges)
+    hierarchie.save(sortie)
+    print(f"Hiérarchie construite en {hierarchie.build_s:.1f}s : {hierarchie.number_of_shortcuts()} raccourcis, "
+          f"{len(hierarchie.indices)} arêtes montantes, {os.path.getsize(sortie) / 2 ** 20:.1f} Mo -> {sortie}")
+    if args.benchmark:
+        r = benchmark(graphe, hierarchie, args.benchmark)
+        for methode, l in r['latency_ms'].items():
+            print(f"{methode:<9}: {l['mean']:.3f} ms en moyenne, p50 {l['p50']:.3f} ms, p95 {l['p95']:.3f} ms")
+        print(f"coûts différents de Dijkstra : {r['different_costs']}, chemins non valides : {r['invalid_paths']}")
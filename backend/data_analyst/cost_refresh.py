@@ -0,0 +1,349 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+
+import joblib
+import numpy as np
+import pandas as pd
+
+# Ajouter le répertoire racine du projet à sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from backend.data_analyst.csr_graph import CSRGraph
+from backend.data_analyst.routing import CHECK_INTERVAL, file_signature
+from backend.data_analyst.time_costs import HOURS_OF_WEEK, to_utc
+from backend.data_analyst.weather import WEATHER_FEATURES
+
+### Coûts des arcs prédits par le modèle pour un contexte (heure, jour, mois, météo) ###
+
+EDGE_FEATURES_FILE = 'edge_features.npz'
+# Contextes gardés en cache (un graphe valorisé par contexte : ~ la taille du CSR chacun)
+CACHE_SIZE = 24
+# Features de trafic : profil de l'arc à l'heure de la semaine du contexte
+TRAFFIC_FEATURES = ['Debit_Horaire', "Taux d'occupation", 'etat_factor']
+# Features calculées à partir du contexte (et des features de trafic pour les interactions)
+TIME_FEATURES = ['sin_hour', 'cos_hour', 'sin_weekday', 'cos_weekday', 'sin_month', 'cos_month']
+INTERACTION_FEATURES = ['occ_x_hour', 'occ_x_etat']
+# Précision des valeurs météo dans la clé du cache : des relevés voisins partagent les coûts
+WEATHER_DECIMALS = 1
+
+
+def _group_sums(up, down, hours, statiques, trafic):
+    """Sommes par arc (features fixes) et par (arc, heure de la semaine) (trafic), avec les effectifs."""
+    arcs, inverse = np.unique(np.column_stack([up, down]), axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    code = inverse * HOURS_OF_WEEK + hours
+    taille = len(arcs) * HOURS_OF_WEEK
+    sommes_trafic = np.stack([np.bincount(code, weights=trafic[:, j], minlength=taille)
+                              for j in range(trafic.shape[1])], axis=1).reshape(len(arcs), HOURS_OF_WEEK, -1)
+    effectifs = np.bincount(code, minlength=taille).reshape(len(arcs), HOURS_OF_WEEK)
+    sommes_statiques = np.stack([np.bincount(inverse, weights=statiques[:, j], minlength=len(arcs))
+                                 for j in range(statiques.shape[1])], axis=1).reshape(len(arcs), -1)
+    return arcs, sommes_statiques, sommes_trafic, effectifs
+
+
+@dataclass
+class EdgeFeatureTable:
+    """
+    Features de chaque arc hors contexte, pour construire la matrice de tout le réseau.
+
+    `static` porte les features propres à l'arc (coordonnées, longueur...), moyennes
+    sur ses comptages ; `traffic` le profil moyen de ses features de trafic par heure
+    de la semaine (une heure sans comptage prend la même heure des autres jours, à
+    défaut la moyenne de l'arc). `weather_defaults` (médianes de l'entraînement)
+    complète un contexte sans météo.
+    """
+    arcs: np.ndarray             # int64, forme (n_arcs, 2) : nœud amont, nœud aval
+    feature_names: list          # ordre des colonnes du modèle
+    static_names: list
+    static: np.ndarray           # float32, forme (n_arcs, len(static_names))
+    traffic: np.ndarray          # float32, forme (n_arcs, 168, len(TRAFFIC_FEATURES))
+    weather_defaults: np.ndarray  # float32, forme (len(WEATHER_FEATURES),)
+
+    def __len__(self):
+        return len(self.arcs)
+
+    @classmethod
+    def from_arrays(cls, X, feature_names, up, down, hours, batch_rows=500000):
+        """
+        Agrège la matrice d'entraînement par arc, lot par lot (X peut être projeté en mémoire).
+
+        Args:
+            X: Matrice des features (n_lignes, len(feature_names)).
+            up, down, hours: Nœud amont, nœud aval et heure de la semaine de chaque ligne.
+        """
+        feature_names = list(feature_names)
+        calculees = set(TRAFFIC_FEATURES + TIME_FEATURES + INTERACTION_FEATURES + WEATHER_FEATURES)
+        static_names = [nom for nom in feature_names if nom not in calculees]
+        colonnes_statiques = [feature_names.index(nom) for nom in static_names]
+        colonnes_trafic = [feature_names.index(nom) for nom in TRAFFIC_FEATURES]
+
+        arcs = None
+        for debut in range(0, len(X), batch_rows):
+            lot = np.asarray(X[debut:debut + batch_rows], dtype=np.float64)
+            h = np.asarray(hours[debut:debut + batch_rows], dtype=np.int64)
+            garder = (h >= 0) & (h < HOURS_OF_WEEK)
+            partiel = _group_sums(np.asarray(up[debut:debut + batch_rows], dtype=np.int64)[garder],
+                                  np.asarray(down[debut:debut + batch_rows], dtype=np.int64)[garder], h[garder],
+                                  lot[garder][:, colonnes_statiques], lot[garder][:, colonnes_trafic])
+            if arcs is None:
+                arcs, statiques, trafic, effectifs = partiel
+                continue
+            arcs, inverse = np.unique(np.concatenate([arcs, partiel[0]]), axis=0, return_inverse=True)
+            inverse = inverse.ravel()
+            cumuls = [np.zeros((len(arcs),) + t.shape[1:], dtype=t.dtype) for t in (statiques, trafic, effectifs)]
+            for cumul, ancien, nouveau in zip(cumuls, (statiques, trafic, effectifs), partiel[1:]):
+                np.add.at(cumul, inverse, np.concatenate([ancien, nouveau]))
+            statiques, trafic, effectifs = cumuls
+        if arcs is None:
+            raise ValueError("Aucune ligne avec une heure de la semaine valide")
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            statiques = statiques / effectifs.sum(axis=1)[:, None]
+            profil = trafic / effectifs[:, :, None]
+            par_heure = (trafic.reshape(len(arcs), 7, 24, -1).sum(axis=1)
+                         / effectifs.reshape(len(arcs), 7, 24).sum(axis=1)[:, :, None])
+            moyenne = trafic.sum(axis=1) / effectifs.sum(axis=1)[:, None]
+        profil = np.where(effectifs[:, :, None] > 0, profil, np.tile(par_heure, (1, 7, 1)))
+        profil = np.where(np.isnan(profil), moyenne[:, None, :], profil)
+
+        colonnes_meteo = [feature_names.index(nom) for nom in WEATHER_FEATURES if nom in feature_names]
+        with np.errstate(all='ignore'):
+            meteo = np.array([np.nanmedian(np.asarray(X[:, j], dtype=np.float64)) for j in colonnes_meteo])
+        return cls(arcs, feature_names, static_names, statiques.astype(np.float32), profil.astype(np.float32),
+                   meteo.astype(np.float32))
+
+    @classmethod
+    def from_features(cls, features, batch_rows=500000):
+        """Table d'un FeatureSet du magasin (colonnes annexes des nœuds et de l'heure de la semaine)."""
+        return cls.from_arrays(features.X, features.feature_names, features.aux['Identifiant noeud amont'],
+                               features.aux['Identifiant noeud aval'], features.aux['hour_of_week'], batch_rows)
+
+    def save(self, path=EDGE_FEATURES_FILE):
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, arcs=self.arcs, feature_names=np.array(self.feature_names),
+                 static_names=np.array(self.static_names), static=self.static, traffic=self.traffic,
+                 weather_defaults=self.weather_defaults)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=EDGE_FEATURES_FILE):
+        with np.load(path, allow_pickle=False) as fichier:
+            return cls(fichier['arcs'], fichier['feature_names'].tolist(), fichier['static_names'].tolist(),
+                       fichier['static'], fichier['traffic'], fichier['weather_defaults'])
+
+    def feature_matrix(self, context):
+        """
+        Matrice des features de tous les arcs pour un contexte (voir CostRefresher.context).
+
+        Returns:
+            ndarray: float32, forme (n_arcs, len(feature_names)), colonnes dans l'ordre du modèle.
+        """
+        heure_semaine, mois, meteo = context
+        heure, jour = heure_semaine % 24, heure_semaine // 24
+        colonne = {nom: j for j, nom in enumerate(self.feature_names)}
+        X = np.empty((len(self), len(self.feature_names)), dtype=np.float32)
+        X[:, [colonne[nom] for nom in self.static_names]] = self.static
+        trafic = self.traffic[:, heure_semaine, :]
+        X[:, [colonne[nom] for nom in TRAFFIC_FEATURES]] = trafic
+        temps = {'sin_hour': np.sin(2 * np.pi * heure / 24), 'cos_hour': np.cos(2 * np.pi * heure / 24),
+                 'sin_weekday': np.sin(2 * np.pi * jour / 7), 'cos_weekday': np.cos(2 * np.pi * jour / 7),
+                 'sin_month': np.sin(2 * np.pi * mois / 12), 'cos_month': np.cos(2 * np.pi * mois / 12)}
+        for nom, valeur in temps.items():
+            if nom in colonne:
+                X[:, colonne[nom]] = valeur
+        for nom, valeur in zip([m for m in WEATHER_FEATURES if m in colonne], meteo):
+            X[:, colonne[nom]] = valeur
+        occupation = trafic[:, TRAFFIC_FEATURES.index("Taux d'occupation")]
+        if 'occ_x_hour' in colonne:
+            X[:, colonne['occ_x_hour']] = occupation * temps['sin_hour']
+        if 'occ_x_etat' in colonne:
+            X[:, colonne['occ_x_etat']] = occupation * trafic[:, TRAFFIC_FEATURES.index('etat_factor')]
+        return X
+
+
+class CostRefresher:
+    """
+    Service de valorisation du réseau par le modèle.
+
+    Pour un contexte, la matrice des features de tous les arcs est construite puis
+    évaluée par un seul appel à `model.predict` ; le vecteur de coûts et le graphe
+    valorisé sont gardés dans un cache LRU borné (`cache_size` contextes), partagé
+    par les requêtes : un itinéraire dans un contexte déjà valorisé ne coûte que la
+    recherche.
+    """
+
+    def __init__(self, model, table, cache_size=CACHE_SIZE):
+        self.model, self.table, self.cache_size = model, table, cache_size
+        self.hits = self.misses = 0
+        self.last_refresh_s = None
+        self._cache = OrderedDict()
+        self._verrou = threading.Lock()
+        self._en_cours = {}  # contexte -> Future du calcul en cours
+        self._graphe = None  # (graphe, lignes du tableau de chaque case du CSR)
+
+    @classmethod
+    def from_files(cls, model_file, table_file=EDGE_FEATURES_FILE, cache_size=CACHE_SIZE):
+        return cls(joblib.load(model_file), EdgeFeatureTable.load(table_file), cache_size)
+
+    def context(self, when=None, weather=None):
+        """
+        Clé de contexte : (heure de la semaine, mois, valeurs météo arrondies), en
+        UTC comme le profil horaire de la table (voir time_costs.to_utc).
+
+        Args:
+            when: Instant du trajet (maintenant par défaut ; heure de Paris sans fuseau).
+            weather (dict): Valeurs météo connues (noms de WEATHER_FEATURES) ; les autres
+                prennent la médiane de l'entraînement.
+        """
+        when = to_utc(pd.Timestamp.now(tz='UTC') if when is None else when)
+        meteo = dict(zip(WEATHER_FEATURES, self.table.weather_defaults.tolist()))
+        meteo.update({k: float(v) for k, v in (weather or {}).items() if k in meteo and v is not None})
+        return (when.weekday() * 24 + when.hour, when.month,
+                tuple(round(meteo[k], WEATHER_DECIMALS) for k in WEATHER_FEATURES if k in meteo))
+
+    def _predict(self, context):
+        debut = time.perf_counter()
+        couts = np.asarray(self.model.predict(self.table.feature_matrix(context)), dtype=np.float64)
+        # Un coût négatif prédit romprait Dijkstra : borné à 0
+        couts = np.maximum(couts, 0.0)
+        self.last_refresh_s = time.perf_counter() - debut
+        return couts
+
+    def _slot_rows(self, graph):
+        """Ligne de la table de chaque case du CSR (calculée une fois par graphe)."""
+        cases = self._graphe
+        if cases is not None and cases[0] is graph:
+            return cases
+        sources = np.repeat(np.arange(len(graph), dtype=np.int64), np.diff(graph.indptr))
+        index = pd.MultiIndex.from_arrays([self.table.arcs[:, 0], self.table.arcs[:, 1]])
+        u, v = graph.node_ids[sources], graph.node_ids[graph.indices]
+        lignes = index.get_indexer(pd.MultiIndex.from_arrays([u, v]))
+        lignes = np.where(lignes >= 0, lignes, index.get_indexer(pd.MultiIndex.from_arrays([v, u])))
+        with self._verrou:
+            if self._graphe is None or self._graphe[0] is not graph:
+                # Les graphes valorisés du cache suivent la structure de l'ancien graphe
+                self._graphe = (graph, sources, lignes)
+                self._cache.clear()
+            return self._graphe
+
+    def costs(self, when=None, weather=None):
+        """Coût prédit de chaque arc de la table (ordre de `table.arcs`) pour ce contexte."""
+        return self._lookup(self.context(when, weather), None)[0]
+
+    def priced_graph(self, graph, when=None, weather=None):
+        """
+        CSRGraph de même structure que `graph`, pondéré par les coûts prédits du contexte.
+
+        Les arêtes absentes de la table gardent leur coût statique.
+        """
+        return self._lookup(self.context(when, weather), graph)[1]
+
+    def _lookup(self, cle, graph):
+        """
+        Entrée (coûts, graphe valorisé) du contexte, calculée au premier appel.
+
+        Le verrou ne protège que le cache : la prédiction et la construction du
+        graphe valorisé se font hors verrou, et les requêtes simultanées sur un même
+        contexte absent attendent le calcul en cours (un Future par contexte) au lieu
+        de le relancer.
+        """
+        cases = self._slot_rows(graph) if graph is not None else None
+        while True:
+            with self._verrou:
+                # Une entrée du cache n'est valable que pour le graphe courant
+                a_jour = cases is None or cases is self._graphe
+                entree = self._cache.get(cle) if a_jour else None
+                if entree is not None and (graph is None or entree[1] is not None):
+                    self._cache.move_to_end(cle)
+                    self.hits += 1
+                    return entree
+                attente = self._en_cours.get(cle)
+                if attente is None:
+                    attente = self._en_cours[cle] = Future()
+                    self.misses += 1
+                    break
+            # Calcul en cours dans une autre requête : on attend son résultat puis on relit le cache
+            attente.result()
+
+        try:
+            couts = entree[0] if entree is not None else self._predict(cle)
+            valorise = None
+            if graph is not None:
+                _, sources, lignes = cases
+                poids = np.where(lignes >= 0, couts[lignes.clip(0)], graph.weights)
+                valorise = CSRGraph(graph.node_ids, graph.indptr, graph.indices, poids, graph.lat, graph.lon,
+                                    co2=graph.co2)
+                valorise.cost_per_km = valorise._cost_per_km(sources, graph.indices, poids)
+        except BaseException as e:
+            with self._verrou:
+                del self._en_cours[cle]
+            attente.set_exception(e)
+            raise
+        entree = (couts, valorise)
+        with self._verrou:
+            del self._en_cours[cle]
+            if cases is None or cases is self._graphe:
+                self._cache[cle] = entree
+                self._cache.move_to_end(cle)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        attente.set_result(None)
+        return entree
+
+    def status(self):
+        return {'contexts': len(self._cache), 'cache_size': self.cache_size, 'hits': self.hits,
+                'misses': self.misses, 'arcs': len(self.table),
+                'last_refresh_s': round(self.last_refresh_s, 4) if self.last_refresh_s is not None else None}
+
+
+_refreshers = {}
+_refreshers_lock = threading.Lock()
+
+
+def get_refresher(model_file, table_file=EDGE_FEATURES_FILE, check_interval=CHECK_INTERVAL, **options):
+    """
+    Service partagé du processus pour ce modèle (None si le modèle ou la table manque).
+
+    Comme pour RoutingEngine, la signature des deux fichiers (taille et date de
+    modification) est relue au plus toutes les `check_interval` secondes : un
+    réentraînement remplace le service (et son cache), un fichier absent n'est
+    signalé qu'une fois. Un fichier illisible (en cours d'écriture) laisse le
+    service précédent en place.
+    """
+    cle = (os.path.abspath(model_file), os.path.abspath(table_file))
+    with _refreshers_lock:
+        entree = _refreshers.get(cle)
+        maintenant = time.monotonic()
+        if entree is not None and maintenant - entree[2] < check_interval:
+            return entree[1]
+        signature = file_signature([model_file, table_file])
+        if entree is not None and entree[0] == signature:
+            _refreshers[cle] = (signature, entree[1], maintenant)
+            return entree[1]
+        refresher = entree[1] if entree is not None else None
+        if None in signature:
+            print(f"Coûts prédits indisponibles : {model_file} ou {table_file} absent.")
+            refresher = None
+        else:
+            try:
+                refresher = CostRefresher.from_files(model_file, table_file, **options)
+            except Exception as e:  # fichier partiel : les erreurs de dépickling varient
+                print(f"Modèle ou table illisible ({model_file}, {table_file}) : {e}")
+        _refreshers[cle] = (signature, refresher, maintenant)
+        return refresher
+
+def pricing_for(model_file, when=None, weather=None, table_file=EDGE_FEATURES_FILE):
+    """
+    Valorisation à passer à RoutingEngine.route / cost_matrix (`pricing`) : graphe
+    pondéré par le modèle pour le contexte (`when`, maintenant par défaut, et
+    `weather`) ; None sans modèle ou sans table, les coûts historiques s'appliquent.
+    """
+    refresher = get_refresher(model_file, table_file)
+    if refresher is None:
+        return None
+    return lambda graphe: refresher.priced_graph(graphe, when, weather)
@@ -0,0 +1,400 @@
+import argparse
+import heapq
+import math
+import os
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+# Ajouter le répertoire racine du projet à sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from backend.data_analyst.geo import R_TERRE_KM, haversine_np
+from backend.data_analyst.node_index import node_coordinates
+
+### Graphe routier compact (CSR) : Dijkstra et A* sur tableaux ###
+
+NODE_UP = 'Identifiant noeud amont'
+NODE_DOWN = 'Identifiant noeud aval'
+SEARCH_METHODS = ('dijkstra', 'astar')
+CO2_COLUMN = 'Emission_CO2'
+# Recherches faites ensemble par les matrices de coûts (tableaux denses bloc x n_nœuds)
+MATRIX_BLOCK = 64
+
+
+def known_arcs(edges, nodes):
+    """
+    Arcs de `edges` présents dans `nodes`.
+
+    Même résultat qu'une jointure sur (nœud amont, nœud aval), sans multiplier les
+    lignes quand les deux tables répètent les mêmes arcs.
+    """
+    if nodes is None:
+        return edges
+    arcs = pd.MultiIndex.from_frame(nodes[[NODE_UP, NODE_DOWN]])
+    return edges[pd.MultiIndex.from_frame(edges[[NODE_UP, NODE_DOWN]]).isin(arcs)]
+
+
+@dataclass
+class CSRGraph:
+    """
+    Graphe non orienté pondéré, en tableaux CSR.
+
+    Les identifiants de nœuds sont renumérotés 0..n-1 (`node_ids[i]` est
+    l'identifiant d'origine du nœud i) ; les voisins du nœud i sont
+    `indices[indptr[i]:indptr[i + 1]]`, avec les coûts correspondants de `weights`.
+    Chaque arête est stockée dans les deux sens. `co2` (émission de chaque arête,
+    alignée sur `weights`) est absent si le fichier de coûts n'a pas la colonne.
+    """
+    node_ids: np.ndarray  # int64, croissant, forme (n_nœuds,)
+    indptr: np.ndarray    # int64, forme (n_nœuds + 1,)
+    indices: np.ndarray   # int32, forme (2 * n_arêtes,)
+    weights: np.ndarray   # float64, forme (2 * n_arêtes,)
+    lat: np.ndarray       # float64, degrés, NaN sans coordonnées
+    lon: np.ndarray
+    # Coût minimal par km à vol d'oiseau (heuristique de A*) ; 0 : A* équivaut à Dijkstra
+    cost_per_km: float = 0.0
+    co2: np.ndarray = None  # float64, forme (2 * n_arêtes,)
+
+    def __post_init__(self):
+        self._positions = None
+        self._adjacence = None
+        self._radians = None
+        self._matrice = None
+        self._cles = None
+
+    @classmethod
+    def from_edges(cls, edges, nodes=None):
+        """
+        Construit le graphe des arcs de `edges` (présents dans `nodes` si fourni).
+
+        Même graphe que routing.build_route_graph : pour un arc en double (dans un
+        sens ou dans l'autre), le dernier coût lu l'emporte ; les boucles, sans
+        effet sur les plus courts chemins, sont ignorées. Les émissions (colonne
+        Emission_CO2, facultative) suivent la même règle. Les coordonnées d'un nœud
+        sont celles de node_index.node_coordinates.
+        """
+        edges = known_arcs(edges, nodes)
+        amont = edges[NODE_UP].to_numpy(dtype=np.int64)
+        aval = edges[NODE_DOWN].to_numpy(dtype=np.int64)
+        couts = edges['cost'].to_numpy(dtype=np.float64)
+        emissions = edges[CO2_COLUMN].to_numpy(dtype=np.float64) if CO2_COLUMN in edges.columns else None
+        boucles = amont == aval
+        amont, aval, couts = amont[~boucles], aval[~boucles], couts[~boucles]
+        if emissions is not None:
+            emissions = emissions[~boucles]
+
+        node_ids = np.unique(np.concatenate([amont, aval]))
+        n = len(node_ids)
+        u, v = np.searchsorted(node_ids, amont), np.searchsorted(node_ids, aval)
+        bas, haut = np.minimum(u, v), np.maximum(u, v)
+        # Dernière occurrence de chaque paire : première du tableau inversé
+        _, premiers = np.unique((bas * n + haut)[::-1], return_index=True)
+        garder = len(bas) - 1 - premiers
+        bas, haut, couts = bas[garder], haut[garder], couts[garder]
+
+        sources = np.concatenate([bas, haut])
+        ordre = np.argsort(sources, kind='stable')
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n), out=indptr[1:])
+        indices = np.concatenate([haut, bas])[ordre].astype(np.int32)
+        weights = np.concatenate([couts, couts])[ordre]
+        co2 = None
+        if emissions is not None:
+            emissions = emissions[garder]
+            co2 = np.concatenate([emissions, emissions])[ordre]
+
+        lat, lon = np.full(n, np.nan), np.full(n, np.nan)
+        if nodes is not None:
+            ids, lat_noeuds, lon_noeuds = node_coordinates(nodes)
+            if len(ids):
+                pos = np.searchsorted(ids, node_ids).clip(0, len(ids) - 1)
+                connus = ids[pos] == node_ids
+                lat[connus], lon[connus] = lat_noeuds[pos[connus]], lon_noeuds[pos[connus]]
+
+        graphe = cls(node_ids, indptr, indices, weights, lat, lon, co2=co2)
+        graphe.cost_per_km = graphe._cost_per_km(bas, haut, couts)
+        return graphe
+
+    def _cost_per_km(self, bas, haut, couts):
+        """
+        Plus petit rapport coût / distance à vol d'oiseau des arêtes.
+
+        Multipliée par ce rapport, la distance à la cible ne surestime jamais le
+        coût restant (l'heuristique est cohérente). Si un nœud n'a pas de
+        coordonnées, la distance ne borne plus rien : le rapport vaut 0.
+        """
+        if not len(couts) or np.isnan(self.lat).any() or np.isnan(self.lon).any():
+            return 0.0
+        distances = haversine_np(self.lon[bas], self.lat[bas], self.lon[haut], self.lat[haut])
+        positives = distances > 0
+        if not positives.any():
+            return 0.0
+        rapport = float(np.min(couts[positives] / distances[positives]))
+        # Marge pour les arrondis : une heuristique légèrement trop forte perdrait l'optimalité
+        return max(rapport, 0.0) * (1 - 1e-9)
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def number_of_nodes(self):
+        return len(self.node_ids)
+
+    def number_of_edges(self):
+        return len(self.indices) // 2
+
+    @property
+    def nbytes(self):
+        tableaux = (self.node_ids, self.indptr, self.indices, self.weights, self.lat, self.lon, self.co2)
+        return sum(a.nbytes for a in tableaux if a is not None)
+
+    def position(self, node):
+        """Numéro interne d'un identifiant de nœud, ou None s'il est absent du graphe."""
+        if self._positions is None:
+            self._positions = dict(zip(self.node_ids.tolist(), range(len(self.node_ids))))
+        try:
+            return self._positions.get(node)
+        except TypeError:  # identifiant non hachable
+            return None
+
+    @property
+    def adjacency(self):
+        """indptr, indices et weights en listes Python (accès élément par élément plus rapide)."""
+        if self._adjacence is None:
+            self._adjacence = (self.indptr.tolist(), self.indices.tolist(), self.weights.tolist())
+        return self._adjacence
+
+    @property
+    def sparse(self):
+        """Matrice d'adjacence scipy (n x n) partageant les tableaux du graphe."""
+        if self._matrice is None:
+            self._matrice = csr_matrix((self.weights, self.indices, self.indptr), shape=(len(self), len(self)))
+        return self._matrice
+
+    def _slots(self, u, v):
+        """Position dans `weights` des arêtes u -> v (tableaux de numéros internes)."""
+        if self._cles is None:
+            sources = np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.indptr))
+            cles = sources * len(self) + self.indices
+            ordre = np.argsort(cles)
+            self._cles = (cles[ordre], ordre)
+        cles, ordre = self._cles
+        return ordre[np.searchsorted(cles, np.asarray(u, dtype=np.int64) * len(self) + v)]
+
+    def cost_matrix(self, sources, targets, co2=False):
+        """
+        Coûts des plus courts chemins de chaque source vers chaque cible : un arbre
+        de plus courts chemins (Dijkstra de scipy) par source distincte, calculés
+        par blocs de MATRIX_BLOCK sources.
+
+        Args:
+            sources, targets: Numéros internes.
+            co2 (bool): Somme aussi les émissions des arêtes de chaque chemin (None
+                si le graphe n'a pas d'émissions).
+
+        Returns:
+            tuple: (coûts, émissions), matrices (n_sources, n_cibles) ; inf (NaN pour
+                les émissions) sans chemin.
+        """
+        sources, inverse = np.unique(np.asarray(sources, dtype=np.int64), return_inverse=True)
+        targets = np.asarray(targets, dtype=np.int64)
+        avec_co2 = co2 and self.co2 is not None
+        couts = np.empty((len(sources), len(targets)))
+        emissions = np.empty(couts.shape) if avec_co2 else None
+        for bloc in range(0, len(sources), MATRIX_BLOCK):
+            lot = sources[bloc:bloc + MATRIX_BLOCK]
+            if not avec_co2:
+                couts[bloc:bloc + len(lot)] = dijkstra(self.sparse, indices=lot)[:, targets]
+                continue
+            distances, precedents = dijkstra(self.sparse, indices=lot, return_predecessors=True)
+            couts[bloc:bloc + len(lot)] = distances[:, targets]
+            emissions[bloc:bloc + len(lot)] = self._path_sums(precedents, targets, self.co2)
+        if avec_co2:
+            emissions[np.isinf(couts)] = np.nan
+        return couts[inverse.ravel()], emissions[inverse.ravel()] if avec_co2 else None
+
+    def _path_sums(self, precedents, targets, values):
+        """Somme de `values` (par arête) le long du chemin de chaque arbre vers chaque cible."""
+        # Remontée simultanée de tous les chemins vers leur source, une arête par tour
+        lignes = np.repeat(np.arange(len(precedents)), len(targets))
+        courants = np.tile(targets, len(precedents))
+        sommes = np.zeros(len(courants))
+        actifs = np.flatnonzero(precedents[lignes, courants] >= 0)
+        while len(actifs):
+            p = precedents[lignes[actifs], courants[actifs]]
+            sommes[actifs] += values[self._slots(p, courants[actifs])]
+            courants[actifs] = p
+            actifs = actifs[precedents[lignes[actifs], p] >= 0]
+        return sommes.reshape(len(precedents), len(targets))
+
+    def _heuristic(self, cible):
+        """Borne inférieure du coût restant jusqu'à `cible`, calculée à la demande par nœud."""
+        if self.cost_per_km <= 0:
+            return None
+        if self._radians is None:
+            self._radians = (np.radians(self.lat).tolist(), np.radians(self.lon).tolist())
+        lat, lon = self._radians
+        lat_c, lon_c, cos_c = lat[cible], lon[cible], math.cos(lat[cible])
+        facteur = self.cost_per_km * 2 * R_TERRE_KM
+
+        def h(i):
+            a = math.sin((lat[i] - lat_c) / 2) ** 2 + math.cos(lat[i]) * cos_c * math.sin((lon[i] - lon_c) / 2) ** 2
+            return facteur * math.asin(min(1.0, math.sqrt(a)))
+        return h
+
+    def search(self, source, target, method='astar'):
+        """
+        Plus court chemin entre deux numéros internes (tas binaire, arrêt à la cible).
+
+        Args:
+            method (str): 'dijkstra', ou 'astar' (distance de Haversine à la cible
+                comme heuristique ; équivaut à Dijkstra sans coordonnées).
+
+        Returns:
+            tuple: (liste des numéros internes, coût total), ou (None, None) sans chemin.
+        """
+        if method not in SEARCH_METHODS:
+            raise ValueError(f"Méthode de recherche inconnue : {method} (attendue : {', '.join(SEARCH_METHODS)})")
+        indptr, indices, weights = self.adjacency
+        h = self._heuristic(target) if method == 'astar' else None
+        distance = {source: 0.0}
+        precedent = {}
+        fermes = set()
+        tas = [(h(source) if h else 0.0, 0.0, source)]
+        while tas:
+            _, d, u = heapq.heappop(tas)
+            if u in fermes:
+                continue
+            if u == target:
+                break
+            fermes.add(u)
+            for j in range(indptr[u], indptr[u + 1]):
+                v = indices[j]
+                nd = d + weights[j]
+                if nd < distance.get(v, math.inf):
+                    distance[v] = nd
+                    precedent[v] = u
+                    heapq.heappush(tas, (nd + h(v) if h else nd, nd, v))
+        else:
+            return None, None
+
+        chemin = [target]
+        while chemin[-1] != source:
+            chemin.append(precedent[chemin[-1]])
+        chemin.reverse()
+        return chemin, distance[target]
+
+    def shortest_path(self, source, target, method='astar'):
+        """
+        Chemin de coût minimal entre deux identifiants de nœud.
+
+        Returns:
+            tuple: (liste des identifiants, coût total), ou (None, None) sans chemin
+                ou pour un nœud absent du graphe.
+        """
+        s, t = self.position(source), self.position(target)
+        if s is None or t is None:
+            return None, None
+        chemin, cout = self.search(s, t, method)
+        if chemin is None:
+            return None, None
+        return self.node_ids[chemin].tolist(), cout
+
+
+def benchmark_backends(edges_file, nodes_file, queries=200, seed=0):
+    """
+    Compare networkx et le graphe CSR sur les mêmes fichiers de coûts.
+
+    Mesure pour chaque moteur la durée de construction, la mémoire allouée par la
+    construction (tracemalloc) et la latence d'un plus court chemin entre paires de
+    nœuds tirées au hasard ; vérifie que les coûts (et les chemins) sont identiques
+    à ceux de networkx.
+
+    Returns:
+        dict: Mesures par moteur et nombre de chemins différents.
+    """
+    import networkx as nx
+    from backend.data_analyst.routing import _read_cost_table, build_route_graph
+
+    edges = _read_cost_table(edges_file).astype({NODE_UP: np.int64, NODE_DOWN: np.int64})
+    nodes = pd.read_csv(nodes_file, dtype={NODE_UP: np.int64, NODE_DOWN: np.int64}) if nodes_file else None
+
+    def mesurer_construction(construire):
+        tracemalloc.start()
+        debut = time.perf_counter()
+        graphe = construire()
+        duree = time.perf_counter() - debut
+        _, pic = tracemalloc.get_traced_memory()
+        memoire = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return graphe, {'build_s': round(duree, 4), 'memory_mb': round(memoire / 2 ** 20, 2),
+                        'peak_mb': round(pic / 2 ** 20, 2)}
+
+    if nodes is None:
+        def construire_nx():
+            G = nx.Graph()
+            G.add_weighted_edges_from(zip(edges[NODE_UP].tolist(), edges[NODE_DOWN].tolist(),
+                                          edges['cost'].astype(float).tolist()))
+            return G
+    else:
+        def construire_nx():
+            return build_route_graph(edges, nodes)
+    G, mesures_nx = mesurer_construction(construire_nx)
+    csr, mesures_csr = mesurer_construction(lambda: CSRGraph.from_edges(edges, nodes))
+    csr.adjacency  # listes de recherche construites avant les mesures de latence
+
+    rng = np.random.default_rng(seed)
+    paires = csr.node_ids[rng.integers(0, len(csr), size=(queries, 2))].tolist()
+    latences = {'networkx': [], 'dijkstra': [], 'astar': []}
+    references, differents, couts_differents = [], 0, 0
+    for s, t in paires:
+        debut = time.perf_counter()
+        try:
+            cout, chemin = nx.single_source_dijkstra(G, s, t, weight='weight')
+        except nx.NetworkXNoPath:
+            cout, chemin = None, None
+        latences['networkx'].append(time.perf_counter() - debut)
+        references.append((chemin, cout))
+    for methode in SEARCH_METHODS:
+        for (s, t), (chemin_nx, cout_nx) in zip(paires, references):
+            debut = time.perf_counter()
+            chemin, cout = csr.shortest_path(s, t, methode)
+            latences[methode].append(time.perf_counter() - debut)
+            differents += chemin != chemin_nx
+            couts_differents += (cout is None) != (cout_nx is None) or (
+                cout is not None and not math.isclose(cout, cout_nx, rel_tol=1e-9, abs_tol=1e-9))
+
+    resultats = {'nodes': csr.number_of_nodes(), 'edges': csr.number_of_edges(), 'queries': queries,
+                 'networkx': mesures_nx, 'csr': {**mesures_csr, 'arrays_mb': round(csr.nbytes / 2 ** 20, 2),
+                                                 'cost_per_km': csr.cost_per_km},
+                 'different_paths': int(differents), 'different_costs': int(couts_differents)}
+    for moteur, valeurs in latences.items():
+        valeurs = np.array(valeurs) * 1000
+        resultats.setdefault('latency_ms', {})[moteur] = {
+            'mean': round(float(valeurs.mean()), 3), 'p50': round(float(np.percentile(valeurs, 50)), 3),
+            'p95': round(float(np.percentile(valeurs, 95)), 3)}
+    return resultats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare les moteurs d'itinéraires networkx et CSR.")
+    parser.add_argument('--edges', default='edge_costs.csv', help="CSV des coûts d'arcs")
+    parser.add_argument('--nodes', default='node_coords.csv', help="CSV des coordonnées ('' : aucun)")
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    r = benchmark_backends(args.edges, args.nodes or None, args.queries, args.seed)
+    print(f"{r['nodes']} nœuds, {r['edges']} arêtes, {r['queries']} requêtes")
+    print(f"networkx : construction {r['networkx']['build_s']:.3f}s, {r['networkx']['memory_mb']:.1f} Mo")
+    print(f"CSR      : construction {r['csr']['build_s']:.3f}s, {r['csr']['memory_mb']:.1f} Mo "
+          f"(tableaux {r['csr']['arrays_mb']:.1f} Mo)")
+    for moteur, l in r['latency_ms'].items():
+        print(f"{moteur:<9}: {l['mean']:.3f} ms en moyenne, p50 {l['p50']:.3f} ms, p95 {l['p95']:.3f} ms")
+    print(f"chemins différents de networkx : {r['different_paths']}, coûts différents : {r['different_costs']}")
@@ -0,0 +1,107 @@
+import json
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+### Moteur de calcul des émissions de CO2 ###
+
+# Fichier de configuration par défaut des tables d'émission
+DEFAULT_EMISSION_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'emission_factors.json')
+
+
+@dataclass
+class EmissionScenario:
+    """
+    Table d'émission : classes de véhicules définies par des seuils de débit horaire.
+
+    La classe i couvre les débits de `max_debits[i - 1]` (exclu) à `max_debits[i]`
+    (inclus) ; la dernière classe couvre tous les débits supérieurs.
+    """
+    name: str
+    vehicles: tuple
+    max_debits: np.ndarray  # float64, un seuil de moins que de classes
+    factors: np.ndarray     # float64, facteur d'émission par classe
+
+    def vehicle_codes(self, debit_horaire):
+        """Indice de la classe de véhicule de chaque débit (recherche par dichotomie)."""
+        return np.searchsorted(self.max_debits, np.asarray(debit_horaire, dtype=np.float64), side='left')
+
+    def vehicle_types(self, debit_horaire):
+        """Nom de la classe de véhicule de chaque débit."""
+        return np.array(self.vehicles, dtype=object)[self.vehicle_codes(debit_horaire)]
+
+    def emissions(self, debit_horaire, distance_arc):
+        """Émissions de CO2 de chaque ligne : facteur de la classe x distance de l'arc."""
+        return self.factors[self.vehicle_codes(debit_horaire)] * np.asarray(distance_arc, dtype=np.float64)
+
+
+def _build_scenario(name, config):
+    """Construit et valide un scénario à partir de sa description JSON."""
+    classes = config.get('classes') or []
+    if not classes:
+        raise ValueError(f"Scénario d'émission '{name}' : aucune classe définie.")
+    if classes[-1].get('max_debit') is not None:
+        raise ValueError(f"Scénario d'émission '{name}' : la dernière classe doit avoir 'max_debit': null.")
+
+    max_debits = np.array([c['max_debit'] for c in classes[:-1]], dtype=np.float64)
+    if np.isnan(max_debits).any() or (np.diff(max_debits) <= 0).any():
+        raise ValueError(f"Scénario d'émission '{name}' : les seuils 'max_debit' doivent être strictement croissants.")
+    return EmissionScenario(
+        name=name,
+        vehicles=tuple(c['vehicle'] for c in classes),
+        max_debits=max_debits,
+        factors=np.array([c['factor'] for c in classes], dtype=np.float64),
+    )
+
+
+def load_emission_scenarios(path=None):
+    """
+    Charge les scénarios d'émission depuis un fichier JSON.
+
+    Args:
+        path (str): Chemin du fichier (par défaut `emission_factors.json`).
+
+    Returns:
+        tuple: (dict nom -> EmissionScenario, nom du scénario par défaut).
+    """
+    with open(path or DEFAULT_EMISSION_CONFIG, 'r', encoding='utf-8') as fichier:
+        config = json.load(fichier)
+
+    scenarios = {name: _build_scenario(name, sc) for name, sc in config['scenarios'].items()}
+    default = config.get('default') or next(iter(scenarios))
+    if default not in scenarios:
+        raise ValueError(f"Scénario d'émission par défaut inconnu : '{default}'.")
+    return scenarios, default
+
+
+def select_scenarios(names=None, path=None):
+    """
+    Liste des scénarios à calculer, le scénario par défaut en premier.
+
+    Args:
+        names (list): Scénarios supplémentaires à calculer (None : défaut seul).
+        path (str): Fichier de configuration.
+    """
+    scenarios, default = load_emission_scenarios(path)
+    inconnus = [n for n in (names or []) if n not in scenarios]
+    if inconnus:
+        raise ValueError(f"Scénarios d'émission inconnus : {inconnus}")
+    ordre = [default] + [n for n in (names or []) if n != default]
+    return [scenarios[n] for n in ordre]
+
+
+def add_emission_columns(chunk, scenarios):
+    """
+    Ajoute les colonnes d'émissions au DataFrame en une passe vectorisée.
+
+    Le premier scénario alimente 'Emission_CO2'. Lorsque plusieurs scénarios sont
+    fournis, chacun produit en plus sa colonne 'Emission_CO2_<nom>'.
+    """
+    debit = chunk['Debit_Horaire'].to_numpy(dtype=np.float64)
+    distance = chunk['distance_arc'].to_numpy(dtype=np.float64)
+    chunk['Emission_CO2'] = scenarios[0].emissions(debit, distance)
+    if len(scenarios) > 1:
+        for scenario in scenarios:
+            chunk[f'Emission_CO2_{scenario.name}'] = scenario.emissions(debit, distance)
+    return chunk
@@ -1,15 +1,144 @@
 import pandas as pd
-import re
-import json
-import math
 import os
+import sys
 import multiprocessing as mp
-from ast import literal_eval
+import hashlib
+import threading
+import time
 from functools import partial
-from io import StringIO  # Import pour utiliser une chaîne comme fichier
+
+# Ajouter le répertoire racine du projet à sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from backend.data_analyst.emissions import add_emission_columns, select_scenarios
+from backend.data_analyst.geo import ArcLengthCache, split_geo_shape
+from backend.data_analyst.instrumentation import RunReport, add_count, instrumented_call, stage
+from backend.data_analyst.incremental import (Manifest, iter_line_blocks, list_input_files,
+                                               manifest_path_for, read_block, read_header)
+from backend.data_analyst.schema import apply_schema, parse_timestamps, read_dtypes, replace_values
+from backend.data_analyst.storage import PartOutput, open_writer, partition_dates, write_part
 
 ### PARTIE 1 : Chargement & Nettoyage ###
-def load_and_clean_data(file_path, chunksize=50000):
+class QuoteStrippingReader:
+    """
+    Objet fichier en lecture seule qui supprime les doubles quotes à la volée.
+
+    Le fichier source est lu par blocs de taille bornée : seul le bloc courant est
+    présent en mémoire, quelle que soit la taille du fichier.
+    """
+
+    def __init__(self, fichier, block_size=1 << 20):
+        self.fichier = fichier
+        self.block_size = block_size
+        # Temps passé à lire et nettoyer les blocs (pour le rapport d'exécution)
+        self.calls = 0
+        self.wall_s = 0.0
+        self.cpu_s = 0.0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.block_size
+        debut, cpu = time.perf_counter(), time.thread_time()
+        try:
+            # Un bloc composé uniquement de quotes donnerait une chaîne vide,
+            # que pandas interpréterait comme la fin du fichier : on lit jusqu'à obtenir du contenu.
+            while True:
+                bloc = self.fichier.read(size)
+                if not bloc:
+                    return ''
+                bloc = bloc.replace('"', '')
+                if bloc:
+                    return bloc
+        finally:
+            self.calls += 1
+            self.wall_s += time.perf_counter() - debut
+            self.cpu_s += time.thread_time() - cpu
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        ligne = self.fichier.readline()
+        if not ligne:
+            raise StopIteration
+        return ligne.replace('"', '')
+
+
+def clean_chunk(chunk, counters=None):
+    """
+    Nettoie un morceau de DataFrame brut (colonnes vides, renommage, états, dates).
+
+    Args:
+        counters (dict): Compteurs à incrémenter (lignes lues, supprimées par dropna,
+            dates non converties).
+    """
+    add_count(counters, 'rows_read', len(chunk))
+    # Supprime les lignes contenant au moins une colonne vide
+    lues = len(chunk)
+    chunk = chunk.dropna(how='any')
+    add_count(counters, 'dropped_dropna', lues - len(chunk))
+    # Renommer la colonne "Débit horaire" en "Debit_Horaire"
+    chunk = chunk.rename(columns={'Débit horaire': 'Debit_Horaire'})
+
+    # Modifier les valeurs de la colonne "Etat trafic"
+    chunk['Etat trafic'] = replace_values(chunk['Etat trafic'], {
+        'Pré-saturé': 'Pre_sature',
+        'Saturé': 'Sature',
+        'Bloqué': 'Bloque'
+    })
+    # Identifiants sans valeur manquante : retour aux entiers 32 bits
+    chunk = apply_schema(chunk, parse_dates=False)
+
+    # Conversion sécurisée de la colonne "Date et heure de comptage" en datetime64 UTC (sans fuseau) ;
+    # chaque horodatage distinct n'est analysé qu'une fois
+    chunk['Date et heure de comptage'] = parse_timestamps(chunk['Date et heure de comptage'], format='ISO8601', utc=True)
+
+    # Vérification des erreurs de conversion
+    echecs = chunk['Date et heure de comptage'].isna().sum()
+    add_count(counters, 'date_failures', echecs)
+    if echecs > 0:
+        print("Attention : certaines dates n'ont pas pu être converties.")
+    return chunk
+
+
+def iter_clean_chunks(file_path, chunksize=50000, block_size=1 << 20, report=None):
+    """
+    Lit le fichier CSV en flux et produit les morceaux nettoyés un par un.
+
+    Les doubles quotes sont supprimées pendant la lecture (par blocs de `block_size`
+    caractères) : le fichier n'est jamais chargé entièrement en mémoire.
+
+    Args:
+        file_path (str): Chemin du fichier d'entrée.
+        chunksize (int): Nombre de lignes par morceau.
+        block_size (int): Taille des blocs lus sur le disque.
+        report (RunReport): Rapport d'exécution (étapes 'read_clean' et 'quote_stripping').
+
+    Yields:
+        DataFrame: Morceau nettoyé.
+    """
+    with open(file_path, 'r', encoding='utf-8') as fichier_entree:
+        lecteur = QuoteStrippingReader(fichier_entree, block_size)
+        # Les types du schéma (catégories, int32, float32) sont appliqués dès la lecture
+        morceaux = pd.read_csv(lecteur, delimiter=';', chunksize=chunksize, dtype=read_dtypes(raw=True))
+        try:
+            while True:
+                with stage(report, 'read_clean') as etape:
+                    chunk = next(morceaux, None)
+                    if chunk is not None:
+                        lues = len(chunk)
+                        chunk = clean_chunk(chunk, etape.counters)
+                        etape.add_rows(lues, len(chunk))
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            if report is not None:
+                # Compris dans 'read_clean' : lecture disque et suppression des quotes
+                report.add('quote_stripping', lecteur.wall_s, lecteur.cpu_s, calls=lecteur.calls)
+
+
+def load_and_clean_data(file_path, chunksize=50000, report=None):
     """
     Charge le fichier CSV en utilisant des morceaux (chunks) pour éviter les problèmes de mémoire.
     Supprime les doubles quotes dans le fichier, puis nettoie les données en supprimant les lignes contenant des colonnes vides.
@@ -26,80 +155,16 @@ def load_and_clean_data(file_path, chunksize=50000):
         print(f"Erreur : Le fichier {file_path} n'existe pas.")
         return None
 
-    # Étape 2 : Supprimer les doubles quotes dans le contenu du fichier
+    # Étape 2 : Charger et nettoyer les morceaux (les quotes sont supprimées à la lecture)
     try:
-        with open(file_path, 'r', encoding='utf-8') as fichier_entree:
-            contenu = fichier_entree.read()
-        
-        # Supprimer toutes les doubles quotes
-        contenu_modifie = contenu.replace('"', '')
-        print("Les doubles quotes ont été supprimées.")
-
-    except FileNotFoundError:
-        print("Erreur : Fichier d'entrée non trouvé.")
-        return None
-    except Exception as e:
-        print(f"Une erreur s'est produite lors de la suppression des doubles quotes : {str(e)}")
-        return None
-
-    # Étape 3 : Charger les données nettoyées en morceaux depuis la chaîne modifiée
-    try:
-        # Utilisation de StringIO pour simuler un fichier
-        chaine_fichier = StringIO(contenu_modifie)
-        chunks = pd.read_csv(chaine_fichier, delimiter=';', chunksize=chunksize)
-
-        # Nettoyage des morceaux
-        cleaned_chunks = []
-        for chunk in chunks:
-            # Supprime les lignes contenant au moins une colonne vide
-            chunk = chunk.dropna(how='any')
-            # Renommer la colonne "Débit horaire" en "Debit_Horaire"
-            chunk.rename(columns={'Débit horaire': 'Debit_Horaire'}, inplace=True)
-
-            # Modifier les valeurs de la colonne "Etat trafic"
-            chunk['Etat trafic'] = chunk['Etat trafic'].replace({
-                'Pré-saturé': 'Pre_sature',
-                'Saturé': 'Sature',
-                'Bloqué': 'Bloque'
-            })
-
-            # Conversion sécurisée de la colonne "Date et heure de comptage"
-            chunk['Date et heure de comptage'] = pd.to_datetime(chunk['Date et heure de comptage'], errors='coerce', utc=True)
-
-            # Vérification des erreurs de conversion
-            if chunk['Date et heure de comptage'].isna().sum() > 0:
-                print("Attention : certaines dates n'ont pas pu être converties.")
-
-            # Reformater la date en format lisible (sans fuseau horaire)
-            chunk['Date et heure de comptage'] = chunk['Date et heure de comptage'].dt.strftime('%Y-%m-%d %H:%M:%S')
-            
-            cleaned_chunks.append(chunk)
-
-        return cleaned_chunks
+        return list(iter_clean_chunks(file_path, chunksize=chunksize, report=report))
     except Exception as e:
         print(f"Une erreur s'est produite lors du chargement des données : {str(e)}")
         return None
 
 
-def clean_geo_shape(geo_str):
-    """Nettoie et extrait les coordonnées et le type géométrique de la colonne 'geo_shape'."""
-    if not isinstance(geo_str, str):  # Vérifie si la valeur est une chaîne
-        return geo_str, None
-
-    pattern = r"\{coordinates:\s*([\[\]\d\.,\s]+)\s*,\s*type:\s*([A-Za-z]+)\}"
-    match = re.search(pattern, geo_str)
-    if match:
-        coords_str = match.group(1).strip()
-        type_str = match.group(2).strip()
-        try:
-            coords = literal_eval(coords_str)
-        except Exception:
-            coords = coords_str
-        return coords, type_str
-    return geo_str, None
-
 def process_geo_shape_column(df):
-    """Applique la fonction de nettoyage sur la colonne 'geo_shape'."""
+    """Extrait, en une passe vectorisée, les coordonnées et le type de la colonne 'geo_shape'."""
     if 'geo_shape' not in df.columns:
         print("Erreur : La colonne 'geo_shape' est absente du fichier.")
         return df
@@ -107,88 +172,47 @@ def process_geo_shape_column(df):
     # Remplace les valeurs manquantes par une chaîne vide et convertit en chaîne
     df['geo_shape'] = df['geo_shape'].fillna('').astype(str)
 
-    # Applique la fonction de nettoyage
-    df[['geo_shape', 'geo_type']] = df['geo_shape'].apply(lambda x: pd.Series(clean_geo_shape(x)))
+    # Les valeurs distinctes (une par arc) sont analysées une seule fois
+    codes, uniques = pd.factorize(df['geo_shape'])
+    coords_txt, types = split_geo_shape(uniques)
+    # Les valeurs non reconnues sont conservées telles quelles, sans type
+    coords_txt = coords_txt.fillna(pd.Series(uniques))
+    df['geo_shape'] = coords_txt.to_numpy(dtype=object)[codes]
+    df['geo_type'] = types.to_numpy(dtype=object)[codes]
     return df
 
 
 ### PARTIE 2 : Calcul des distances ###
-def normalize_geo_shape(value):
-    """Transforme 'geo_shape' en une liste de points [longitude, latitude]."""
-    if isinstance(value, list):
-        try:
-            return [[float(point[0]), float(point[1])] for point in value]
-        except Exception:
-            return None
+# Longueurs des arcs déjà mesurées (une instance par processus du pool)
+arc_length_cache = ArcLengthCache()
 
-    if isinstance(value, str):
-        try:
-            points = json.loads(value)
-            if isinstance(points, list):
-                return [[float(point[0]), float(point[1])] for point in points]
-        except Exception:
-            numbers = re.findall(r"[-+]?\d*\.\d+|\d+", value)
-            if len(numbers) % 2 != 0:
-                return None
-            return [[float(numbers[i]), float(numbers[i+1])] for i in range(0, len(numbers), 2)]
-    
-    # Retourne None si la valeur n'est ni une liste ni une chaîne
-    return None
-
-def haversine(lon1, lat1, lon2, lat2):
-    """Calcule la distance entre deux points en km (formule de Haversine)."""
-    R = 6371.0  # Rayon de la Terre en km
-    lon1, lat1, lon2, lat2 = map(math.radians, [lon1, lat1, lon2, lat2])
-    dlon, dlat = lon2 - lon1, lat2 - lat1
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    return R * (2 * math.asin(math.sqrt(a)))
-
-def calculer_distance_geo_shape(geo_shape_value):
-    """Calcule la distance totale du trajet représenté par 'geo_shape'."""
-    points = normalize_geo_shape(geo_shape_value)
-    if not points:
-        return None
-    return sum(haversine(points[i][0], points[i][1], points[i+1][0], points[i+1][1]) for i in range(len(points) - 1))
+def calculer_distances_arcs(geo_shapes):
+    """Calcule, de façon vectorisée et mémoïsée, la distance de chaque arc de la colonne 'geo_shape'."""
+    return arc_length_cache.lengths(geo_shapes)
 
 
 ### PARTIE 3 : Calcul des émissions de CO2 ###
-emission_factors = {
-    'Piéton/Vélo': 0,
-    'Moto': 90,
-    'Voiture essence': 180,
-    'Voiture diesel': 160,
-    'Voiture électrique': 0,
-    'Bus': 1020,
-    'Camion': 1200
-}
-
-def get_vehicle_type(debit_horaire):
-    """Détermine le type de véhicule en fonction du débit horaire."""
-    if debit_horaire <= 50:
-        return 'Piéton/Vélo'
-    elif 51 <= debit_horaire <= 200:
-        return 'Moto'
-    elif 201 <= debit_horaire <= 800:
-        return 'Voiture essence'
-    elif 801 <= debit_horaire <= 1500:
-        return 'Voiture diesel'
-    elif 1501 <= debit_horaire <= 2500:
-        return 'Voiture électrique'
-    elif 2501 <= debit_horaire <= 4000:
-        return 'Bus'
-    else:
-        return 'Camion'
-
-def calculate_co2_emissions(row):
-    """Calcule les émissions de CO2 pour une ligne du DataFrame."""
-    vehicle_type = get_vehicle_type(row['Debit_Horaire'])
-    emission_factor = emission_factors.get(vehicle_type, 0)
-    return emission_factor * row['distance_arc']
+# Les seuils de débit et les facteurs d'émission sont lus depuis emission_factors.json
+default_emission_scenarios = None
+
+def get_emission_scenarios():
+    """Scénario d'émission par défaut, chargé une seule fois par processus."""
+    global default_emission_scenarios
+    if default_emission_scenarios is None:
+        default_emission_scenarios = select_scenarios()
+    return default_emission_scenarios
 
 
 ### PARTIE 4 : Traitement en parallèle ###
-def process_chunk(chunk):
-    """Nettoie et traite un morceau de DataFrame."""
+def process_chunk(chunk, emission_scenarios=None):
+    """
+    Nettoie et traite un morceau de DataFrame.
+
+    Args:
+        chunk (DataFrame): Morceau nettoyé.
+        emission_scenarios (list): Scénarios d'émission (voir emissions.select_scenarios),
+            le scénario par défaut du fichier de configuration si None.
+    """
     chunk = process_geo_shape_column(chunk)
     
     # Vérification des colonnes essentielles
@@ -196,38 +220,324 @@ def process_chunk(chunk):
         print("Erreur : Colonnes requises absentes du fichier.")
         return chunk
     
-    chunk['distance_arc'] = chunk['geo_shape'].apply(calculer_distance_geo_shape)
-    chunk['Emission_CO2'] = chunk.apply(calculate_co2_emissions, axis=1)
+    chunk['distance_arc'] = calculer_distances_arcs(chunk['geo_shape'])
+    chunk = add_emission_columns(chunk, emission_scenarios or get_emission_scenarios())
     return chunk
 
 
 ### PARTIE 5 : Exécution principale ###
-def main():
-    """Exécute le programme principal avec multiprocessing."""
-    input_file = "data_frame.csv"
-    output_file = "data_cleaned.csv"
-
-    # Chargement du fichier en morceaux
-    chunks = load_and_clean_data(input_file)
-    if chunks is None:
+def _iter_bounded(iterable, semaphore, stop_event):
+    """Ne fournit un nouvel élément au pool que lorsqu'une place se libère."""
+    for item in iterable:
+        while not semaphore.acquire(timeout=0.1):
+            if stop_event.is_set():
+                return
+        yield item
+
+
+def _imap(pool, worker, items, report=None, with_counters=False):
+    """
+    `pool.imap(worker, items)` ; avec un rapport, chaque tâche est mesurée dans son
+    worker et l'attente des résultats est comptée dans l'étape 'pool_wait'.
+    """
+    if report is None:
+        yield from pool.imap(worker, items)
         return
+    tache = partial(instrumented_call, worker, with_counters=with_counters, **report.worker_options())
+    resultats = pool.imap(tache, items)
+    numero = 0
+    while True:
+        with report.stage('pool_wait'):
+            suivant = next(resultats, None)
+        if suivant is None:
+            return
+        resultat, metrics = suivant
+        report.record_worker(metrics, task=numero)
+        numero += 1
+        yield resultat
+
+
+def run_streaming(input_file, writer, num_cores, chunksize=50000, max_in_flight=None, worker=process_chunk,
+                  report=None):
+    """
+    Traite le fichier en flux : les morceaux sont lus à la demande, traités par le pool
+    (imap) puis transmis à l'écrivain de sortie dès leur retour.
 
-    num_cores = mp.cpu_count()  # Nombre de cœurs disponibles
-    print(f"Utilisation de {num_cores} cœurs pour le traitement.")
+    Au plus `max_in_flight` morceaux sont en mémoire simultanément, ce qui borne la
+    consommation mémoire indépendamment de la taille du fichier d'entrée.
+
+    Args:
+        writer: Écrivain de sortie (voir storage.open_writer).
+        report (RunReport): Rapport d'exécution à compléter (voir instrumentation).
+
+    Returns:
+        int: Nombre de lignes écrites.
+    """
+    if max_in_flight is None:
+        max_in_flight = 2 * num_cores
+    places = threading.Semaphore(max_in_flight)
+    stop_event = threading.Event()
 
     try:
-        # Création du pool de workers
+        chunks = _iter_bounded(iter_clean_chunks(input_file, chunksize=chunksize, report=report),
+                               places, stop_event)
         with mp.Pool(num_cores) as pool:
-            # Traitement en parallèle des morceaux (chunks)
-            processed_chunks = pool.map(process_chunk, chunks)
+            try:
+                # imap conserve l'ordre des morceaux : la sortie reste déterministe
+                for processed in _imap(pool, worker, chunks, report):
+                    with stage(report, 'write', rows_in=len(processed)):
+                        writer.write(processed)
+                    places.release()
+            finally:
+                # Débloque le générateur de tâches avant l'arrêt du pool
+                stop_event.set()
+    except BaseException:
+        writer.abort()
+        raise
+
+    # La sortie finale n'apparaît qu'une fois le traitement complet
+    with stage(report, 'commit'):
+        writer.commit()
+    return writer.rows
+
+
+def process_block(task, worker=process_chunk, counters=None):
+    """Lit, nettoie et traite une plage d'octets du fichier d'entrée (exécuté dans un worker)."""
+    input_file, header, start, end = task
+    return worker(clean_chunk(read_block(input_file, header, start, end, dtype=read_dtypes(raw=True)), counters))
+
+
+def process_range(task, spec, worker=process_chunk, counters=None):
+    """
+    Lit, nettoie, traite et écrit une plage d'octets du fichier d'entrée (exécuté dans un worker).
+
+    Seule la description des fichiers produits est renvoyée au processus principal.
+    """
+    input_file, _, start, _ = task
+    cle = hashlib.sha1(os.path.abspath(input_file).encode('utf-8')).hexdigest()[:8]
+    return write_part(process_block(task, worker=worker, counters=counters), spec, f'{cle}-{start:014d}')
 
-        # Fusionner tous les morceaux et sauvegarder
-        final_df = pd.concat(processed_chunks, ignore_index=True)
-        final_df.to_csv(output_file, sep=";", index=False)
 
-        print(f"Calcul terminé, fichier sauvegardé sous '{output_file}'")
+def run_parallel(input_path, output, num_cores, output_format='csv', partition_by_arc=False, split_arcs=True,
+                 block_bytes=None, worker=process_chunk, report=None):
+    """
+    Traite le fichier en parallèle par plages d'octets, sans transiter par le processus principal.
+
+    Le fichier est découpé en plages alignées sur les fins de ligne ; chaque worker lit
+    sa plage directement sur le disque, la nettoie, la traite et écrit ses propres
+    fichiers de sortie (voir storage.PartOutput). Seuls les chemins et quelques
+    statistiques traversent les frontières entre processus : le processus principal
+    ne lit ni ne sérialise aucune donnée, et le débit croît avec le nombre de cœurs.
+
+    Args:
+        input_path (str): Fichier d'entrée, ou répertoire d'exports CSV.
+        block_bytes (int): Taille des plages ; par défaut, environ quatre plages par
+            cœur (entre 1 et 32 Mo), pour équilibrer la charge des workers.
+        report (RunReport): Rapport d'exécution à compléter (voir instrumentation).
+
+    Returns:
+        int: Nombre de lignes écrites.
+    """
+    fichiers = [(f, *read_header(f)) for f in list_input_files(input_path)]
+    if block_bytes is None:
+        total = sum(os.path.getsize(f) - debut for f, _, debut in fichiers)
+        block_bytes = min(32 << 20, max(1 << 20, -(-total // (4 * num_cores))))
+    with stage(report, 'plan') as etape:
+        tasks = [(f, header, s, e) for f, header, debut in fichiers if header
+                 for s, e in iter_line_blocks(f, debut, os.path.getsize(f), block_bytes, to_eof=True)]
+        etape.count('tasks', len(tasks))
+
+    sortie = PartOutput(output, output_format, partition_by_arc=partition_by_arc, split_arcs=split_arcs)
+    try:
+        with mp.Pool(num_cores) as pool:
+            # Les résultats sont de simples descriptions de fichiers : pas besoin de borner les tâches en cours
+            parts = list(_imap(pool, partial(process_range, spec=sortie.spec(), worker=worker), tasks, report,
+                               with_counters=True))
+        with stage(report, 'commit', rows_in=sum(p['rows'] for p in parts)):
+            sortie.commit(parts)
+    except BaseException:
+        sortie.abort()
+        raise
+    return sortie.rows
+
+
+def run_incremental(input_path, output, num_cores, output_format='csv', partition_by_arc=False,
+                    split_arcs=True, block_bytes=32 << 20, max_in_flight=None, worker=process_chunk,
+                    report=None):
+    """
+    Traite uniquement les données nouvelles depuis la dernière exécution.
+
+    Le manifeste (`<sortie>.manifest.json`) enregistre, pour chaque fichier d'entrée
+    (fichier unique ou exports CSV d'un répertoire), les plages d'octets déjà traitées.
+    Seules les plages manquantes sont lues ; chaque morceau est ajouté à la sortie puis
+    validé dans le manifeste, de sorte qu'une exécution interrompue reprend au dernier
+    morceau validé.
+
+    Args:
+        report (RunReport): Rapport d'exécution à compléter (voir instrumentation).
+
+    Returns:
+        int: Nombre de lignes ajoutées, ou None si la sortie ne peut pas être complétée.
+    """
+    manifest_file = manifest_path_for(output)
+    if not os.path.exists(manifest_file) and os.path.exists(output):
+        print(f"Erreur : '{output}' existe mais n'a pas été produit en mode incrémental "
+              f"(supprimez-le ou relancez sans incremental).")
+        return None
+    manifest = Manifest.load(manifest_file)
+
+    # CSV : annule les lignes écrites après la dernière validation (exécution interrompue)
+    taille_validee = manifest.data['output_size'] or 0
+    if output_format == 'csv' and os.path.exists(output) and os.path.getsize(output) > taille_validee:
+        with open(output, 'r+b') as sortie:
+            sortie.truncate(taille_validee)
+
+    tasks = []
+    with stage(report, 'plan') as etape:
+        for input_file in list_input_files(input_path):
+            header, data_start = read_header(input_file)
+            if not header:
+                continue
+            manifest.register_file(input_file, header, data_start)
+            for debut, fin in manifest.pending_ranges(input_file, os.path.getsize(input_file)):
+                tasks.extend((input_file, header, s, e) for s, e in iter_line_blocks(input_file, debut, fin, block_bytes))
+        manifest.save()
+        etape.count('tasks', len(tasks))
+    if not tasks:
+        return 0
+
+    if max_in_flight is None:
+        max_in_flight = 2 * num_cores
+    places = threading.Semaphore(max_in_flight)
+    stop_event = threading.Event()
+    writer = open_writer(output, output_format, partition_by_arc=partition_by_arc,
+                         split_arcs=split_arcs, append=True)
+    rows = 0
+    with mp.Pool(num_cores) as pool:
+        try:
+            resultats = _imap(pool, partial(process_block, worker=worker), _iter_bounded(tasks, places, stop_event),
+                              report, with_counters=True)
+            for (input_file, _, start, end), processed in zip(tasks, resultats):
+                # Nom de fichier déterministe : un morceau retraité après une interruption remplace l'ancien
+                cle = hashlib.sha1(os.path.abspath(input_file).encode('utf-8')).hexdigest()[:8]
+                with stage(report, 'write', rows_in=len(processed)):
+                    writer.write(processed, part_name=f'{cle}-{start:014d}')
+                with stage(report, 'checkpoint'):
+                    writer.checkpoint()
+                    manifest.mark_processed(
+                        input_file, start, end, len(processed), partition_dates(processed),
+                        output_size=os.path.getsize(output) if output_format == 'csv' else None,
+                    )
+                    manifest.save()
+                rows += len(processed)
+                places.release()
+        finally:
+            # Débloque le générateur de tâches avant l'arrêt du pool
+            stop_event.set()
+    with stage(report, 'commit'):
+        writer.commit()
+    return rows
+
+
+def main(input_file="data_frame.csv", output_file="data_cleaned.csv", streaming=True,
+         emission_config=None, scenarios=None, output_format='csv', partition_by_arc=False,
+         split_arcs=True, incremental=False, parallel=True, report_file=None, profile_stages=None,
+         profiler='cprofile', profile_dir=None):
+    """
+    Exécute le programme principal avec multiprocessing.
+
+    Args:
+        output_format (str): 'csv' (fichier unique) ou 'parquet' (jeu partitionné par date,
+            écrit dans le répertoire `output_file` sans extension).
+        partition_by_arc (bool): Partitionne aussi le jeu Parquet par 'Identifiant arc'.
+        split_arcs (bool): Écrit la géométrie, la longueur et les libellés une seule fois par
+            arc dans une table des arcs (`<sortie>_arcs.csv` / `.parquet`), la table de faits
+            ne gardant que 'Identifiant arc' comme référence (défaut). Avec False, la sortie
+            reste un fichier unique avec toutes ses colonnes, comme avant la table des arcs.
+        emission_config (str): Fichier des tables d'émission (emission_factors.json par défaut).
+        scenarios (list): Scénarios d'émission supplémentaires, calculés dans la même passe
+            (une colonne 'Emission_CO2_<nom>' par scénario).
+        parallel (bool): Chaque worker lit, traite et écrit sa propre plage d'octets du
+            fichier (voir run_parallel) ; avec False, le processus principal lit le fichier
+            et transmet les morceaux au pool (`streaming`, ou mode historique en mémoire).
+        report_file (str): Rapport d'exécution JSON (`<sortie>.run.json` par défaut).
+        profile_stages (list): Étapes à profiler ('read_clean', 'worker', 'write', ... ou 'all').
+        profiler (str): 'cprofile' ou 'sampling'.
+        profile_dir (str): Répertoire des fichiers de profil.
+    """
+    if not os.path.exists(input_file):
+        print(f"Erreur : Le fichier {input_file} n'existe pas.")
+        return
+
+    try:
+        worker = partial(process_chunk, emission_scenarios=select_scenarios(scenarios, emission_config))
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Erreur dans la configuration des émissions : {e}")
+        return
+
+    if output_format == 'parquet' and output_file.endswith('.csv'):
+        output_file = output_file[:-4]
+
+    num_cores = mp.cpu_count()  # Nombre de cœurs disponibles
+    print(f"Utilisation de {num_cores} cœurs pour le traitement.")
+
+    mode = 'incremental' if incremental else 'parallel' if parallel else 'streaming' if streaming else 'legacy'
+    report = RunReport('etl', profile_stages=profile_stages, profiler=profiler, profile_dir=profile_dir, params={
+        'input_file': input_file, 'output_file': output_file, 'output_format': output_format, 'mode': mode,
+        'split_arcs': split_arcs, 'partition_by_arc': partition_by_arc, 'num_cores': num_cores,
+    })
+    status, erreur = 'ok', None
+    try:
+        if incremental:
+            rows = run_incremental(input_file, output_file, num_cores, output_format=output_format,
+                                   partition_by_arc=partition_by_arc, split_arcs=split_arcs, worker=worker,
+                                   report=report)
+            if rows is None:
+                status = 'error'
+            else:
+                print(f"Calcul terminé, {rows} nouvelles lignes ajoutées à '{output_file}'")
+        elif parallel:
+            rows = run_parallel(input_file, output_file, num_cores, output_format=output_format,
+                                partition_by_arc=partition_by_arc, split_arcs=split_arcs, worker=worker,
+                                report=report)
+            print(f"Calcul terminé, {rows} lignes sauvegardées sous '{output_file}'")
+        elif streaming:
+            writer = open_writer(output_file, output_format, partition_by_arc=partition_by_arc,
+                                 split_arcs=split_arcs)
+            rows = run_streaming(input_file, writer, num_cores, worker=worker, report=report)
+            print(f"Calcul terminé, {rows} lignes sauvegardées sous '{output_file}'")
+        else:
+            # Mode historique : tous les morceaux sont chargés en mémoire avant traitement
+            chunks = load_and_clean_data(input_file, report=report)
+            if chunks is None:
+                status = 'error'
+                return
+
+            # Création du pool de workers
+            with mp.Pool(num_cores) as pool:
+                # Traitement en parallèle des morceaux (chunks)
+                with report.stage('pool_map', rows_in=sum(len(c) for c in chunks)):
+                    processed_chunks = list(_imap(pool, worker, chunks, report))
+
+            # Fusionner tous les morceaux et sauvegarder
+            with report.stage('concat'):
+                final_df = pd.concat(processed_chunks, ignore_index=True)
+            writer = open_writer(output_file, output_format, partition_by_arc=partition_by_arc,
+                                 split_arcs=split_arcs)
+            with report.stage('write', rows_in=len(final_df)):
+                writer.write(final_df)
+            with report.stage('commit'):
+                writer.commit()
+
+            print(f"Calcul terminé, fichier sauvegardé sous '{output_file}'")
     except Exception as e:
+        status, erreur = 'error', e
         print(f"Erreur lors du traitement : {e}")
+    finally:
+        report.finish(status, erreur)
+        report_file = report_file or output_file.rstrip('/\\') + '.run.json'
+        print(report.summary())
+        print(f"Rapport d'exécution enregistré sous '{report.save(report_file)}'")
 
 if __name__ == "__main__":
     main()
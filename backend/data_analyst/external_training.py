@@ -0,0 +1,251 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from xgboost import XGBRegressor
+
+# Ajouter le répertoire racine du projet à sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from backend.data_analyst.instrumentation import RunReport
+
+### Entraînement XGBoost hors mémoire sur un jeu du magasin de features ###
+
+# Hyperparamètres de l'entraînement hors mémoire (meilleur candidat de la recherche par halving)
+EXTERNAL_PARAMS = {'n_estimators': 200, 'max_depth': 15, 'learning_rate': 0.1}
+BATCH_ROWS = 500000
+TEST_SIZE = 0.2
+ROBUST_TOLERANCE = 0.10
+
+
+def test_rows(start, stop, test_size=TEST_SIZE, seed=42):
+    """
+    Lignes [start, stop) réservées au test.
+
+    Le tirage dépend du seul rang de la ligne (hachage de Fibonacci) : chaque lot
+    calcule sa part sans connaître les autres, et le découpage est identique d'une
+    passe à l'autre et quelle que soit la taille des lots.
+    """
+    rangs = np.arange(start, stop, dtype=np.uint64) + np.uint64(seed)
+    hache = rangs * np.uint64(0x9E3779B97F4A7C15)  # multiplication modulo 2**64
+    return (hache >> np.uint64(40)).astype(np.float64) / float(1 << 24) < test_size
+
+
+def iter_split(features, batch_rows=BATCH_ROWS, split=None, test_size=TEST_SIZE):
+    """
+    Lots (début, X, y) lus depuis les fichiers projetés en mémoire du jeu.
+
+    Args:
+        split (str): 'train', 'test' ou None (toutes les lignes, avec le masque de test).
+
+    Yields:
+        tuple: (début du lot, X float32, y, masque de test) ; X et y sont des copies
+            du lot seulement.
+    """
+    for debut in range(0, len(features), batch_rows):
+        fin = min(debut + batch_rows, len(features))
+        test = test_rows(debut, fin, test_size)
+        garder = slice(None) if split is None else (test if split == 'test' else ~test)
+        yield debut, np.asarray(features.X[debut:fin][garder]), np.asarray(features.y[debut:fin][garder]), test
+
+
+class FeatureBatchIter(xgb.DataIter):
+    """
+    Itérateur de lots pour les DMatrix hors mémoire de XGBoost.
+
+    XGBoost parcourt les lots une fois pour construire ses pages (quantiles puis
+    histogrammes), écrites sous `cache_prefix` : seul le lot courant est en mémoire.
+    """
+
+    def __init__(self, features, batch_rows=BATCH_ROWS, split='train', test_size=TEST_SIZE, cache_prefix=None):
+        self.features, self.batch_rows, self.split, self.test_size = features, batch_rows, split, test_size
+        self._lots = None
+        self.batches = 0
+        # Pages écrites sur disque (et non gardées en mémoire) : la mémoire reste bornée
+        super().__init__(cache_prefix=cache_prefix, on_host=False)
+
+    def next(self, input_data):
+        if self._lots is None:
+            self._lots = iter_split(self.features, self.batch_rows, self.split, self.test_size)
+        lot = next(self._lots, None)
+        if lot is None:
+            return False
+        _, X, y, _ = lot
+        input_data(data=X, label=y)
+        self.batches += 1
+        return True
+
+    def reset(self):
+        self._lots = None
+
+
+def train_booster(features, params=None, batch_rows=BATCH_ROWS, n_threads=None, cache_dir=None, report=None):
+    """
+    Entraîne XGBoost ('hist') sur les lignes d'entraînement, lues lot par lot.
+
+    Args:
+        features (FeatureSet): Jeu du magasin de features (X et y projetés en mémoire).
+        params (dict): n_estimators, max_depth, learning_rate (EXTERNAL_PARAMS par défaut).
+        batch_rows (int): Lignes par lot.
+        n_threads (int): Threads de XGBoost (tous les cœurs par défaut).
+        cache_dir (str): Répertoire des pages de XGBoost (temporaire par défaut).
+
+    Returns:
+        XGBRegressor: Modèle entraîné.
+    """
+    report = report or RunReport('external_training')
+    params = {**EXTERNAL_PARAMS, **(params or {})}
+    n_threads = n_threads or os.cpu_count() or 1
+    cache = cache_dir or tempfile.mkdtemp(prefix='xgb-cache-')
+    dtrain = None
+    try:
+        iterateur = FeatureBatchIter(features, batch_rows, 'train', cache_prefix=os.path.join(cache, 'train'))
+        with report.stage('external_dmatrix', rows_in=len(features)) as etape:
+            dtrain = xgb.ExtMemQuantileDMatrix(iterateur, max_bin=256, nthread=n_threads)
+            etape.add_rows(rows_out=dtrain.num_row())
+            etape.count('batches', iterateur.batches)
+        with report.stage('external_train', rows_in=dtrain.num_row()) as etape:
+            booster = xgb.train({'objective': 'reg:squarederror', 'tree_method': 'hist', 'seed': 42,
+                                 'max_depth': params['max_depth'], 'eta': params['learning_rate'],
+                                 'nthread': n_threads},
+                                dtrain, num_boost_round=params['n_estimators'])
+            etape.details.update(params=params, batch_rows=batch_rows, n_threads=n_threads)
+    finally:
+        # Les pages sont libérées avec la DMatrix, avant la suppression de leur répertoire
+        dtrain = None
+        if cache_dir is None:
+            shutil.rmtree(cache, ignore_errors=True)
+    # Même interface que les modèles de la recherche (predict sur un tableau de features)
+    model = XGBRegressor(n_jobs=n_threads)
+    model.load_model(bytearray(booster.save_raw('json')))
+    return model
+
+
+class StreamingRegressionMetrics:
+    """R², robustesse et matrice de confusion accumulés lot par lot."""
+
+    def __init__(self, threshold=None, center=0.0):
+        self.threshold, self.center = threshold, center
+        self.n = 0
+        self.somme = 0.0        # somme de (y - center)
+        self.somme_carres = 0.0
+        self.sse = 0.0
+        self.robustes = 0
+        self.confusion = np.zeros((2, 2), dtype=np.int64)
+
+    def update(self, y_true, y_pred):
+        y_true = np.asarray(y_true, dtype=np.float64)
+        y_pred = np.asarray(y_pred, dtype=np.float64)
+        ecart = y_true - self.center
+        self.n += len(y_true)
+        self.somme += ecart.sum()
+        self.somme_carres += (ecart ** 2).sum()
+        self.sse += ((y_true - y_pred) ** 2).sum()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.robustes += int((np.abs(y_pred - y_true) / y_true < ROBUST_TOLERANCE).sum())
+        if self.threshold is not None:
+            np.add.at(self.confusion, ((y_true > self.threshold).astype(int), (y_pred > self.threshold).astype(int)), 1)
+
+    @property
+    def r2(self):
+        sst = self.somme_carres - self.somme ** 2 / self.n if self.n else 0.0
+        return 1.0 - self.sse / sst if sst > 0 else float('nan')
+
+    @property
+    def robust(self):
+        return self.robustes / self.n if self.n else float('nan')
+
+
+def evaluate_streaming(model, features, batch_rows=BATCH_ROWS, report=None):
+    """
+    Évaluation en deux passes de lecture, sans charger le jeu.
+
+    La première passe ne lit que la cible des lignes de test, pour la médiane qui
+    sépare les classes de la matrice de confusion ; la seconde prédit chaque lot.
+
+    Returns:
+        dict: r2_train, r2_test, robust_test, confusion (liste 2x2), median_cost.
+    """
+    report = report or RunReport('external_training')
+    with report.stage('external_evaluate', rows_in=len(features)) as etape:
+        cibles = [np.asarray(features.y[debut:debut + batch_rows])[test_rows(debut, min(debut + batch_rows, len(features)))]
+                  for debut in range(0, len(features), batch_rows)]
+        y_test = np.concatenate(cibles) if cibles else np.empty(0)
+        mediane = float(np.median(y_test)) if len(y_test) else float('nan')
+        centre = float(y_test.mean()) if len(y_test) else 0.0
+        del cibles, y_test
+        train = StreamingRegressionMetrics(center=centre)
+        test = StreamingRegressionMetrics(threshold=mediane, center=centre)
+        booster = model.get_booster()
+        for _, X, y, masque in iter_split(features, batch_rows):
+            prediction = booster.inplace_predict(X)
+            train.update(y[~masque], prediction[~masque])
+            test.update(y[masque], prediction[masque])
+        resultats = {'r2_train': train.r2, 'r2_test': test.r2, 'robust_test': test.robust,
+                     'confusion': test.confusion.tolist(), 'median_cost': mediane,
+                     'train_rows': train.n, 'test_rows': test.n}
+        etape.details.update(resultats)
+    return resultats
+
+
+def export_aux_csv(features, columns, path, batch_rows=BATCH_ROWS):
+    """Écrit des colonnes annexes du jeu en CSV, lot par lot."""
+    for debut in range(0, len(features), batch_rows):
+        lot = pd.DataFrame({c: features.aux[c][debut:debut + batch_rows] for c in columns})
+        lot.to_csv(path, index=False, mode='w' if debut == 0 else 'a', header=debut == 0)
+
+
+def benchmark_batch_sizes(features, batch_sizes, params=None, n_threads=None, report=None):
+    """
+    Entraîne et évalue le modèle pour chaque taille de lot.
+
+    Chaque taille est mesurée dans sa propre étape du rapport : durée, débit
+    (lignes par seconde) et pic de mémoire résidente (remis à zéro par étape).
+
+    Returns:
+        list: Une mesure par taille de lot.
+    """
+    report = report or RunReport('external_batches')
+    mesures = []
+    for batch_rows in batch_sizes:
+        debut = time.perf_counter()
+        with report.stage(f'batch_{batch_rows}', rows_in=len(features)) as etape:
+            model = train_booster(features, params, batch_rows, n_threads, report=report)
+            resultats = evaluate_streaming(model, features, batch_rows, report=report)
+        duree = time.perf_counter() - debut
+        mesure = {'batch_rows': batch_rows, 'seconds': round(duree, 3),
+                  'rows_per_s': round(len(features) / duree, 1) if duree else None,
+                  'peak_rss_mb': etape.peak_rss_mb, 'r2_test': round(resultats['r2_test'], 4),
+                  'robust_test': round(resultats['robust_test'], 4)}
+        etape.details.update(mesure)
+        mesures.append(mesure)
+        print(f"lots de {batch_rows:>9,} lignes : {duree:8.2f}s  {mesure['rows_per_s'] or 0:>12,.0f} lignes/s"
+              + (f"  pic RSS {etape.peak_rss_mb:8.1f} Mo" if etape.peak_rss_mb is not None else '')
+              + f"  R² test {resultats['r2_test']:.4f}")
+    return mesures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mesure l'entraînement hors mémoire pour plusieurs tailles de lots.")
+    parser.add_argument('--data', help="Données nettoyées (data_cleaned par défaut)")
+    parser.add_argument('--weather', help="CSV météo nettoyé")
+    parser.add_argument('--last-days', type=int)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[100000, 500000, 2000000])
+    parser.add_argument('--threads', type=int)
+    parser.add_argument('--output', default='external_batches.run.json', help="Rapport JSON")
+    args = parser.parse_args()
+
+    # Import tardif : ML charge scikit-learn et networkx
+    from backend.data_analyst.ML import load_streamed_features
+    rapport = RunReport('external_batches', params=vars(args))
+    jeu = load_streamed_features(args.data, args.weather, args.last_days, report=rapport)
+    benchmark_batch_sizes(jeu, args.batch_sizes, n_threads=args.threads, report=rapport)
+    rapport.finish()
+    rapport.save(args.output)
+    print(rapport.summary())
@@ -0,0 +1,249 @@
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import struct
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+### Magasin de features sur disque (matrice d'entraînement réutilisable) ###
+
+FEATURE_STORE_DIR = 'feature_store'
+STORE_VERSION = 1
+
+
+def input_fingerprint(path):
+    """
+    Empreinte d'un fichier ou d'un répertoire d'entrée (chemin relatif, taille et date
+    de modification de chaque fichier) ; None si le chemin n'existe pas.
+
+    Le contenu n'est pas relu : l'empreinte est immédiate même sur plusieurs Go.
+    """
+    if path is None or not os.path.exists(path):
+        return None
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return [[os.path.basename(path), stat.st_size, stat.st_mtime_ns]]
+    fichiers = []
+    for racine, dossiers, noms in os.walk(path):
+        dossiers.sort()
+        for nom in sorted(noms):
+            chemin = os.path.join(racine, nom)
+            stat = os.stat(chemin)
+            fichiers.append([os.path.relpath(chemin, path), stat.st_size, stat.st_mtime_ns])
+    return fichiers
+
+
+def code_fingerprint(*functions):
+    """Empreinte du code source des fonctions qui définissent les features."""
+    sha = hashlib.sha1()
+    for fonction in functions:
+        sha.update(inspect.getsource(fonction).encode('utf-8'))
+    return sha.hexdigest()[:16]
+
+
+class NpyAppender:
+    """
+    Écriture d'un fichier .npy par ajouts successifs, sans connaître le nombre de lignes.
+
+    Une en-tête de taille fixe est réservée à l'ouverture et complétée à la
+    fermeture (format .npy 1.0 : la description est complétée par des espaces).
+    """
+    HEADER_BYTES = 128
+
+    def __init__(self, path, dtype, width=None):
+        self.path, self.dtype, self.width = path, np.dtype(dtype), width
+        self.rows = 0
+        self._fichier = open(path, 'wb')
+        self._fichier.write(b'\0' * self.HEADER_BYTES)
+
+    def append(self, values):
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        self._fichier.write(values.tobytes())
+        self.rows += len(values)
+
+    def close(self):
+        forme = (self.rows,) if self.width is None else (self.rows, self.width)
+        description = repr({'descr': np.lib.format.dtype_to_descr(self.dtype), 'fortran_order': False,
+                            'shape': forme}).encode('latin1')
+        taille = self.HEADER_BYTES - 10
+        entete = b'\x93NUMPY\x01\x00' + struct.pack('<H', taille) + description.ljust(taille - 1) + b'\n'
+        self._fichier.seek(0)
+        self._fichier.write(entete)
+        self._fichier.close()
+
+
+@dataclass
+class FeatureSet:
+    """
+    Matrice de features et cible d'un entraînement.
+
+    `X` et `y` sont projetés en mémoire (np.memmap) lorsqu'ils sont relus depuis le
+    magasin : le chargement est immédiat et seules les pages utilisées sont lues.
+    """
+    X: np.ndarray
+    y: np.ndarray
+    feature_names: list
+    aux: dict = field(default_factory=dict)  # colonnes annexes (identifiants, coordonnées...)
+    key: str = None
+    path: str = None
+
+    def __len__(self):
+        return len(self.y)
+
+    def frame(self, columns=None):
+        """Colonnes annexes en DataFrame."""
+        columns = columns or list(self.aux)
+        return pd.DataFrame({c: self.aux[c] for c in columns})
+
+
+class FeatureStore:
+    """
+    Magasin de matrices de features, indexé par l'empreinte des entrées et de la
+    définition des features.
+
+    Chaque jeu est stocké dans `<root>/<clé>/` : `X.npy` (matrice float32 en ordre C),
+    `y.npy`, une colonne annexe par fichier `aux-<i>.npy` et `meta.json`, écrit en
+    dernier (un jeu sans meta.json est incomplet et ignoré).
+    """
+
+    def __init__(self, root=FEATURE_STORE_DIR):
+        self.root = root
+
+    def key(self, inputs, version, params=None):
+        """
+        Clé d'un jeu de features.
+
+        Args:
+            inputs (dict): Chemins des fichiers d'entrée par rôle ('traffic', 'weather'...).
+            version (str): Version de la définition des features (et empreinte du code).
+            params (dict): Paramètres qui changent le contenu (fenêtre de dates...).
+        """
+        description = {
+            'store': STORE_VERSION,
+            'version': version,
+            'inputs': {role: input_fingerprint(p) for role, p in sorted(inputs.items())},
+            'params': params or {},
+        }
+        return hashlib.sha1(json.dumps(description, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:20]
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def load(self, key, mmap=True):
+        """Relit un jeu (projeté en mémoire par défaut), ou None s'il n'existe pas."""
+        dossier = self.path(key)
+        meta_file = os.path.join(dossier, 'meta.json')
+        if not os.path.exists(meta_file):
+            return None
+        with open(meta_file, 'r', encoding='utf-8') as fichier:
+            meta = json.load(fichier)
+        mode = 'r' if mmap else None
+        aux = {nom: np.load(os.path.join(dossier, f'aux-{i}.npy'), mmap_mode=mode, allow_pickle=False)
+               for i, nom in enumerate(meta['aux'])}
+        return FeatureSet(
+            X=np.load(os.path.join(dossier, 'X.npy'), mmap_mode=mode),
+            y=np.load(os.path.join(dossier, 'y.npy'), mmap_mode=mode),
+            feature_names=meta['features'], aux=aux, key=key, path=dossier,
+        )
+
+    def save(self, key, X, y, aux=None, meta=None):
+        """
+        Enregistre un jeu de façon atomique (répertoire temporaire renommé).
+
+        Args:
+            X (DataFrame): Features (converties en float32).
+            y (Series): Cible.
+            aux (DataFrame): Colonnes annexes numériques conservées avec le jeu.
+            meta (dict): Informations ajoutées à meta.json.
+        """
+        dossier = self.path(key)
+        tmp = dossier + '.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, 'X.npy'), np.ascontiguousarray(X.to_numpy(dtype=np.float32)))
+        np.save(os.path.join(tmp, 'y.npy'), np.asarray(y))
+        aux = aux if aux is not None else pd.DataFrame(index=X.index)
+        for i, col in enumerate(aux.columns):
+            np.save(os.path.join(tmp, f'aux-{i}.npy'), aux[col].to_numpy(), allow_pickle=False)
+        with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as fichier:
+            json.dump({**(meta or {}), 'features': list(X.columns), 'aux': list(aux.columns), 'rows': len(X),
+                       'created': time.strftime('%Y-%m-%dT%H:%M:%S')}, fichier, indent=2, ensure_ascii=False)
+        shutil.rmtree(dossier, ignore_errors=True)
+        os.replace(tmp, dossier)
+        return self.load(key)
+
+    def save_batches(self, key, batches, meta=None):
+        """
+        Enregistre un jeu produit par lots (X, y, aux), sans le charger en mémoire.
+
+        Même format que save : les lots sont ajoutés aux fichiers .npy au fil de l'eau.
+        """
+        dossier = self.path(key)
+        tmp = dossier + '.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        fichiers, features, annexes = None, None, None
+        try:
+            for X, y, aux in batches:
+                if fichiers is None:
+                    features, annexes = list(X.columns), list(aux.columns)
+                    fichiers = [NpyAppender(os.path.join(tmp, 'X.npy'), np.float32, len(features)),
+                                NpyAppender(os.path.join(tmp, 'y.npy'), np.asarray(y).dtype)]
+                    fichiers += [NpyAppender(os.path.join(tmp, f'aux-{i}.npy'), aux[col].to_numpy().dtype)
+                                 for i, col in enumerate(annexes)]
+                fichiers[0].append(X.to_numpy(dtype=np.float32))
+                fichiers[1].append(np.asarray(y))
+                for fichier, col in zip(fichiers[2:], annexes):
+                    fichier.append(aux[col].to_numpy())
+        finally:
+            for fichier in fichiers or []:
+                fichier.close()
+        if fichiers is None:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise ValueError("Aucune ligne à enregistrer dans le magasin de features")
+        with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as fichier:
+            json.dump({**(meta or {}), 'features': features, 'aux': annexes, 'rows': fichiers[1].rows,
+                       'created': time.strftime('%Y-%m-%dT%H:%M:%S')}, fichier, indent=2, ensure_ascii=False)
+        shutil.rmtree(dossier, ignore_errors=True)
+        os.replace(tmp, dossier)
+        return self.load(key)
+
+    def get_or_build(self, inputs, version, build, params=None, rebuild=False, batches=False):
+        """
+        Jeu de features des entrées, relu depuis le magasin ou construit par `build()`.
+
+        Args:
+            build: Fonction sans argument renvoyant (X, y, aux), ou un itérable de
+                lots (X, y, aux) si `batches`.
+            rebuild (bool): Force la reconstruction.
+            batches (bool): Le jeu est construit et enregistré lot par lot (save_batches).
+
+        Returns:
+            tuple: (FeatureSet, True si le jeu vient du magasin).
+        """
+        key = self.key(inputs, version, params)
+        if not rebuild:
+            features = self.load(key)
+            if features is not None:
+                return features, True
+        meta = {'version': version, 'inputs': inputs, 'params': params or {}}
+        if batches:
+            return self.save_batches(key, build(), meta), False
+        X, y, aux = build()
+        return self.save(key, X, y, aux, meta), False
+
+    def prune(self, keep=None):
+        """Supprime les jeux qui ne sont pas dans `keep` (clés) ; renvoie le nombre supprimé."""
+        if not os.path.isdir(self.root):
+            return 0
+        supprimes = 0
+        for nom in os.listdir(self.root):
+            if keep is None or nom not in keep:
+                shutil.rmtree(os.path.join(self.root, nom), ignore_errors=True)
+                supprimes += 1
+        return supprimes
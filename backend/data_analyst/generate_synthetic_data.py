@@ -0,0 +1,253 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+### Génération de données synthétiques au format des comptages routiers de Paris ###
+
+# En-tête exact de l'export "comptages routiers permanents" (séparateur ';')
+TRAFFIC_HEADER = ['Identifiant arc', 'Libelle', 'Date et heure de comptage', 'Débit horaire',
+                  "Taux d'occupation", 'Etat trafic', 'Identifiant noeud amont', 'Libelle noeud amont',
+                  'Identifiant noeud aval', 'Libelle noeud aval', 'Etat arc', 'Date debut dispo data',
+                  'Date fin dispo data', 'geo_point_2d', 'geo_shape']
+
+# En-tête de l'export météo quotidien (data_weather.csv)
+WEATHER_HEADER = ['NUM_POSTE', 'NOM_USUEL', 'LAT', 'LON', 'ALTI', 'AAAAMMJJ', 'RR', 'QRR', 'TN', 'QTN',
+                  'HTN', 'QHTN', 'TX', 'QTX', 'HTX', 'QHTX', 'TM', 'QTM', 'TNTXM', 'QTNTXM', 'TAMPLI',
+                  'QTAMPLI', 'TNSOL', 'QTNSOL', 'TN50', 'QTN50', 'DG', 'QDG', 'FFM', 'QFFM', 'FF2M', 'QFF2M',
+                  'FXY', 'QFXY', 'DXY', 'QDXY', 'HXY', 'QHXY', 'FXI', 'QFXI', 'DXI', 'QDXI', 'HXI', 'QHXI',
+                  'FXI2', 'QFXI2', 'DXI2', 'QDXI2', 'HXI2', 'QHXI2', 'FXI3S', 'QFXI3S', 'DXI3S', 'QDXI3S',
+                  'HXI3S', 'QHXI3S', 'DRR', 'QDRR']
+
+# Stations météo d'Île-de-France (numéro, nom, latitude, longitude, altitude)
+WEATHER_STATIONS = [
+    (75114001, 'PARIS-MONTSOURIS', 48.821667, 2.337833, 75),
+    (91272001, 'GIF-SUR-YVETTE-INRAE', 48.714333, 2.151000, 157),
+    (95088001, 'ROISSY-CHARLES-DE-GAULLE', 49.015333, 2.534333, 108),
+]
+
+# Emprise de Paris intra-muros (longitude, latitude)
+PARIS_BBOX = (2.25, 48.815, 2.42, 48.902)
+
+ETATS_ARC = ['Ouvert', 'Ouvert', 'Ouvert', 'Ouvert', 'Barré', 'Invalide']
+TYPES_VOIE = ['Rue', 'Av', 'Bd', 'Quai', 'Pl']
+
+
+def build_network(n_arcs, seed=0):
+    """
+    Construit un réseau routier synthétique sur une grille couvrant Paris.
+
+    Chaque arc relie deux nœuds voisins de la grille dans un sens donné (les deux
+    sens d'une même voie sont deux arcs distincts), comme dans les données réelles.
+
+    Args:
+        n_arcs (int): Nombre d'arcs souhaité.
+        seed (int): Graine du générateur aléatoire.
+
+    Returns:
+        DataFrame: Une ligne par arc (identifiants, libellés, géométrie, capacité).
+    """
+    rng = np.random.default_rng(seed)
+    # Une grille g x g contient 4 * g * (g - 1) arcs orientés entre voisins
+    g = 2
+    while 4 * g * (g - 1) < n_arcs:
+        g += 1
+    lon_min, lat_min, lon_max, lat_max = PARIS_BBOX
+    lons = np.linspace(lon_min, lon_max, g)
+    lats = np.linspace(lat_min, lat_max, g)
+    pas = min(lons[1] - lons[0], lats[1] - lats[0])
+    node_lon = np.repeat(lons, g) + rng.uniform(-0.2, 0.2, g * g) * pas
+    node_lat = np.tile(lats, g) + rng.uniform(-0.2, 0.2, g * g) * pas
+    node_ids = 1000 + rng.permutation(g * g * 3)[:g * g]
+
+    idx = np.arange(g * g).reshape(g, g)
+    horizontaux = np.column_stack([idx[:, :-1].ravel(), idx[:, 1:].ravel()])
+    verticaux = np.column_stack([idx[:-1, :].ravel(), idx[1:, :].ravel()])
+    paires = np.vstack([horizontaux, verticaux])
+    paires = np.vstack([paires, paires[:, ::-1]])
+    paires = paires[rng.permutation(len(paires))[:n_arcs]]
+    amont, aval = paires[:, 0], paires[:, 1]
+
+    noms = np.array([f'{TYPES_VOIE[i % len(TYPES_VOIE)]}_{i:04d}' for i in range(g * g)], dtype=object)
+    voie = noms[np.minimum(amont, aval)]
+
+    shapes, points = [], []
+    n_inter = rng.integers(0, 5, n_arcs)
+    for k in range(n_arcs):
+        x = np.linspace(node_lon[amont[k]], node_lon[aval[k]], n_inter[k] + 2)
+        y = np.linspace(node_lat[amont[k]], node_lat[aval[k]], n_inter[k] + 2)
+        # Sommets intermédiaires légèrement décalés : les voies ne sont pas rectilignes
+        x[1:-1] += rng.normal(0, pas * 0.05, n_inter[k])
+        y[1:-1] += rng.normal(0, pas * 0.05, n_inter[k])
+        coords = ', '.join(f'[{a!r}, {b!r}]' for a, b in zip(x.round(9).tolist(), y.round(9).tolist()))
+        shapes.append('"{""coordinates"": [' + coords + '], ""type"": ""LineString""}"')
+        points.append(f'{float(y.mean())!r}, {float(x.mean())!r}')
+
+    return pd.DataFrame({
+        'Identifiant arc': rng.choice(np.arange(1, n_arcs * 10), n_arcs, replace=False),
+        'Libelle': voie,
+        'Identifiant noeud amont': node_ids[amont],
+        'Libelle noeud amont': noms[amont],
+        'Identifiant noeud aval': node_ids[aval],
+        'Libelle noeud aval': noms[aval],
+        'Etat arc': rng.choice(ETATS_ARC, n_arcs),
+        'Date debut dispo data': '2005-01-01',
+        'Date fin dispo data': '2019-06-01',
+        'geo_point_2d': points,
+        'geo_shape': shapes,
+        'capacite': rng.uniform(300, 3000, n_arcs).round(),
+    })
+
+
+def _profil_horaire(heures):
+    """Facteur de charge selon l'heure : pointes du matin et du soir, creux de nuit."""
+    return (0.15 + 0.85 * np.exp(-((heures - 8.5) ** 2) / 4.0)
+            + 0.75 * np.exp(-((heures - 18.0) ** 2) / 6.0) + 0.35 * np.exp(-((heures - 13.0) ** 2) / 8.0))
+
+
+def _etat_trafic(taux, rng):
+    """État du trafic déduit du taux d'occupation, avec une part de mesures invalides ou inconnues."""
+    etats = np.select([taux < 10, taux < 20, taux < 35], ['Fluide', 'Pré-saturé', 'Saturé'], 'Bloqué').astype(object)
+    tirage = rng.random(len(taux))
+    etats[tirage < 0.02] = 'Invalide'
+    etats[(tirage >= 0.02) & (tirage < 0.04)] = 'Inconnu'
+    return etats
+
+
+def generate_traffic(output_file, n_rows, n_arcs=3000, start='2024-01-01', seed=0, missing_rate=0.001,
+                     block_rows=500000):
+    """
+    Écrit un fichier de comptages horaires synthétique au format de l'export de Paris.
+
+    Les lignes sont produites heure par heure (tous les arcs pour chaque heure) et
+    écrites par blocs : la mémoire reste bornée quelle que soit la taille demandée
+    (de 10 000 à plusieurs dizaines de millions de lignes). À graine identique, le
+    fichier produit est identique octet pour octet.
+
+    Args:
+        output_file (str): Fichier CSV à écrire.
+        n_rows (int): Nombre de lignes de données.
+        n_arcs (int): Nombre d'arcs du réseau.
+        start (str): Premier jour de comptage (heure locale de Paris).
+        seed (int): Graine du générateur aléatoire.
+        missing_rate (float): Part de lignes dont le débit est manquant (supprimées par l'ETL).
+        block_rows (int): Nombre de lignes générées et écrites à la fois.
+
+    Returns:
+        DataFrame: Le réseau utilisé (une ligne par arc).
+    """
+    rng = np.random.default_rng(seed)
+    n_arcs = max(1, min(n_arcs, n_rows))
+    network = build_network(n_arcs, seed)
+    # Parties constantes de chaque ligne, préparées une fois par arc
+    prefixes = (network['Identifiant arc'].astype(str) + ';' + network['Libelle'] + ';').to_numpy(dtype=object)
+    suffixes = (';' + network['Identifiant noeud amont'].astype(str) + ';' + network['Libelle noeud amont']
+                + ';' + network['Identifiant noeud aval'].astype(str) + ';' + network['Libelle noeud aval']
+                + ';' + network['Etat arc'] + ';' + network['Date debut dispo data']
+                + ';' + network['Date fin dispo data'] + ';' + network['geo_point_2d']
+                + ';' + network['geo_shape'] + '\n').to_numpy(dtype=object)
+    capacite = network['capacite'].to_numpy()
+
+    n_hours = -(-n_rows // n_arcs)
+    heures = pd.date_range(pd.Timestamp(start).tz_localize('Europe/Paris'), periods=n_hours, freq='h')
+    # Horodatage ISO 8601 avec le décalage horaire de Paris (+01:00 / +02:00), formaté une fois par heure
+    horodatages = np.array([h.isoformat() for h in heures], dtype=object)
+    charge = _profil_horaire(heures.hour.to_numpy()) * np.where(heures.weekday.to_numpy() >= 5, 0.7, 1.0)
+
+    heures_par_bloc = max(1, block_rows // n_arcs)
+    ecrites = 0
+    with open(output_file, 'w', encoding='utf-8', newline='') as fichier:
+        fichier.write(';'.join(TRAFFIC_HEADER) + '\n')
+        for h0 in range(0, n_hours, heures_par_bloc):
+            h1 = min(n_hours, h0 + heures_par_bloc)
+            n = min((h1 - h0) * n_arcs, n_rows - ecrites)
+            arc = np.tile(np.arange(n_arcs), h1 - h0)[:n]
+            heure = np.repeat(np.arange(h0, h1), n_arcs)[:n]
+
+            debit = np.maximum(0, capacite[arc] * charge[heure] * rng.lognormal(0, 0.25, n)).round()
+            taux = np.clip(debit / capacite[arc] * 22 + rng.normal(0, 2.5, n), 0, 100)
+            debits = debit.astype(np.int64).astype(str).astype(object)
+            debits[rng.random(n) < missing_rate] = ''
+            lignes = (prefixes[arc] + horodatages[heure] + ';' + debits + ';'
+                      + np.char.mod('%.5f', taux).astype(object) + ';' + _etat_trafic(taux, rng) + suffixes[arc])
+            fichier.write(''.join(lignes))
+            ecrites += n
+    return network
+
+
+def generate_weather(output_file, start='2024-01-01', days=366, stations=None, seed=0):
+    """
+    Écrit un fichier météo quotidien synthétique au format de data_weather.csv.
+
+    Une ligne par station et par jour ; les colonnes supprimées par
+    data_weather_cleaning.py sont laissées vides, comme dans l'export réel.
+
+    Args:
+        output_file (str): Fichier CSV à écrire.
+        start (str): Premier jour.
+        days (int): Nombre de jours.
+        stations (list): Stations (numéro, nom, latitude, longitude, altitude),
+            WEATHER_STATIONS par défaut.
+        seed (int): Graine du générateur aléatoire.
+    """
+    rng = np.random.default_rng(seed)
+    stations = stations or WEATHER_STATIONS
+    jours = pd.date_range(start, periods=days, freq='D')
+    saison = np.cos(2 * np.pi * (jours.dayofyear.to_numpy() - 200) / 365.25)
+    frames = []
+    for num, nom, lat, lon, alti in stations:
+        tm = 12.5 + 8.0 * saison + rng.normal(0, 2.0, days) - (alti - 75) / 150
+        amplitude = rng.uniform(4, 12, days)
+        tn, tx = tm - amplitude / 2, tm + amplitude / 2
+        pluie = np.where(rng.random(days) < 0.45, rng.gamma(0.8, 4.0, days), 0.0)
+        vent = rng.gamma(4.0, 0.9, days)
+        df = pd.DataFrame('', index=range(days), columns=WEATHER_HEADER)
+        df['NUM_POSTE'], df['NOM_USUEL'], df['ALTI'] = num, nom, alti
+        df['LAT'], df['LON'] = f'{lat:.6f}', f'{lon:.6f}'
+        df['AAAAMMJJ'] = jours.strftime('%Y%m%d')
+        valeurs = {
+            'RR': pluie, 'TN': tn, 'TX': tx, 'TM': tm, 'TNTXM': (tn + tx) / 2, 'TAMPLI': amplitude,
+            'TNSOL': tn - rng.uniform(0, 3, days), 'TN50': tn - rng.uniform(0, 1, days),
+            'FF2M': vent, 'FXI2': vent * rng.uniform(1.8, 3.5, days),
+        }
+        for col, v in valeurs.items():
+            df[col] = np.round(v, 1)
+            df['Q' + col] = 1 if col in ('RR', 'TN', 'TX', 'TM', 'TNTXM', 'TAMPLI') else 9
+        df['HTN'] = rng.integers(0, 24, days) * 100 + rng.integers(0, 60, days)
+        df['HTX'] = rng.integers(0, 24, days) * 100 + rng.integers(0, 60, days)
+        df['DXI2'] = rng.integers(1, 37, days) * 10
+        df['HXI2'] = rng.integers(0, 24, days) * 100 + rng.integers(0, 60, days)
+        for col in ('HTN', 'HTX', 'DXI2', 'HXI2'):
+            df['Q' + col] = 9
+        frames.append(df)
+    pd.concat(frames, ignore_index=True).to_csv(output_file, sep=';', index=False)
+
+
+def generate_dataset(output_dir, n_rows, n_arcs=3000, start='2024-01-01', seed=0):
+    """
+    Génère un jeu complet (comptages + météo couvrant la même période) dans `output_dir`.
+
+    Returns:
+        dict: Chemins des fichiers produits.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    traffic = os.path.join(output_dir, 'data_frame.csv')
+    weather = os.path.join(output_dir, 'data_weather.csv')
+    n_arcs = max(1, min(n_arcs, n_rows))
+    generate_traffic(traffic, n_rows, n_arcs=n_arcs, start=start, seed=seed)
+    days = -(-n_rows // n_arcs) // 24 + 2
+    generate_weather(weather, start=start, days=days, seed=seed)
+    return {'traffic': traffic, 'weather': weather}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Génère des comptages routiers et une météo synthétiques.")
+    parser.add_argument('rows', type=int, nargs='?', default=100000, help="Nombre de lignes de comptage")
+    parser.add_argument('--output-dir', default='synthetic_data')
+    parser.add_argument('--arcs', type=int, default=3000)
+    parser.add_argument('--start', default='2024-01-01')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    fichiers = generate_dataset(args.output_dir, args.rows, n_arcs=args.arcs, start=args.start, seed=args.seed)
+    print(f"{args.rows} lignes de comptage écrites dans '{fichiers['traffic']}', météo dans '{fichiers['weather']}'")
@@ -0,0 +1,274 @@
+import re
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+### Analyse vectorisée de la colonne 'geo_shape' ###
+
+# Codes des types géométriques (-1 : type inconnu ou ligne invalide)
+GEO_TYPES = ('Point', 'LineString', 'Polygon', 'MultiPoint', 'MultiLineString', 'MultiPolygon')
+# Type déduit de la profondeur d'imbrication lorsque seul le tableau de coordonnées est fourni
+_TYPE_PAR_PROFONDEUR = {1: 'Point', 2: 'LineString', 3: 'MultiLineString', 4: 'MultiPolygon'}
+
+_COORDS_PUIS_TYPE = re.compile(
+    r'^\s*\{\s*"?coordinates"?\s*:\s*(?P<coords>\[.*\])\s*,\s*"?type"?\s*:\s*"?(?P<type>[A-Za-z]+)"?\s*\}\s*$'
+)
+_TYPE_PUIS_COORDS = re.compile(
+    r'^\s*\{\s*"?type"?\s*:\s*"?(?P<type>[A-Za-z]+)"?\s*,\s*"?coordinates"?\s*:\s*(?P<coords>\[.*\])\s*\}\s*$'
+)
+_NOMBRE = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+_LISTE_NOMBRES = re.compile(rf'^{_NOMBRE}(?:,{_NOMBRE})*$')
+
+
+@dataclass
+class GeoShapeArray:
+    """
+    Ensemble de géométries stocké sous forme de tableau « ragged ».
+
+    Les sommets de toutes les lignes sont concaténés dans `coords` (n_points x 2,
+    colonnes [longitude, latitude]) ; les sommets de la ligne i sont
+    `coords[offsets[i]:offsets[i + 1]]`.
+    """
+    coords: np.ndarray      # float64, forme (n_points, 2)
+    offsets: np.ndarray     # int64, forme (n_lignes + 1,)
+    type_codes: np.ndarray  # int8, index dans GEO_TYPES ou -1
+    valid: np.ndarray       # bool, False pour les lignes mal formées
+
+    def __len__(self):
+        return len(self.type_codes)
+
+    @property
+    def counts(self):
+        """Nombre de sommets par ligne."""
+        return np.diff(self.offsets)
+
+    @property
+    def geo_types(self):
+        """Noms des types géométriques (None pour les codes inconnus)."""
+        noms = np.array(GEO_TYPES + (None,), dtype=object)
+        return noms[self.type_codes]
+
+    def row(self, i):
+        """Sommets de la ligne i."""
+        return self.coords[self.offsets[i]:self.offsets[i + 1]]
+
+    def take(self, indices):
+        """Nouvel ensemble formé des lignes `indices` (avec répétitions possibles)."""
+        indices = np.asarray(indices, dtype=np.int64)
+        starts = self.offsets[:-1][indices]
+        counts = self.counts[indices]
+        offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        # Position de chaque sommet de sortie dans le tableau source
+        source = np.repeat(starts - offsets[:-1], counts) + np.arange(offsets[-1])
+        return GeoShapeArray(self.coords[source], offsets, self.type_codes[indices], self.valid[indices])
+
+
+def split_geo_shape(values):
+    """
+    Sépare chaque valeur de 'geo_shape' en texte des coordonnées et type géométrique.
+
+    Accepte le format source `{coordinates: [...], type: LineString}` (avec ou sans
+    doubles quotes, dans les deux ordres) ainsi qu'un tableau de coordonnées seul
+    (format de `data_cleaned.csv`), dont le type est déduit de l'imbrication.
+
+    Returns:
+        tuple: (Series du texte des coordonnées, Series du type), NaN si non reconnu.
+    """
+    s = pd.Series(values).astype(object).where(lambda x: x.notna(), '').astype(str)
+    parts = s.str.extract(_COORDS_PUIS_TYPE)
+    manquants = parts['coords'].isna()
+    if manquants.any():
+        autre_ordre = s[manquants].str.extract(_TYPE_PUIS_COORDS)
+        parts.loc[manquants, ['coords', 'type']] = autre_ordre[['coords', 'type']].values
+
+    # Tableau de coordonnées seul : le type est déduit de la profondeur
+    nus = parts['coords'].isna() & s.str.match(r'^\s*\[')
+    if nus.any():
+        texte = s[nus].str.strip()
+        profondeur = texte.str.len() - texte.str.lstrip('[').str.len()
+        parts.loc[nus, 'coords'] = texte
+        parts.loc[nus, 'type'] = profondeur.map(_TYPE_PAR_PROFONDEUR)
+    return parts['coords'].str.strip(), parts['type']
+
+
+def _parse_coordinates(coords_txt, types):
+    """Convertit les textes de coordonnées en GeoShapeArray (sans déduplication)."""
+    n = len(coords_txt)
+    plat = coords_txt.str.replace(r'[\[\]\s]', '', regex=True).fillna('')
+    valid = plat.str.match(_LISTE_NOMBRES).fillna(False).to_numpy(dtype=bool, copy=True)
+    nb_valeurs = np.where(valid, plat.str.count(',').to_numpy(dtype=np.int64) + 1, 0)
+    # Une ligne doit contenir un nombre pair de valeurs (paires longitude/latitude)
+    impairs = nb_valeurs % 2 != 0
+    valid &= ~impairs
+    nb_valeurs[impairs] = 0
+
+    texte = ','.join(plat.to_numpy(dtype=object)[valid])
+    buffer = np.array(texte.split(','), dtype=np.float64) if texte else np.empty(0)
+    if len(buffer) != nb_valeurs.sum():
+        raise ValueError("Analyse de 'geo_shape' incohérente avec la validation des lignes.")
+
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(nb_valeurs // 2, out=offsets[1:])
+    type_codes = pd.Categorical(types, categories=GEO_TYPES).codes.astype(np.int8, copy=True)
+    type_codes[~valid] = -1
+    return GeoShapeArray(buffer.reshape(-1, 2), offsets, type_codes, valid)
+
+
+def parse_geo_shapes(values, dedupe=True):
+    """
+    Analyse une colonne 'geo_shape' entière en une seule passe vectorisée.
+
+    Les lignes mal formées ne lèvent pas d'exception : elles sont marquées
+    `valid=False`, sans sommet, avec le code de type -1.
+
+    Args:
+        values: Série ou tableau de chaînes 'geo_shape'.
+        dedupe (bool): N'analyse qu'une fois chaque valeur distincte (les arcs se
+            répètent à chaque heure de comptage) puis redistribue le résultat.
+
+    Returns:
+        GeoShapeArray: Une entrée par ligne de `values`.
+    """
+    if dedupe:
+        codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=False)
+        return parse_geo_shapes(uniques, dedupe=False).take(codes)
+    coords_txt, types = split_geo_shape(values)
+    return _parse_coordinates(coords_txt, types)
+
+
+### Longueurs des polylignes ###
+
+R_TERRE_KM = 6371.0  # Rayon de la Terre en km
+
+
+def haversine_np(lon1, lat1, lon2, lat2):
+    """Version vectorisée de la formule de Haversine (distances en km, degrés en entrée)."""
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    dlon, dlat = lon2 - lon1, lat2 - lat1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return R_TERRE_KM * (2 * np.arcsin(np.sqrt(a)))
+
+
+def polyline_lengths(coords, offsets):
+    """
+    Longueur (km) de chaque polyligne d'un tableau « ragged ».
+
+    Les segments sont calculés en une passe sur tous les sommets consécutifs ; ceux
+    qui relient deux lignes différentes sont annulés avant la somme par ligne
+    (np.add.reduceat).
+
+    Args:
+        coords (ndarray): Sommets [longitude, latitude], forme (n_points, 2).
+        offsets (ndarray): Début de chaque ligne dans `coords`, forme (n_lignes + 1,).
+
+    Returns:
+        ndarray: Longueurs en km, NaN pour les lignes sans sommet.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    counts = np.diff(offsets)
+    lengths = np.full(len(counts), np.nan)
+    non_vides = counts > 0
+    if not non_vides.any():
+        return lengths
+
+    segments = np.zeros(len(coords))
+    segments[:-1] = haversine_np(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+    # Le dernier sommet de chaque ligne n'a pas de segment sortant
+    segments[offsets[1:][non_vides] - 1] = 0.0
+    lengths[non_vides] = np.add.reduceat(segments, offsets[:-1][non_vides])
+    return lengths
+
+
+def shape_endpoints(shapes):
+    """
+    Premier et dernier sommet de chaque géométrie.
+
+    Returns:
+        tuple: (départs, arrivées), tableaux (n_lignes, 2) [longitude, latitude], NaN si vide.
+    """
+    non_vides = shapes.counts > 0
+    debut = np.full((len(shapes), 2), np.nan)
+    fin = np.full((len(shapes), 2), np.nan)
+    debut[non_vides] = shapes.coords[shapes.offsets[:-1][non_vides]]
+    fin[non_vides] = shapes.coords[shapes.offsets[1:][non_vides] - 1]
+    return debut, fin
+
+
+def initial_bearing(lon1, lat1, lon2, lat2):
+    """Cap initial (degrés, 0 = nord, sens horaire) du premier point vers le second."""
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    dlon = lon2 - lon1
+    x = np.sin(dlon) * np.cos(lat2)
+    y = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dlon)
+    return np.degrees(np.arctan2(x, y)) % 360.0
+
+
+# Colonnes produites par spatial_features
+SPATIAL_FEATURES = ['start_lon', 'start_lat', 'end_lon', 'end_lat', 'euclid_dist', 'chord_km',
+                    'bearing_deg', 'length_km', 'sinuosity']
+
+
+def spatial_features(values):
+    """
+    Features spatiales de chaque géométrie, calculées en une passe vectorisée.
+
+    Chaque valeur distincte n'est analysée qu'une fois, puis les résultats sont
+    redistribués aux lignes. Les géométries invalides ou vides donnent NaN.
+
+    Args:
+        values: Série ou tableau de chaînes 'geo_shape'.
+
+    Returns:
+        DataFrame: Colonnes SPATIAL_FEATURES (même index que `values` si c'est une Série) :
+            extrémités, distance euclidienne en degrés, corde (haversine, km), cap initial
+            (degrés), longueur de la polyligne (km) et sinuosité (longueur / corde).
+    """
+    serie = pd.Series(values)
+    codes, uniques = pd.factorize(serie, use_na_sentinel=False)
+    shapes = parse_geo_shapes(uniques, dedupe=False)
+    debut, fin = shape_endpoints(shapes)
+    corde = haversine_np(debut[:, 0], debut[:, 1], fin[:, 0], fin[:, 1])
+    longueur = polyline_lengths(shapes.coords, shapes.offsets)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sinuosite = np.where(corde > 0, longueur / corde, np.nan)
+    par_valeur = {
+        'start_lon': debut[:, 0], 'start_lat': debut[:, 1],
+        'end_lon': fin[:, 0], 'end_lat': fin[:, 1],
+        'euclid_dist': np.hypot(fin[:, 0] - debut[:, 0], fin[:, 1] - debut[:, 1]),
+        'chord_km': corde,
+        'bearing_deg': initial_bearing(debut[:, 0], debut[:, 1], fin[:, 0], fin[:, 1]),
+        'length_km': longueur,
+        'sinuosity': sinuosite,
+    }
+    return pd.DataFrame({col: v[codes] for col, v in par_valeur.items()}, index=serie.index)
+
+
+class ArcLengthCache:
+    """
+    Mémoïsation des longueurs d'arcs, indexée par le texte de la géométrie.
+
+    La géométrie d'un arc ne change pas d'une heure de comptage à l'autre : chaque
+    géométrie distincte n'est analysée et mesurée qu'une fois par exécution
+    (par processus).
+    """
+
+    def __init__(self):
+        self._lengths = {}
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def lengths(self, values):
+        """Longueur (km) de chaque valeur 'geo_shape' de `values` (NaN si invalide)."""
+        codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=False)
+        known = np.array([self._lengths.get(u, np.nan) for u in uniques], dtype=np.float64)
+        absents = np.array([u not in self._lengths for u in uniques], dtype=bool)
+        if absents.any():
+            nouveaux = uniques[absents]
+            shapes = parse_geo_shapes(nouveaux, dedupe=False)
+            mesures = polyline_lengths(shapes.coords, shapes.offsets)
+            known[absents] = mesures
+            self._lengths.update(zip(nouveaux, mesures))
+        return known[codes]
@@ -0,0 +1,154 @@
+import glob
+import json
+import os
+from io import StringIO
+
+import pandas as pd
+
+### Exécutions incrémentales : manifeste des données déjà traitées ###
+
+MANIFEST_VERSION = 1
+
+
+def manifest_path_for(output):
+    """Chemin du manifeste associé à une sortie (`<sortie>.manifest.json`)."""
+    return output.rstrip('/\\') + '.manifest.json'
+
+
+def list_input_files(input_path):
+    """Fichiers d'entrée : le fichier lui-même, ou les exports CSV d'un répertoire (ordre alphabétique)."""
+    if os.path.isdir(input_path):
+        return sorted(glob.glob(os.path.join(input_path, '*.csv')))
+    return [input_path]
+
+
+def _merge_ranges(ranges):
+    """Fusionne des intervalles [début, fin) d'octets qui se chevauchent ou se touchent."""
+    fusion = []
+    for debut, fin in sorted(ranges):
+        if fusion and debut <= fusion[-1][1]:
+            fusion[-1][1] = max(fusion[-1][1], fin)
+        else:
+            fusion.append([debut, fin])
+    return fusion
+
+
+class Manifest:
+    """
+    Manifeste d'une sortie incrémentale.
+
+    Pour chaque fichier d'entrée, il enregistre l'en-tête et les plages d'octets
+    déjà traitées et validées ; il enregistre aussi les partitions de dates
+    touchées et la taille validée de la sortie CSV. Il est réécrit de façon
+    atomique après chaque morceau validé.
+    """
+
+    def __init__(self, path, data=None):
+        self.path = path
+        self.data = data or {'version': MANIFEST_VERSION, 'files': {}, 'dates': [], 'output_size': None}
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls(path)
+        with open(path, 'r', encoding='utf-8') as fichier:
+            data = json.load(fichier)
+        if data.get('version') != MANIFEST_VERSION:
+            raise ValueError(f"Version de manifeste non prise en charge : {data.get('version')}")
+        return cls(path, data)
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as fichier:
+            json.dump(self.data, fichier, indent=2, ensure_ascii=False)
+            fichier.flush()
+            os.fsync(fichier.fileno())
+        os.replace(tmp, self.path)
+
+    def file_state(self, input_file):
+        return self.data['files'].get(os.path.abspath(input_file))
+
+    def pending_ranges(self, input_file, end):
+        """Plages d'octets [début, fin) pas encore traitées entre le début des données et `end`."""
+        state = self.file_state(input_file)
+        manquantes = []
+        curseur = state['data_start']
+        for debut, fin in state['ranges']:
+            if debut > curseur:
+                manquantes.append((curseur, min(debut, end)))
+            curseur = max(curseur, fin)
+        if curseur < end:
+            manquantes.append((curseur, end))
+        return [(d, f) for d, f in manquantes if d < f]
+
+    def register_file(self, input_file, header, data_start):
+        key = os.path.abspath(input_file)
+        state = self.data['files'].get(key)
+        if state is None:
+            state = {'header': header, 'data_start': data_start, 'ranges': [], 'rows': 0}
+            self.data['files'][key] = state
+        elif state['header'] != header:
+            raise ValueError(f"L'en-tête de {input_file} a changé depuis la dernière exécution.")
+        return state
+
+    def mark_processed(self, input_file, start, end, rows, dates, output_size=None):
+        """Enregistre une plage d'octets traitée et les partitions de dates qu'elle a alimentées."""
+        state = self.data['files'][os.path.abspath(input_file)]
+        state['ranges'] = _merge_ranges(state['ranges'] + [[start, end]])
+        state['rows'] += rows
+        self.data['dates'] = sorted(set(self.data['dates']) | set(dates))
+        if output_size is not None:
+            self.data['output_size'] = output_size
+
+
+def read_header(input_file):
+    """Ligne d'en-tête (texte) et position du premier octet de données."""
+    with open(input_file, 'rb') as fichier:
+        ligne = fichier.readline()
+    return ligne.decode('utf-8').rstrip('\r\n'), len(ligne)
+
+
+def last_line_end(input_file, start, end):
+    """Position suivant le dernier saut de ligne de [start, end) (start si aucun)."""
+    with open(input_file, 'rb') as fichier:
+        fin = end
+        while fin > start:
+            debut = max(start, fin - (64 << 10))
+            fichier.seek(debut)
+            dernier = fichier.read(fin - debut).rfind(b'\n')
+            if dernier >= 0:
+                return debut + dernier + 1
+            fin = debut
+    return start
+
+
+def iter_line_blocks(input_file, start, end, block_bytes=64 << 20, to_eof=False):
+    """
+    Découpe [start, end) en plages d'octets d'environ `block_bytes`, alignées sur les fins de ligne.
+
+    Une dernière ligne incomplète (export encore en cours d'écriture) est laissée
+    pour l'exécution suivante ; avec `to_eof` (exécution ponctuelle), la dernière
+    plage va jusqu'à `end` et garde une dernière ligne sans saut de ligne.
+    """
+    if not to_eof:
+        end = last_line_end(input_file, start, end)
+    with open(input_file, 'rb') as fichier:
+        debut = start
+        while debut < end:
+            fin = debut + block_bytes
+            if fin < end:
+                # Avance jusqu'à la fin de la ligne en cours
+                fichier.seek(fin)
+                fichier.readline()
+                fin = fichier.tell()
+            fin = min(fin, end)
+            yield debut, fin
+            debut = fin
+
+
+def read_block(input_file, header, start, end, dtype=None):
+    """Lit une plage d'octets en DataFrame brut (doubles quotes supprimées)."""
+    with open(input_file, 'rb') as fichier:
+        fichier.seek(start)
+        texte = fichier.read(end - start).decode('utf-8')
+    return pd.read_csv(StringIO(header.replace('"', '') + '\n' + texte.replace('"', '')), delimiter=';', dtype=dtype)
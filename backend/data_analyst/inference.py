@@ -0,0 +1,261 @@
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+import joblib
+import numpy as np
+import pandas as pd
+
+# Ajouter le répertoire racine du projet à sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+### Prédiction à faible latence pour /predict : ligne préallouée et micro-lots ###
+
+# Ordre des features du modèle de trafic (celui du scaler s'il l'a enregistré)
+PREDICT_FEATURES = ["Debit_Horaire", "Taux d'occupation", "Hour", "Weekday", "Month"]
+# Fenêtre de regroupement des requêtes et taille maximale d'un lot
+BATCH_WAIT_MS = 2.0
+MAX_BATCH = 64
+LATENCY_CLIENTS = (1, 10, 100)
+
+
+def _boosters(model):
+    """
+    Boosters xgboost du modèle et leur plage d'arbres, un par sortie pour un
+    MultiOutputRegressor ; None si le modèle n'est pas (entièrement) xgboost.
+    """
+    estimateurs = getattr(model, 'estimators_', None)
+    modeles = estimateurs if estimateurs is not None else [model]
+    boosters = []
+    for m in modeles:
+        if not hasattr(m, 'get_booster'):
+            return None
+        # Même plage d'arbres que model.predict (arrêt précoce compris)
+        meilleure = getattr(m, 'best_iteration', None)
+        boosters.append((m.get_booster(), (0, meilleure + 1) if meilleure is not None else (0, 0),
+                         getattr(m, 'missing', np.nan)))
+    return boosters
+
+
+class FastPredictor:
+    """
+    Prédiction d'une requête JSON sans DataFrame intermédiaire.
+
+    Les valeurs sont écrites dans une ligne NumPy préallouée (une par thread), dans
+    l'ordre fixe des features ; la standardisation du StandardScaler devient un
+    produit et une somme en place (x * 1/écart - moyenne/écart), et un modèle
+    xgboost est évalué par `inplace_predict` sur le booster, sans DMatrix. Les
+    autres modèles passent par `model.predict` sur la même ligne.
+    """
+
+    def __init__(self, model, scaler=None, features=None):
+        self.model, self.scaler = model, scaler
+        noms = getattr(scaler, 'feature_names_in_', None)
+        self.features = list(features or (noms.tolist() if noms is not None else PREDICT_FEATURES))
+        n = len(self.features)
+        self._echelle, self._decalage = np.ones(n), np.zeros(n)
+        if scaler is not None:
+            if getattr(scaler, 'scale_', None) is not None:
+                self._echelle = 1.0 / np.asarray(scaler.scale_, dtype=np.float64)
+            if getattr(scaler, 'mean_', None) is not None:
+                self._decalage = -np.asarray(scaler.mean_, dtype=np.float64) * self._echelle
+        self._boosters = _boosters(model)
+        self._local = threading.local()
+
+    @classmethod
+    def from_files(cls, model_file, scaler_file=None):
+        return cls(joblib.load(model_file), joblib.load(scaler_file) if scaler_file else None)
+
+    def row(self, data):
+        """
+        Ligne (1, n_features) du thread courant, remplie depuis le JSON.
+
+        Raises:
+            ValueError: Clé absente ou valeur non numérique.
+        """
+        ligne = getattr(self._local, 'ligne', None)
+        if ligne is None:
+            ligne = self._local.ligne = np.empty((1, len(self.features)))
+        valeurs = ligne[0]
+        for i, nom in enumerate(self.features):
+            try:
+                valeur = data[nom]
+            except KeyError:
+                raise ValueError(f"Missing key in input: {nom}") from None
+            except TypeError:
+                raise ValueError("Input must be a JSON object") from None
+            try:
+                valeurs[i] = valeur
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid value for {nom}: {valeur!r}") from None
+        return ligne
+
+    def predict_rows(self, X):
+        """
+        Prédictions d'une matrice de features brutes (n_lignes, n_features), standardisée en place.
+
+        Returns:
+            np.ndarray: Forme (n_lignes, n_sorties).
+        """
+        X *= self._echelle
+        X += self._decalage
+        if self._boosters is None:
+            return np.asarray(self.model.predict(X)).reshape(len(X), -1)
+        sorties = [np.asarray(b.inplace_predict(X, iteration_range=plage, missing=manquant)).reshape(len(X), -1)
+                   for b, plage, manquant in self._boosters]
+        return sorties[0] if len(sorties) == 1 else np.hstack(sorties)
+
+    def predict(self, data):
+        """Sorties du modèle (tableau 1-D) pour une requête JSON ; ValueError si elle est invalide."""
+        return self.predict_rows(self.row(data))[0]
+
+    def reference_predict(self, data):
+        """Chemin d'origine (DataFrame d'une ligne, scaler.transform puis model.predict), pour comparaison."""
+        df = pd.DataFrame([{nom: data[nom] for nom in self.features}])
+        X = self.scaler.transform(df) if self.scaler is not None else df
+        return np.asarray(self.model.predict(X)).reshape(1, -1)[0]
+
+
+class MicroBatcher:
+    """
+    Regroupe les requêtes simultanées en une prédiction par lot.
+
+    La validation reste dans le thread de la requête ; un thread de fond prend la
+    première ligne en attente, rassemble celles qui arrivent dans les `wait_ms`
+    suivantes (au plus `max_batch`), les copie dans une matrice préallouée et
+    rend à chaque requête sa ligne de prédictions. La fenêtre n'est ouverte que
+    si le lot précédent regroupait plusieurs requêtes : sans concurrence, une
+    requête seule ne l'attend pas. Même interface `predict` que FastPredictor.
+    """
+
+    def __init__(self, predictor, wait_ms=BATCH_WAIT_MS, max_batch=MAX_BATCH):
+        self.predictor, self.wait_ms, self.max_batch = predictor, wait_ms, max_batch
+        self.batches = self.requests = 0
+        self._attendre = False
+        self._file = queue.SimpleQueue()
+        self._lot = np.empty((max_batch, len(predictor.features)))
+        self._thread = threading.Thread(target=self._run, daemon=True, name='predict-batcher')
+        self._thread.start()
+
+    def predict(self, data):
+        attente = Future()
+        self._file.put((self.predictor.row(data), attente))
+        return attente.result()
+
+    def close(self):
+        self._file.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            premier = self._file.get()
+            if premier is None:
+                return
+            lot = [premier]
+            limite = time.perf_counter() + (self.wait_ms / 1000 if self._attendre else 0.0)
+            while len(lot) < self.max_batch:
+                reste = limite - time.perf_counter()
+                try:
+                    suivant = self._file.get(timeout=reste) if reste > 0 else self._file.get_nowait()
+                except queue.Empty:
+                    break
+                if suivant is None:
+                    self._file.put(None)  # arrêt après ce lot
+                    break
+                lot.append(suivant)
+            X = self._lot[:len(lot)]
+            for k, (ligne, _) in enumerate(lot):
+                X[k] = ligne[0]
+            try:
+                Y = self.predictor.predict_rows(X)
+            except Exception as e:
+                for _, attente in lot:
+                    attente.set_exception(e)
+                continue
+            self.batches += 1
+            self.requests += len(lot)
+            self._attendre = len(lot) > 1
+            for k, (_, attente) in enumerate(lot):
+                attente.set_result(Y[k].copy())
+
+    def status(self):
+        return {'batches': self.batches, 'requests': self.requests,
+                'mean_batch': round(self.requests / self.batches, 2) if self.batches else None}
+
+
+def benchmark_latency(predictor, payloads, clients=LATENCY_CLIENTS, requests_per_client=200, wait_ms=BATCH_WAIT_MS):
+    """
+    Latence de /predict par chemin de prédiction, avec 1, 10 et 100 clients simultanés.
+
+    Chaque client (un thread, comme un serveur Flask multithread) envoie ses
+    requêtes l'une après l'autre ; les chemins comparés sont le chemin d'origine
+    (DataFrame), la ligne préallouée, et la ligne préallouée avec micro-lots.
+
+    Returns:
+        dict: {chemin: {clients: {'p50_ms', 'p99_ms', 'rps'}}} et écart maximal
+            entre les prédictions des chemins rapides et celles du chemin d'origine.
+    """
+    payloads = list(payloads)
+    references = np.array([predictor.reference_predict(p) for p in payloads])
+    ecart = float(np.abs(np.array([predictor.predict(p) for p in payloads]) - references).max())
+    batcher = MicroBatcher(predictor, wait_ms)
+    lots = np.array([batcher.predict(p) for p in payloads])
+    ecart = max(ecart, float(np.abs(lots - references).max()))
+    chemins = {'dataframe': predictor.reference_predict, 'fast': predictor.predict, 'batched': batcher.predict}
+
+    resultats = {}
+    for nom, predire in chemins.items():
+        for n in clients:
+            latences = [[] for _ in range(n)]
+            depart = threading.Barrier(n + 1)
+
+            def client(k):
+                depart.wait()
+                for i in range(requests_per_client):
+                    debut = time.perf_counter()
+                    predire(payloads[(k + i) % len(payloads)])
+                    latences[k].append(time.perf_counter() - debut)
+            threads = [threading.Thread(target=client, args=(k,)) for k in range(n)]
+            for t in threads:
+                t.start()
+            depart.wait()
+            debut = time.perf_counter()
+            for t in threads:
+                t.join()
+            duree = time.perf_counter() - debut
+            valeurs = np.concatenate(latences) * 1000
+            resultats.setdefault(nom, {})[n] = {
+                'p50_ms': round(float(np.percentile(valeurs, 50)), 3),
+                'p99_ms': round(float(np.percentile(valeurs, 99)), 3),
+                'rps': round(len(valeurs) / duree, 1)}
+    resultats['batcher'] = batcher.status()
+    batcher.close()
+    resultats['max_abs_diff'] = ecart
+    return resultats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mesure la latence de /predict (p50, p99) selon le nombre de clients.")
+    parser.add_argument('--model', default='modele_trafic.joblib')
+    parser.add_argument('--scaler', default='scaler_trafic.joblib', help="Scaler ('' : aucun)")
+    parser.add_argument('--clients', type=int, nargs='+', default=list(LATENCY_CLIENTS))
+    parser.add_argument('--requests', type=int, default=200, help="Requêtes par client")
+    parser.add_argument('--wait-ms', type=float, default=BATCH_WAIT_MS)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    predicteur = FastPredictor.from_files(args.model, args.scaler or None)
+    rng = np.random.default_rng(args.seed)
+    requetes = [{"Debit_Horaire": float(rng.uniform(0, 4000)), "Taux d'occupation": float(rng.uniform(0, 60)),
+                 "Hour": int(rng.integers(0, 24)), "Weekday": int(rng.integers(0, 7)),
+                 "Month": int(rng.integers(1, 13))} for _ in range(256)]
+    r = benchmark_latency(predicteur, requetes, args.clients, args.requests, args.wait_ms)
+    print(f"Écart maximal avec le chemin d'origine : {r['max_abs_diff']:.3g}")
+    for chemin in ('dataframe', 'fast', 'batched'):
+        for n, l in r[chemin].items():
+            print(f"{chemin:<9} {n:>3} clients : p50 {l['p50_ms']:.3f} ms, p99 {l['p99_ms']:.3f} ms, {l['rps']:.0f} req/s")
+    print(f"Micro-lots : {r['batcher']['batches']} lots, {r['batcher']['mean_batch']} requêtes en moyenne")
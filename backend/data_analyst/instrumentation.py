@@ -0,0 +1,428 @@
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+
+### Instrumentation des étapes de l'ETL et de l'entraînement ###
+
+# Nombre de fonctions gardées dans le rapport pour chaque étape profilée
+PROFILE_TOP = 15
+
+
+def reset_peak_rss():
+    """Remet à zéro le pic de mémoire résidente du processus (Linux uniquement)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as fichier:
+            fichier.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb(since_reset=False):
+    """Pic de mémoire résidente du processus en Mo (depuis la dernière remise à zéro si `since_reset`)."""
+    if since_reset:
+        try:
+            with open('/proc/self/status') as fichier:
+                for ligne in fichier:
+                    if ligne.startswith('VmHWM:'):
+                        return round(int(ligne.split()[1]) / 1e3, 1)
+        except OSError:
+            return None
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kio sous Linux, octets sous macOS
+    return round(pic / (1e6 if sys.platform == 'darwin' else 1e3), 1)
+
+
+def add_count(counters, key, n):
+    """Incrémente un compteur (sans effet si `counters` est None)."""
+    if counters is not None:
+        counters[key] = counters.get(key, 0) + int(n)
+
+
+### Profileurs activables par étape ###
+
+class DeterministicProfiler:
+    """cProfile, cumulé sur tous les passages dans l'étape ; exportable en fichier .prof."""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def top(self, n=PROFILE_TOP):
+        stats = pstats.Stats(self.profile).stats
+        lignes = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:n]
+        return [{'function': f'{fichier}:{ligne}({nom})', 'calls': nc, 'tottime_s': round(tt, 4),
+                 'cumtime_s': round(ct, 4)} for (fichier, ligne, nom), (_, nc, tt, ct, _) in lignes]
+
+    def dump(self, path):
+        self.profile.dump_stats(path)
+
+
+class SamplingProfiler:
+    """
+    Profileur par échantillonnage de la pile d'un thread.
+
+    Un thread d'arrière-plan relève la pile du thread profilé toutes les
+    `interval` secondes ; le coût est indépendant du nombre d'appels, ce qui le
+    rend utilisable sur les étapes longues où cProfile fausserait les durées.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = 0
+        self.inclusive = Counter()
+        self.exclusive = Counter()
+        self._stop = None
+        self._thread = None
+
+    def start(self):
+        cible = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(cible,), daemon=True)
+        self._thread.start()
+
+    def _run(self, cible):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(cible)
+            if frame is None:
+                continue
+            self.samples += 1
+            self.exclusive[self._nom(frame)] += 1
+            vus = set()
+            while frame is not None:
+                nom = self._nom(frame)
+                if nom not in vus:
+                    vus.add(nom)
+                    self.inclusive[nom] += 1
+                frame = frame.f_back
+
+    @staticmethod
+    def _nom(frame):
+        code = frame.f_code
+        return f'{code.co_filename}:{code.co_firstlineno}({code.co_name})'
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def top(self, n=PROFILE_TOP):
+        return [{'function': nom, 'samples': nb, 'self_samples': self.exclusive.get(nom, 0),
+                 'share': round(nb / self.samples, 4)} for nom, nb in self.inclusive.most_common(n)]
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as fichier:
+            json.dump({'samples': self.samples, 'interval_s': self.interval, 'top': self.top(None)}, fichier, indent=2)
+
+
+PROFILERS = {'cprofile': DeterministicProfiler, 'sampling': SamplingProfiler}
+
+
+def make_profiler(kind):
+    if kind not in PROFILERS:
+        raise ValueError(f"Profileur inconnu : {kind} (attendu : {', '.join(PROFILERS)})")
+    return PROFILERS[kind]()
+
+
+### Rapport d'exécution ###
+
+class StageStats:
+    """Mesures cumulées d'une étape (une étape peut être traversée plusieurs fois, par morceau)."""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall_s = 0.0
+        self.cpu_s = 0.0
+        self.rows_in = None
+        self.rows_out = None
+        self.peak_rss_mb = None
+        self.counters = {}
+        # Mesures structurées propres à l'étape (par exemple les candidats d'une recherche d'hyperparamètres)
+        self.details = {}
+        self.profiler = None
+
+    def add_rows(self, rows_in=None, rows_out=None):
+        if rows_in is not None:
+            self.rows_in = (self.rows_in or 0) + int(rows_in)
+        if rows_out is not None:
+            self.rows_out = (self.rows_out or 0) + int(rows_out)
+
+    def count(self, key, n=1):
+        add_count(self.counters, key, n)
+
+    def to_dict(self):
+        mesures = {
+            'stage': self.name,
+            'calls': self.calls,
+            'wall_s': round(self.wall_s, 4),
+            'cpu_s': round(self.cpu_s, 4),
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'rows_per_s': round(self.rows_in / self.wall_s, 1) if self.rows_in and self.wall_s else None,
+            'peak_rss_mb': self.peak_rss_mb,
+            'counters': self.counters,
+        }
+        if self.details:
+            mesures['details'] = self.details
+        if self.profiler is not None:
+            mesures['profile'] = self.profiler.top()
+        return mesures
+
+
+class RunReport:
+    """
+    Rapport structuré d'une exécution : durée, temps CPU, lignes, compteurs et pic
+    de mémoire de chaque étape, plus les mesures de chaque worker du pool.
+
+    Le temps CPU d'une étape est celui du thread qui l'exécute (les étapes de
+    lecture tournent dans le thread d'alimentation du pool). Le pic de mémoire
+    d'une étape est exact pour des étapes successives ; pour des étapes qui se
+    chevauchent, c'est un majorant.
+
+    Args:
+        name (str): Nom de l'exécution ('etl', 'train', ...).
+        profile_stages: Étapes à profiler (noms, ou 'all'). 'worker' profile les
+            traitements exécutés dans les processus du pool.
+        profiler (str): 'cprofile' (déterministe) ou 'sampling' (échantillonnage).
+        profile_dir (str): Répertoire des fichiers de profil (un par étape et par worker).
+    """
+
+    def __init__(self, name, profile_stages=None, profiler='cprofile', profile_dir=None, params=None):
+        if profile_stages is not None:
+            make_profiler(profiler)  # valide le nom du profileur dès la création
+        self.name = name
+        self.params = params or {}
+        self.profile_stages = {profile_stages} if isinstance(profile_stages, str) else set(profile_stages or ())
+        self.profiler = profiler
+        self.profile_dir = profile_dir
+        self.started_at = datetime.now(timezone.utc)
+        self._debut = time.perf_counter()
+        self._cpu = time.process_time()
+        self.status = 'running'
+        self.error = None
+        self.stages = {}
+        self.workers = {}
+        self.tasks = []
+        self._ouvertes = []
+        self._verrou = threading.Lock()
+        self._profilage = threading.local()
+        reset_peak_rss()
+
+    def profiles(self, stage):
+        return 'all' in self.profile_stages or stage in self.profile_stages
+
+    def get(self, name):
+        with self._verrou:
+            if name not in self.stages:
+                self.stages[name] = StageStats(name)
+            return self.stages[name]
+
+    def _observe_peak(self, etapes):
+        pic = peak_rss_mb(since_reset=True)
+        if pic is not None:
+            for etape in etapes:
+                etape.peak_rss_mb = max(etape.peak_rss_mb or 0, pic)
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """
+        Mesure un passage dans une étape.
+
+        Usage : `with report.stage('write', rows_in=len(df)) as s: ...; s.add_rows(rows_out=n)`.
+        """
+        etape = self.get(name)
+        etape.add_rows(rows_in=rows_in)
+        with self._verrou:
+            # Le pic n'est remis à zéro que si aucune autre étape n'est en cours
+            self._observe_peak(self._ouvertes)
+            if not self._ouvertes:
+                reset_peak_rss()
+            self._ouvertes.append(etape)
+        profileur = None
+        if self.profiles(name) and not getattr(self._profilage, 'actif', False):
+            # Un seul profileur actif par thread : une étape imbriquée est couverte par l'englobante
+            if etape.profiler is None:
+                etape.profiler = make_profiler(self.profiler)
+            profileur = etape.profiler
+            self._profilage.actif = True
+            profileur.start()
+        debut, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield etape
+        finally:
+            etape.wall_s += time.perf_counter() - debut
+            etape.cpu_s += time.thread_time() - cpu
+            etape.calls += 1
+            if profileur is not None:
+                profileur.stop()
+                self._profilage.actif = False
+            with self._verrou:
+                self._observe_peak(self._ouvertes)
+                self._ouvertes.remove(etape)
+
+    def add(self, name, wall_s=0.0, cpu_s=0.0, rows_in=None, rows_out=None, calls=1, **counters):
+        """Ajoute des mesures prises ailleurs (par exemple dans un objet de lecture)."""
+        etape = self.get(name)
+        etape.wall_s += wall_s
+        etape.cpu_s += cpu_s
+        etape.calls += calls
+        etape.add_rows(rows_in, rows_out)
+        for cle, n in counters.items():
+            etape.count(cle, n)
+
+    def record_worker(self, metrics, task=None):
+        """Intègre les mesures d'une tâche exécutée dans un worker (voir instrumented_call)."""
+        if task is not None:
+            metrics['task'] = task
+        with self._verrou:
+            pid = metrics['pid']
+            worker = self.workers.setdefault(pid, {'tasks': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'rows_in': 0,
+                                                   'rows_out': 0, 'peak_rss_mb': None})
+            worker['tasks'] += 1
+            worker['wall_s'] += metrics['wall_s']
+            worker['cpu_s'] += metrics['cpu_s']
+            worker['rows_in'] += metrics['rows_in'] or 0
+            worker['rows_out'] += metrics['rows_out'] or 0
+            if metrics['peak_rss_mb'] is not None:
+                worker['peak_rss_mb'] = max(worker['peak_rss_mb'] or 0, metrics['peak_rss_mb'])
+            if metrics.get('profile') is not None:
+                worker['profile'] = metrics['profile']
+            self.tasks.append({k: metrics[k] for k in ('pid', 'task', 'wall_s', 'cpu_s', 'rows_in', 'rows_out')})
+        self.add('worker', metrics['wall_s'], metrics['cpu_s'], metrics['rows_in'], metrics['rows_out'],
+                 **metrics['counters'])
+
+    def worker_options(self):
+        """Options à transmettre à instrumented_call pour profiler les workers."""
+        if not self.profiles('worker'):
+            return {}
+        return {'profiler': self.profiler, 'profile_dir': self.profile_dir}
+
+    def finish(self, status='ok', error=None):
+        self.status = status
+        self.error = str(error) if error is not None else None
+        self.wall_s = time.perf_counter() - self._debut
+        self.cpu_s = time.process_time() - self._cpu
+        self.finished_at = datetime.now(timezone.utc)
+
+    def to_dict(self):
+        if self.status == 'running':
+            self.finish()
+        return {
+            'run': self.name,
+            'status': self.status,
+            'error': self.error,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'finished_at': self.finished_at.isoformat(timespec='seconds'),
+            'wall_s': round(self.wall_s, 4),
+            # Temps CPU du processus principal (celui des workers est dans 'workers')
+            'cpu_s': round(self.cpu_s, 4),
+            'peak_rss_mb': peak_rss_mb(),
+            'params': self.params,
+            'stages': [etape.to_dict() for etape in self.stages.values()],
+            'workers': [{'pid': pid, **{k: (round(v, 4) if isinstance(v, float) else v) for k, v in w.items()}}
+                        for pid, w in sorted(self.workers.items())],
+            'tasks': self.tasks,
+        }
+
+    def save(self, path):
+        """Écrit le rapport JSON (et les profils des étapes du processus principal)."""
+        rapport = self.to_dict()
+        if self.profile_dir:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            for etape in self.stages.values():
+                if etape.profiler is not None:
+                    extension = '.prof' if isinstance(etape.profiler, DeterministicProfiler) else '.json'
+                    etape.profiler.dump(os.path.join(self.profile_dir, f'{self.name}-{etape.name}{extension}'))
+        with open(path, 'w', encoding='utf-8') as fichier:
+            json.dump(rapport, fichier, indent=2, ensure_ascii=False, default=str)
+        return path
+
+    def summary(self):
+        """Résumé lisible des étapes, pour la console."""
+        lignes = []
+        for etape in self.stages.values():
+            d = etape.to_dict()
+            lignes.append(f"  {d['stage']:16s} {d['wall_s']:9.3f}s mur {d['cpu_s']:9.3f}s CPU"
+                          + (f"  {d['rows_in']:>11,} lignes" if d['rows_in'] is not None else '')
+                          + (f"  {d['counters']}" if d['counters'] else ''))
+        return '\n'.join(lignes)
+
+
+def stage(report, name, rows_in=None):
+    """`report.stage(...)`, ou un contexte neutre si l'exécution n'est pas instrumentée."""
+    return report.stage(name, rows_in=rows_in) if report is not None else nullcontext(StageStats(name))
+
+
+### Côté worker ###
+
+# Profileur du processus worker, cumulé sur toutes ses tâches
+_worker_profiler = None
+
+
+def _rows(obj):
+    """Nombre de lignes d'un DataFrame, ou d'une description de fichier produit ({'rows': ...})."""
+    if isinstance(obj, dict):
+        return obj.get('rows')
+    return len(obj) if hasattr(obj, 'shape') else None
+
+
+def instrumented_call(fn, item, task=None, with_counters=False, profiler=None, profile_dir=None):
+    """
+    Exécute `fn(item)` dans un worker et renvoie `(résultat, mesures)`.
+
+    Les mesures (pid, durée, temps CPU du worker, lignes en entrée et en sortie,
+    compteurs, pic de mémoire du worker) sont renvoyées au processus principal avec
+    le résultat, pour RunReport.record_worker.
+
+    Args:
+        with_counters (bool): Passe un dictionnaire de compteurs à `fn` (argument `counters`).
+        profiler (str): Profile `fn` dans le worker ('cprofile' ou 'sampling').
+        profile_dir (str): Répertoire où écrire le profil cumulé de chaque worker.
+    """
+    global _worker_profiler
+    counters = {} if with_counters else None
+    if profiler and _worker_profiler is None:
+        _worker_profiler = make_profiler(profiler)
+    if _worker_profiler is not None:
+        _worker_profiler.start()
+    debut, cpu = time.perf_counter(), time.process_time()
+    try:
+        resultat = fn(item, counters=counters) if with_counters else fn(item)
+    finally:
+        wall, cpu = time.perf_counter() - debut, time.process_time() - cpu
+        if _worker_profiler is not None:
+            _worker_profiler.stop()
+    metrics = {
+        'pid': os.getpid(),
+        'task': task,
+        'wall_s': round(wall, 4),
+        'cpu_s': round(cpu, 4),
+        # Tâche sans DataFrame en entrée : lignes lues d'après les compteurs de `fn`
+        'rows_in': _rows(item) if hasattr(item, 'shape') else (counters or {}).get('rows_read'),
+        'rows_out': _rows(resultat),
+        'counters': counters or {},
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    if _worker_profiler is not None:
+        metrics['profile'] = _worker_profiler.top()
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+            extension = '.prof' if isinstance(_worker_profiler, DeterministicProfiler) else '.json'
+            _worker_profiler.dump(os.path.join(profile_dir, f'worker-{os.getpid()}{extension}'))
+    return resultat, metrics
@@ -0,0 +1,148 @@
+import os
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Ajouter le répertoire racine du projet à sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from backend.data_analyst.geo import R_TERRE_KM
+
+### Table des nœuds dédoublonnée et index spatial (rattachement au nœud le plus proche) ###
+
+NODE_UP = 'Identifiant noeud amont'
+NODE_DOWN = 'Identifiant noeud aval'
+
+
+def node_coordinates(nodes):
+    """
+    Coordonnées de chaque nœud, une ligne par nœud.
+
+    Un nœud prend les coordonnées du début des arcs qui en partent, à défaut celles
+    de la fin des arcs qui y arrivent (la table des arcs répète chaque nœud).
+
+    Returns:
+        tuple: (identifiants int64 croissants, latitudes, longitudes), en degrés.
+    """
+    ids, lat, lon = [], [], []
+    for colonne, prefixe in ((NODE_UP, 'start'), (NODE_DOWN, 'end')):
+        if colonne not in nodes.columns or f'{prefixe}_lat' not in nodes.columns:
+            continue
+        ids.append(nodes[colonne].to_numpy(dtype=np.int64))
+        lat.append(nodes[f'{prefixe}_lat'].to_numpy(dtype=np.float64))
+        lon.append(nodes[f'{prefixe}_lon'].to_numpy(dtype=np.float64))
+    if not ids:
+        return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+    ids, lat, lon = np.concatenate(ids), np.concatenate(lat), np.concatenate(lon)
+    # Coordonnées manquantes classées en dernier : un nœud garde sa première position connue
+    connues = ~(np.isnan(lat) | np.isnan(lon))
+    ordre = np.lexsort((~connues, ids))
+    ids, premiers = np.unique(ids[ordre], return_index=True)
+    return ids, lat[ordre][premiers], lon[ordre][premiers]
+
+
+@dataclass
+class NodeIndex:
+    """
+    Nœuds du graphe et arbre k-d de leurs coordonnées projetées.
+
+    Les coordonnées (latitude, longitude) sont projetées en km (projection
+    équirectangulaire centrée sur la latitude moyenne) : à l'échelle d'une ville,
+    la distance euclidienne projetée est celle du terrain, à moins de 0,1 % près,
+    alors qu'un écart en degrés de longitude compte ~1,5 fois trop à Paris.
+    Les nœuds sans coordonnées restent dans la table mais ne sont jamais choisis.
+    """
+    ids: np.ndarray  # int64, croissant
+    lat: np.ndarray  # degrés, NaN sans coordonnées
+    lon: np.ndarray
+
+    def __post_init__(self):
+        connues = ~(np.isnan(self.lat) | np.isnan(self.lon))
+        self._lat0 = float(np.radians(self.lat[connues].mean())) if connues.any() else 0.0
+        self._localises = np.flatnonzero(connues)
+        self._tree = cKDTree(self.project(self.lat[connues], self.lon[connues])) if connues.any() else None
+
+    @classmethod
+    def from_nodes(cls, nodes, keep=None):
+        """
+        Index des nœuds d'une table d'arcs (colonnes start_/end_ lat et lon).
+
+        Args:
+            keep: Identifiants à garder (nœuds du graphe) ; tous les nœuds par défaut.
+        """
+        ids, lat, lon = node_coordinates(nodes)
+        if keep is not None:
+            garder = np.isin(ids, np.asarray(keep, dtype=np.int64))
+            ids, lat, lon = ids[garder], lat[garder], lon[garder]
+        return cls(ids, lat, lon)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def project(self, lat, lon):
+        """Coordonnées projetées (x, y) en km, forme (n, 2)."""
+        lat = np.radians(np.asarray(lat, dtype=np.float64))
+        lon = np.radians(np.asarray(lon, dtype=np.float64))
+        return np.column_stack([R_TERRE_KM * lon * np.cos(self._lat0), R_TERRE_KM * lat])
+
+    def query(self, lat, lon, radius_km=None):
+        """
+        Nœud le plus proche de chaque point, en une requête sur l'arbre (O(log n) par point).
+
+        Args:
+            lat, lon: Coordonnées des points (degrés, scalaires ou tableaux).
+            radius_km (float): Distance maximale ; au-delà, le point n'est rattaché à rien.
+
+        Returns:
+            tuple: (positions dans la table int64, -1 sans nœud ; distances en km, inf
+                sans nœud).
+        """
+        lat, lon = np.atleast_1d(lat).astype(np.float64), np.atleast_1d(lon).astype(np.float64)
+        positions = np.full(len(lat), -1, dtype=np.int64)
+        distances = np.full(len(lat), np.inf)
+        valides = ~(np.isnan(lat) | np.isnan(lon))
+        if self._tree is None or not valides.any():
+            return positions, distances
+        borne = np.inf if radius_km is None else radius_km
+        d, i = self._tree.query(self.project(lat[valides], lon[valides]), k=1, distance_upper_bound=borne)
+        trouves = np.isfinite(d)
+        positions[np.flatnonzero(valides)[trouves]] = self._localises[i[trouves]]
+        distances[np.flatnonzero(valides)[trouves]] = d[trouves]
+        return positions, distances
+
+    def snap(self, coords, radius_km=None):
+        """
+        Rattache une liste de coordonnées (latitude, longitude) aux nœuds.
+
+        Returns:
+            list: Identifiant du nœud le plus proche de chaque point, None au-delà de
+                `radius_km`.
+        """
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        positions, _ = self.query(coords[:, 0], coords[:, 1], radius_km)
+        return [int(self.ids[p]) if p >= 0 else None for p in positions]
+
+    def nearest(self, coord, radius_km=None):
+        """Identifiant du nœud le plus proche d'une coordonnée (latitude, longitude), ou None."""
+        return self.snap([coord], radius_km)[0]
+
+    def positions(self, ids):
+        """Positions des identifiants dans la table (int64, -1 pour un nœud inconnu)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        positions = np.searchsorted(self.ids, ids)
+        if not len(self.ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+        positions = positions.clip(0, len(self.ids) - 1)
+        return np.where(self.ids[positions] == ids, positions, -1)
+
+    def coords(self, ids):
+        """
+        Coordonnées [latitude, longitude] d'une suite de nœuds (un chemin), par
+        indexation des tableaux ; les nœuds inconnus ou sans coordonnées sont omis.
+        """
+        positions = self.positions(ids)
+        positions = positions[positions >= 0]
+        positions = positions[~(np.isnan(self.lat[positions]) | np.isnan(self.lon[positions]))]
+        return np.column_stack([self.lat[positions], self.lon[positions]]).tolist()
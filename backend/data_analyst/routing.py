@@ -0,0 +1,433 @@
+import hashlib
+import math
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+# Ajouter le répertoire racine du projet à sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from backend.data_analyst.contraction import ContractionHierarchy, hierarchy_path
+from backend.data_analyst.csr_graph import CSRGraph, known_arcs
+from backend.data_analyst.node_index import NodeIndex
+from backend.data_analyst.time_costs import TimeDependentGraph, time_costs_path
+
+### Graphe routier chargé une fois par processus et rechargé à chaud ###
+
+NODE_UP = 'Identifiant noeud amont'
+NODE_DOWN = 'Identifiant noeud aval'
+EDGE_COSTS_FILE = 'edge_costs.csv'
+NODE_COORDS_FILE = 'node_coords.csv'
+# Intervalle minimal (secondes) entre deux vérifications des fichiers de coûts
+CHECK_INTERVAL = 5.0
+# Moteur de recherche : 'csr' (tableaux CSR, A*) ou 'networkx'
+ROUTING_BACKENDS = ('csr', 'networkx')
+ROUTING_BACKEND = 'csr'
+# Nœuds distincts au plus de chaque côté d'une matrice de coûts (les recherches et les
+# seaux croissent avec leur nombre)
+MAX_MATRIX_NODES = 2000
+
+
+def build_route_graph(edges, nodes):
+    """
+    Graphe non orienté des arcs présents dans `edges` et `nodes`, pondéré par 'cost'.
+
+    Pour un arc en double, le dernier coût lu l'emporte.
+    """
+    edges = known_arcs(edges, nodes)
+    G = nx.Graph()
+    G.add_weighted_edges_from(zip(edges[NODE_UP].astype(int).tolist(), edges[NODE_DOWN].astype(int).tolist(),
+                                  edges['cost'].astype(float).tolist()))
+    return G
+
+
+def closest_node(nodes, coord):
+    """
+    Nœud le plus proche d'une coordonnée (latitude, longitude).
+
+    Construit l'index spatial à chaque appel : pour plusieurs points, utiliser
+    NodeIndex.snap sur un index construit une fois.
+    """
+    return NodeIndex.from_nodes(nodes).nearest(coord)
+
+
+def find_route(G, nodes, start_coord, end_coord):
+    """Itinéraire de coût minimal entre deux coordonnées (latitude, longitude), en liste de [lat, lon]."""
+    index = NodeIndex.from_nodes(nodes, keep=list(G.nodes))
+    src, tgt = index.snap([start_coord, end_coord])
+
+    try:
+        path_nodes = nx.dijkstra_path(G, src, tgt, weight='weight')
+    except (nx.NetworkXNoPath, nx.NodeNotFound):
+        print(f"Aucun chemin possible entre {src} et {tgt}.")
+        return []
+    return index.coords(path_nodes)
+
+
+def _read_cost_table(path):
+    """CSV de coûts séparé par ',' ou ';' (le séparateur est lu sur la première ligne)."""
+    with open(path, 'r', encoding='utf-8') as fichier:
+        entete = fichier.readline()
+    return pd.read_csv(path, sep=';' if entete.count(';') > entete.count(',') else ',')
+
+
+def file_signature(paths, checksum=False):
+    """
+    Signature des fichiers (taille et date de modification, ou empreinte SHA-1 du
+    contenu si `checksum`) ; None pour un fichier absent.
+    """
+    signature = []
+    for path in paths:
+        if not os.path.exists(path):
+            signature.append(None)
+        elif checksum:
+            sha = hashlib.sha1()
+            with open(path, 'rb') as fichier:
+                for bloc in iter(lambda: fichier.read(1 << 20), b''):
+                    sha.update(bloc)
+            signature.append(sha.hexdigest())
+        else:
+            stat = os.stat(path)
+            signature.append((stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+@dataclass
+class RouteGraph:
+    """
+    Graphe routier figé, partagé en lecture par toutes les requêtes.
+
+    `G` est un CSRGraph (recherche A* sur tableaux) ou un nx.Graph selon le moteur.
+    `index` (nœuds du graphe et index spatial) est absent pour un fichier de coûts
+    sans coordonnées : seules les requêtes par identifiant de nœud sont alors possibles.
+    `hierarchy` (hiérarchie de contraction préparée hors ligne pour ces coûts, moteur
+    'csr' seulement) remplace A* lorsqu'elle est présente. `time_costs` (coûts par
+    heure de la semaine, moteur 'csr') sert les requêtes qui précisent une heure de départ.
+    """
+    G: object  # CSRGraph ou nx.Graph
+    index: NodeIndex = None
+    hierarchy: ContractionHierarchy = None
+    time_costs: TimeDependentGraph = None
+    signature: tuple = None
+    loaded_at: float = field(default_factory=time.time)
+    load_s: float = 0.0
+    # Émissions des arêtes de la hiérarchie, calculées à la première matrice avec émissions
+    _hierarchy_co2: object = field(default=None, init=False, repr=False)
+
+    @classmethod
+    def from_files(cls, edges_file, nodes_file=None, signature=None, backend=ROUTING_BACKEND, hierarchy_file=None,
+                   time_costs_file=None):
+        if backend not in ROUTING_BACKENDS:
+            raise ValueError(f"Moteur d'itinéraires inconnu : {backend} (attendu : {', '.join(ROUTING_BACKENDS)})")
+        debut = time.perf_counter()
+        edges = _read_cost_table(edges_file)
+        if nodes_file is None:
+            if backend == 'csr':
+                G = CSRGraph.from_edges(edges)
+                return cls(G, None, ContractionHierarchy.load_for(G, hierarchy_file) if hierarchy_file else None,
+                           TimeDependentGraph.load_for(G, time_costs_file) if time_costs_file else None,
+                           signature, load_s=time.perf_counter() - debut)
+            G = nx.Graph()
+            G.add_weighted_edges_from(zip(edges[NODE_UP].tolist(), edges[NODE_DOWN].tolist(),
+                                          edges['cost'].astype(float).tolist()))
+            return cls(G, None, None, None, signature, load_s=time.perf_counter() - debut)
+        nodes = pd.read_csv(nodes_file, dtype={NODE_UP: int, NODE_DOWN: int})
+        edges = edges.astype({NODE_UP: int, NODE_DOWN: int})
+        hierarchie, horaires = None, None
+        if backend == 'csr':
+            G = CSRGraph.from_edges(edges, nodes)
+            index = NodeIndex(G.node_ids, G.lat, G.lon)
+            if hierarchy_file:
+                hierarchie = ContractionHierarchy.load_for(G, hierarchy_file)
+            if time_costs_file:
+                horaires = TimeDependentGraph.load_for(G, time_costs_file)
+        else:
+            G = build_route_graph(edges, nodes)
+            index = NodeIndex.from_nodes(nodes, keep=list(G.nodes))
+        return cls(G, index, hierarchie, horaires, signature, load_s=time.perf_counter() - debut)
+
+    def shortest_path(self, source, target, departure=None, pricing=None):
+        """
+        Chemin de coût minimal entre deux nœuds.
+
+        Args:
+            departure: Heure de départ ; les coûts suivent alors l'heure de passage sur
+                chaque arc (coûts statiques si le graphe n'a pas de coûts horaires).
+            pricing: Fonction qui renvoie le graphe valorisé par le modèle à partir du
+                CSRGraph (voir cost_refresh.CostRefresher.priced_graph) ; prioritaire
+                sur les coûts horaires et la hiérarchie, moteur 'csr' seulement.
+
+        Returns:
+            tuple: (liste des nœuds, coût total), ou (None, None) sans chemin.
+        """
+        if pricing is not None and isinstance(self.G, CSRGraph):
+            return pricing(self.G).shortest_path(source, target)
+        if departure is not None and self.time_costs is not None:
+            return self.time_costs.shortest_path(source, target, departure)
+        if self.hierarchy is not None:
+            s, t = self.G.position(source), self.G.position(target)
+            if s is None or t is None:
+                return None, None
+            chemin, cout = self.hierarchy.search(s, t)
+            return (None, None) if chemin is None else (self.G.node_ids[chemin].tolist(), cout)
+        if isinstance(self.G, CSRGraph):
+            return self.G.shortest_path(source, target)
+        try:
+            cout, chemin = nx.single_source_dijkstra(self.G, source, target, weight='weight')
+        except (nx.NetworkXNoPath, nx.NodeNotFound):
+            return None, None
+        return chemin, cout
+
+    def route(self, start_coord, end_coord, radius_km=None, departure=None, pricing=None):
+        """
+        Itinéraire de coût minimal entre deux coordonnées (latitude, longitude), en
+        liste de [lat, lon] ; vide sans chemin ou sans nœud à moins de `radius_km`.
+        """
+        src, tgt = self.index.snap([start_coord, end_coord], radius_km)
+        if src is None or tgt is None:
+            print(f"Aucun nœud à moins de {radius_km} km de {start_coord if src is None else end_coord}.")
+            return []
+        chemin, _ = self.shortest_path(src, tgt, departure, pricing)
+        if chemin is None:
+            print(f"Aucun chemin possible entre {src} et {tgt}.")
+            return []
+        return self.index.coords(chemin)
+
+    def node_cost_matrix(self, sources, targets, co2=False, pricing=None):
+        """
+        Coûts des plus courts chemins entre deux listes d'identifiants de nœud.
+
+        Recherches par seaux sur la hiérarchie de contraction quand elle est
+        présente ; sinon (ou avec `pricing`), un arbre de plus courts chemins par
+        source distincte.
+
+        Returns:
+            tuple: (coûts, émissions ou None), matrices (n_sources, n_cibles) ; inf
+                (NaN pour les émissions) sans chemin ou pour un nœud absent du graphe.
+
+        Raises:
+            ValueError: Plus de MAX_MATRIX_NODES nœuds distincts d'un côté.
+        """
+        for noeuds in (sources, targets):
+            distincts = len(set(noeuds) - {None})
+            if distincts > MAX_MATRIX_NODES:
+                raise ValueError(f"Trop de nœuds distincts : {distincts} (au plus {MAX_MATRIX_NODES} de chaque côté)")
+        if not isinstance(self.G, CSRGraph):
+            couts = np.full((len(sources), len(targets)), np.inf)
+            for i, source in enumerate(sources):
+                if source in self.G:
+                    longueurs = nx.single_source_dijkstra_path_length(self.G, source, weight='weight')
+                    couts[i] = [longueurs.get(t, np.inf) for t in targets]
+            return couts, None
+
+        positions = [np.array([-1 if p is None else p for p in map(self.G.position, noeuds)], dtype=np.int64)
+                     for noeuds in (sources, targets)]
+        # Chaque nœud distinct n'est cherché qu'une fois
+        (s, inverse_s), (t, inverse_t) = (np.unique(p[p >= 0], return_inverse=True) for p in positions)
+        if not len(s) or not len(t):
+            forme = (len(sources), len(targets))
+            return np.full(forme, np.inf), np.full(forme, np.nan) if co2 and self.G.co2 is not None else None
+        if pricing is not None:
+            couts, emissions = pricing(self.G).cost_matrix(s, t, co2)
+        elif self.hierarchy is not None:
+            valeurs = None
+            if co2 and self.G.co2 is not None:
+                if self._hierarchy_co2 is None:
+                    self._hierarchy_co2 = self.hierarchy.edge_values(self.G, self.G.co2)
+                valeurs = self._hierarchy_co2
+            couts, emissions = self.hierarchy.cost_matrix(s, t, valeurs)
+        else:
+            couts, emissions = self.G.cost_matrix(s, t, co2)
+
+        lignes, colonnes = (np.full(len(p), -1, dtype=np.int64) for p in positions)
+        lignes[positions[0] >= 0], colonnes[positions[1] >= 0] = inverse_s.ravel(), inverse_t.ravel()
+        absents = (lignes < 0)[:, None] | (colonnes < 0)[None, :]
+        couts = np.where(absents, np.inf, couts[lignes][:, colonnes])
+        if emissions is not None:
+            emissions = np.where(absents, np.nan, emissions[lignes][:, colonnes])
+        return couts, emissions
+
+    def cost_matrix(self, origins, destinations, radius_km=None, co2=False, pricing=None):
+        """
+        Matrice des coûts entre deux listes de coordonnées (latitude, longitude).
+
+        Toutes les coordonnées sont rattachées aux nœuds en une seule requête
+        spatiale ; une case vaut None sans chemin ou si l'une des deux coordonnées
+        n'a pas de nœud à moins de `radius_km`.
+
+        Args:
+            co2 (bool): Ajoute les émissions de CO2 de chaque plus court chemin (si le
+                fichier de coûts a la colonne Emission_CO2).
+
+        Returns:
+            dict: Nœuds rattachés ('origins', 'destinations'), coûts ('costs') et
+                émissions ('co2', None si non demandées ou indisponibles), en listes.
+
+        Raises:
+            ValueError: Plus de MAX_MATRIX_NODES nœuds rattachés distincts d'un côté.
+        """
+        noeuds = self.index.snap(list(origins) + list(destinations), radius_km)
+        sources, cibles = noeuds[:len(origins)], noeuds[len(origins):]
+        couts, emissions = self.node_cost_matrix(sources, cibles, co2, pricing)
+
+        def en_listes(matrice):
+            return [[v if math.isfinite(v) else None for v in ligne] for ligne in matrice.tolist()]
+        return {'origins': sources, 'destinations': cibles, 'costs': en_listes(couts),
+                'co2': en_listes(emissions) if emissions is not None else None}
+
+
+class RoutingEngine:
+    """
+    Moteur d'itinéraires d'un processus : le graphe est construit une fois, puis
+    remplacé à chaud quand les fichiers de coûts changent.
+
+    Les requêtes lisent l'instantané courant (une référence, remplacée d'un bloc) :
+    une requête en cours termine sur le graphe avec lequel elle a commencé. Au plus
+    toutes les `check_interval` secondes, une requête vérifie la signature des
+    fichiers ; un changement déclenche la construction du nouveau graphe dans un
+    thread, sans bloquer les requêtes, qui continuent sur l'ancien graphe.
+
+    Avec le moteur 'csr', la hiérarchie de contraction `<edges>.ch.npz` (construite
+    par `python contraction.py`) est chargée si elle correspond aux coûts ; elle est
+    surveillée comme les fichiers de coûts, mais son absence n'est pas une erreur.
+    Il en va de même des coûts par heure de la semaine `<edges>.td.npz` (écrits par
+    l'entraînement), utilisés par les requêtes qui précisent une heure de départ.
+    """
+
+    def __init__(self, edges_file=EDGE_COSTS_FILE, nodes_file=NODE_COORDS_FILE, check_interval=CHECK_INTERVAL,
+                 checksum=False, backend=ROUTING_BACKEND, hierarchy=True, time_costs=True):
+        self.edges_file, self.nodes_file, self.backend = edges_file, nodes_file, backend
+        self.hierarchy_file = hierarchy_path(edges_file) if hierarchy and backend == 'csr' else None
+        self.time_costs_file = time_costs_path(edges_file) if time_costs and backend == 'csr' else None
+        self.check_interval, self.checksum = check_interval, checksum
+        self.reloads = 0
+        self.last_error = None
+        self._snapshot = None
+        self._verrou = threading.Lock()
+        self._rechargement = None
+        self._derniere_verification = 0.0
+        self.reload(wait=True)
+
+    @property
+    def files(self):
+        return [f for f in (self.edges_file, self.nodes_file) if f is not None]
+
+    @property
+    def snapshot(self):
+        """Graphe courant (None si aucun chargement n'a réussi)."""
+        self._maybe_reload()
+        return self._snapshot
+
+    def _load(self, signature):
+        try:
+            graphe = RouteGraph.from_files(self.edges_file, self.nodes_file, signature, self.backend,
+                                           self.hierarchy_file, self.time_costs_file)
+        except (OSError, KeyError, ValueError) as e:
+            self.last_error = str(e)
+            print(f"Erreur lors du chargement du graphe routier ({', '.join(self.files)}) : {e}")
+            return
+        self._snapshot = graphe
+        self.reloads += 1
+        self.last_error = None
+        print(f"Graphe routier chargé : {graphe.G.number_of_nodes()} nœuds, "
+              f"{graphe.G.number_of_edges()} arcs en {graphe.load_s:.2f}s"
+              + (" (hiérarchie de contraction)" if graphe.hierarchy is not None else "")
+              + (" (coûts horaires)" if graphe.time_costs is not None else ""))
+
+    def reload(self, wait=False):
+        """
+        Reconstruit le graphe si la signature des fichiers a changé.
+
+        Args:
+            wait (bool): Attend la fin du chargement (sinon il se fait en arrière-plan).
+        """
+        optionnels = [f for f in (self.hierarchy_file, self.time_costs_file) if f is not None]
+        signature = file_signature(self.files + optionnels, self.checksum)
+        with self._verrou:
+            courant = self._snapshot.signature if self._snapshot is not None else None
+            if signature == courant:
+                return False
+            if None in signature[:len(self.files)]:
+                erreur = f"Fichier absent : {', '.join(f for f, sig in zip(self.files, signature) if sig is None)}"
+                if erreur != self.last_error:
+                    print(f"Graphe routier non rechargé. {erreur}")
+                self.last_error = erreur
+                return False
+            if self._rechargement is not None and self._rechargement.is_alive():
+                return False
+            self._rechargement = threading.Thread(target=self._load, args=(signature,), daemon=True,
+                                                  name='routing-reload')
+            self._rechargement.start()
+        if wait:
+            self._rechargement.join()
+        return True
+
+    def _maybe_reload(self):
+        maintenant = time.monotonic()
+        if maintenant - self._derniere_verification < self.check_interval:
+            return
+        self._derniere_verification = maintenant
+        self.reload()
+
+    def route(self, start_coord, end_coord, radius_km=None, departure=None, pricing=None):
+        """Itinéraire entre deux coordonnées (liste de [lat, lon], vide si impossible), pour un départ à `departure`."""
+        graphe = self.snapshot
+        if graphe is None or graphe.index is None:
+            return []
+        return graphe.route(start_coord, end_coord, radius_km, departure, pricing)
+
+    def cost_matrix(self, origins, destinations, radius_km=None, co2=False, pricing=None):
+        """Matrice des coûts (et des émissions) entre deux listes de coordonnées, None si le graphe n'est pas chargé."""
+        graphe = self.snapshot
+        if graphe is None or graphe.index is None:
+            return None
+        return graphe.cost_matrix(origins, destinations, radius_km, co2, pricing)
+
+    def snap(self, coords, radius_km=None):
+        """Nœud le plus proche de chaque coordonnée (latitude, longitude), None au-delà de `radius_km`."""
+        graphe = self.snapshot
+        if graphe is None or graphe.index is None:
+            return [None] * len(coords)
+        return graphe.index.snap(coords, radius_km)
+
+    def shortest_path(self, source, target, departure=None, pricing=None):
+        """Chemin entre deux identifiants de nœud : (nœuds, coût) ou (None, None)."""
+        graphe = self.snapshot
+        if graphe is None:
+            return None, None
+        return graphe.shortest_path(source, target, departure, pricing)
+
+    def status(self):
+        graphe = self._snapshot
+        return {
+            'files': self.files,
+            'backend': self.backend,
+            'hierarchy': graphe is not None and graphe.hierarchy is not None,
+            'time_costs': graphe is not None and graphe.time_costs is not None,
+            'loaded': graphe is not None,
+            'nodes': graphe.G.number_of_nodes() if graphe is not None else 0,
+            'edges': graphe.G.number_of_edges() if graphe is not None else 0,
+            'loaded_at': graphe.loaded_at if graphe is not None else None,
+            'load_s': round(graphe.load_s, 4) if graphe is not None else None,
+            'reloads': self.reloads,
+            'last_error': self.last_error,
+        }
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(edges_file=EDGE_COSTS_FILE, nodes_file=NODE_COORDS_FILE, **options):
+    """Moteur partagé du processus pour ces fichiers (créé et chargé au premier appel)."""
+    cle = (os.path.abspath(edges_file), os.path.abspath(nodes_file) if nodes_file else None)
+    with _engines_lock:
+        if cle not in _engines:
+            _engines[cle] = RoutingEngine(edges_file, nodes_file, **options)
+        return _engines[cle]
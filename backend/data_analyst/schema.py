@@ -0,0 +1,145 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+### Schéma de types des données de trafic ###
+
+DATE_COLUMN = 'Date et heure de comptage'
+# Format de la date dans les données nettoyées (UTC, sans fuseau)
+CLEAN_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Types des colonnes, appliqués dès la lecture. Les colonnes texte à faible
+# cardinalité deviennent des catégories, les identifiants des int32 et les
+# mesures des float32.
+TRAFFIC_DTYPES = {
+    'Identifiant arc': 'int32',
+    'Libelle': 'category',
+    'Debit_Horaire': 'float32',
+    "Taux d'occupation": 'float32',
+    'Etat trafic': 'category',
+    'Identifiant noeud amont': 'int32',
+    'Libelle noeud amont': 'category',
+    'Identifiant noeud aval': 'int32',
+    'Libelle noeud aval': 'category',
+    'Etat arc': 'category',
+    'Date debut dispo data': 'category',
+    'Date fin dispo data': 'category',
+    'geo_point_2d': 'category',
+    'geo_shape': 'category',
+    'geo_type': 'category',
+    'distance_arc': 'float32',
+    'Emission_CO2': 'float32',
+}
+
+# Fichier source brut : colonnes avant renommage, identifiants éventuellement manquants
+RAW_DTYPES = {
+    ('Débit horaire' if col == 'Debit_Horaire' else col): ('Int32' if dtype == 'int32' else dtype)
+    for col, dtype in TRAFFIC_DTYPES.items()
+    if col not in ('geo_point_2d', 'geo_shape', 'geo_type', 'distance_arc', 'Emission_CO2')
+}
+
+
+def category_columns(columns=None):
+    """Colonnes catégorielles du schéma (parmi `columns` si fourni)."""
+    cols = [c for c, dtype in TRAFFIC_DTYPES.items() if dtype == 'category']
+    return cols if columns is None else [c for c in cols if c in columns]
+
+
+def read_dtypes(columns=None, raw=False):
+    """Types à passer à `pd.read_csv(dtype=...)` (restreints à `columns` si fourni)."""
+    dtypes = RAW_DTYPES if raw else TRAFFIC_DTYPES
+    return dtypes if columns is None else {c: t for c, t in dtypes.items() if c in columns}
+
+
+def parse_timestamps(values, format=CLEAN_DATE_FORMAT, utc=False):
+    """
+    Convertit une colonne d'horodatages texte en datetime64, chaque valeur distincte n'étant analysée qu'une fois.
+
+    Les comptages sont horaires : une colonne de millions de lignes ne contient que
+    quelques milliers d'horodatages distincts, analysés avec un format fixe puis
+    redistribués par indice.
+
+    Args:
+        values: Série d'horodatages (texte ou catégorie).
+        format (str): Format fixe (`'ISO8601'` pour le format source avec fuseau).
+        utc (bool): Convertit en UTC puis retire le fuseau.
+
+    Returns:
+        Series: datetime64 (NaT pour les valeurs non convertibles).
+    """
+    s = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s
+    codes, uniques = pd.factorize(s)
+    parsed = pd.to_datetime(pd.Index(np.asarray(uniques, dtype=object)), format=format, errors='coerce', utc=utc)
+    if utc:
+        parsed = parsed.tz_convert(None)
+    return pd.Series(parsed.take(codes, allow_fill=True), index=s.index, name=s.name)
+
+
+def format_dates(values, format='%Y-%m-%d'):
+    """Formate le jour de chaque horodatage, chaque jour distinct n'étant formaté qu'une fois."""
+    s = pd.Series(values)
+    codes, uniques = pd.factorize(s.dt.floor('D'))
+    textes = pd.Index(pd.DatetimeIndex(uniques).strftime(format), dtype=object)
+    return pd.Series(textes.take(codes, allow_fill=True), index=s.index, name=s.name)
+
+
+def apply_schema(df, parse_dates=True):
+    """
+    Convertit les colonnes connues vers les types du schéma.
+
+    Les identifiants nullables (lecture brute) redeviennent des int32 lorsqu'ils ne
+    contiennent plus de valeur manquante ; avec `parse_dates`, la date devient un
+    datetime64 natif.
+    """
+    for col, dtype in TRAFFIC_DTYPES.items():
+        if col not in df.columns or str(df[col].dtype) == dtype:
+            continue
+        if dtype == 'int32' and df[col].isna().any():
+            dtype = 'Int32'
+        df[col] = df[col].astype(dtype)
+    if parse_dates and DATE_COLUMN in df.columns and not pd.api.types.is_datetime64_any_dtype(df[DATE_COLUMN]):
+        df[DATE_COLUMN] = parse_timestamps(df[DATE_COLUMN])
+    return df
+
+
+def replace_values(col, mapping):
+    """`Series.replace` qui préserve le type catégoriel (renomme les catégories)."""
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        nouvelles = [mapping.get(c, c) for c in col.cat.categories]
+        if len(set(nouvelles)) == len(nouvelles):
+            return col.cat.rename_categories(nouvelles)
+        return col.astype(object).replace(mapping).astype('category')
+    return col.replace(mapping)
+
+
+def memory_report(before, after):
+    """
+    Mémoire occupée par colonne avant et après application du schéma.
+
+    Returns:
+        DataFrame: Octets par colonne (et total), types et rapport de réduction.
+    """
+    avant = before.memory_usage(deep=True, index=False)
+    apres = after.memory_usage(deep=True, index=False).reindex(avant.index)
+    rapport = pd.DataFrame({
+        'dtype_avant': before.dtypes.astype(str),
+        'octets_avant': avant,
+        'dtype_apres': after.dtypes.reindex(avant.index).astype(str),
+        'octets_apres': apres,
+    })
+    rapport.loc['TOTAL'] = ['', avant.sum(), '', apres.sum()]
+    rapport['reduction'] = rapport['octets_avant'] / rapport['octets_apres'].replace(0, np.nan)
+    return rapport
+
+
+if __name__ == '__main__':
+    source = sys.argv[1] if len(sys.argv) > 1 else 'data_cleaned.csv'
+    nrows = int(sys.argv[2]) if len(sys.argv) > 2 else 500000
+    defaut = pd.read_csv(source, sep=';', nrows=nrows)
+    colonnes = defaut.columns.str.strip()
+    type_schema = apply_schema(pd.read_csv(source, sep=';', nrows=nrows, dtype=read_dtypes(colonnes)))
+    pd.set_option('display.width', 160)
+    print(memory_report(defaut, type_schema))
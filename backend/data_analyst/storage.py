@@ -0,0 +1,675 @@
+import os
+import shutil
+import sys
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:  # pyarrow est optionnel : seul le format CSV reste alors disponible
+    pa = None
+    ds = None
+
+# Ajouter le répertoire racine du projet à sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from backend.data_analyst.geo import parse_geo_shapes, shape_endpoints
+from backend.data_analyst.schema import (CLEAN_DATE_FORMAT, TRAFFIC_DTYPES, apply_schema, category_columns,
+                                         format_dates, parse_timestamps, read_dtypes)
+
+### Stockage des données nettoyées (CSV ou jeu Parquet partitionné) ###
+
+DATE_COLUMN = 'Date et heure de comptage'
+PARTITION_DATE = 'Date'
+PARTITION_ARC = 'Identifiant arc'
+ARC_KEY = 'Identifiant arc'
+
+# Colonnes qui ne dépendent que de l'arc : stockées une fois dans la table des arcs
+ARC_COLUMNS = [ARC_KEY, 'Libelle', 'Identifiant noeud amont', 'Libelle noeud amont',
+               'Identifiant noeud aval', 'Libelle noeud aval', 'Date debut dispo data',
+               'Date fin dispo data', 'geo_point_2d', 'geo_shape', 'geo_type', 'distance_arc']
+ARC_ENDPOINTS = ['start_lon', 'start_lat', 'end_lon', 'end_lat']
+
+# Types imposés à l'écriture pour que tous les fichiers du jeu partagent le même schéma
+# (ceux du schéma de lecture, sauf la distance et les émissions gardées en float64)
+PARQUET_DTYPES = {
+    **{c: t for c, t in TRAFFIC_DTYPES.items() if t != 'category'},
+    'distance_arc': 'float64',
+    'Emission_CO2': 'float64',
+}
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Le format Parquet nécessite le paquet 'pyarrow' (pip install pyarrow).")
+
+
+def _partitioning(partition_cols):
+    """Schéma explicite des colonnes de partition (évite l'inférence de type à la lecture)."""
+    types = {PARTITION_DATE: pa.string(), PARTITION_ARC: pa.int64()}
+    return ds.partitioning(pa.schema([(c, types.get(c, pa.string())) for c in partition_cols]), flavor='hive')
+
+
+def _partition_cols_of(root):
+    """Retrouve les colonnes de partition d'un jeu existant à partir de ses répertoires."""
+    cols = []
+    current = root
+    while True:
+        subdirs = [d for d in os.listdir(current) if '=' in d and os.path.isdir(os.path.join(current, d))]
+        if not subdirs:
+            return cols
+        cols.append(subdirs[0].split('=', 1)[0])
+        current = os.path.join(current, subdirs[0])
+
+
+def prepare_for_parquet(df):
+    """Types stables (horodatage natif, entiers, flottants) et colonne de partition 'Date'."""
+    df = df.copy()
+    for col, dtype in PARQUET_DTYPES.items():
+        if col in df.columns:
+            df[col] = df[col].astype(dtype)
+    # Les catégories sont stockées en texte (Parquet les encode déjà par dictionnaire)
+    for col in category_columns(df.columns):
+        df[col] = df[col].astype(object)
+    if DATE_COLUMN in df.columns:
+        df[DATE_COLUMN] = parse_timestamps(df[DATE_COLUMN])
+        df[PARTITION_DATE] = format_dates(df[DATE_COLUMN])
+    return df
+
+
+def partition_dates(df):
+    """Partitions de dates ('AAAA-MM-JJ') présentes dans un morceau."""
+    return sorted(format_dates(parse_timestamps(df[DATE_COLUMN])).dropna().unique())
+
+
+def _write_csv(df, fichier, header):
+    """Écrit un morceau au format de data_cleaned.csv."""
+    df.to_csv(fichier, sep=";", index=False, header=header, date_format=CLEAN_DATE_FORMAT)
+
+
+def _write_parquet_part(df, root, partition_cols, part_name, schema=None):
+    """
+    Écrit un morceau dans le jeu Parquet `root` (fichiers `part-<part_name>-<i>.parquet`).
+
+    Returns:
+        Schema: Schéma Arrow du morceau écrit.
+    """
+    table = pa.Table.from_pandas(prepare_for_parquet(df), preserve_index=False)
+    if schema is not None:
+        table = table.select(schema.names).cast(schema)
+    ds.write_dataset(
+        table, root, format='parquet',
+        partitioning=_partitioning(partition_cols),
+        basename_template=f'part-{part_name}-{{i}}.parquet',
+        existing_data_behavior='overwrite_or_ignore',
+    )
+    return table.schema
+
+
+class CsvWriter:
+    """
+    Écriture incrémentale de `data_cleaned.csv`.
+
+    Par défaut, le fichier est construit sous un nom temporaire renommé à la fin ;
+    en mode `append`, les lignes sont ajoutées directement au fichier existant.
+    """
+
+    def __init__(self, output_file, append=False):
+        self.output_file = output_file
+        self.append = append
+        self.tmp_file = output_file if append else output_file + '.tmp'
+        self.sortie = open(self.tmp_file, 'a' if append else 'w', encoding='utf-8', newline='')
+        self.rows = 0
+        self.header = self.sortie.tell() == 0
+
+    def write(self, df, part_name=None):
+        _write_csv(df, self.sortie, self.header)
+        self.header = False
+        self.rows += len(df)
+
+    def checkpoint(self):
+        """Force l'écriture sur disque des lignes déjà transmises."""
+        self.sortie.flush()
+        os.fsync(self.sortie.fileno())
+
+    def commit(self):
+        self.sortie.close()
+        if not self.append:
+            os.replace(self.tmp_file, self.output_file)
+
+    def abort(self):
+        self.sortie.close()
+        if not self.append and os.path.exists(self.tmp_file):
+            os.remove(self.tmp_file)
+
+
+class ParquetDatasetWriter:
+    """
+    Écriture incrémentale d'un jeu Parquet partitionné par date (et éventuellement par arc).
+
+    Chaque morceau produit ses propres fichiers. Par défaut, le jeu est construit
+    dans un répertoire temporaire qui remplace la destination à la fin ; en mode
+    `append`, les fichiers sont ajoutés au jeu existant, dont le schéma est conservé.
+    """
+
+    def __init__(self, output_dir, partition_by_arc=False, append=False):
+        _require_pyarrow()
+        self.output_dir = output_dir
+        self.append = append
+        self.tmp_dir = output_dir if append else output_dir.rstrip('/\\') + '.tmp'
+        self.partition_cols = [PARTITION_DATE] + ([PARTITION_ARC] if partition_by_arc else [])
+        self.rows = 0
+        self.parts = 0
+        self.schema = None
+        if append:
+            if os.path.isdir(output_dir) and _partition_cols_of(output_dir):
+                self.partition_cols = _partition_cols_of(output_dir)
+                self.schema = ds.dataset(output_dir, format='parquet',
+                                         partitioning=_partitioning(self.partition_cols)).schema
+        else:
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def write(self, df, part_name=None):
+        """
+        Écrit un morceau ; `part_name` nomme ses fichiers de façon déterministe, de sorte
+        qu'une réécriture du même morceau remplace les fichiers au lieu de les dupliquer.
+        """
+        if len(df) == 0:
+            return
+        # Le schéma du premier morceau est imposé aux suivants
+        self.schema = _write_parquet_part(df, self.tmp_dir, self.partition_cols,
+                                          part_name or format(self.parts, '05d'), self.schema)
+        self.rows += len(df)
+        self.parts += 1
+
+    def checkpoint(self):
+        pass
+
+    def commit(self):
+        if self.append:
+            os.makedirs(self.output_dir, exist_ok=True)
+            return
+        if self.parts == 0:
+            os.makedirs(self.tmp_dir, exist_ok=True)
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+        os.replace(self.tmp_dir, self.output_dir)
+
+    def abort(self):
+        if not self.append:
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+### Table des arcs (dimension) ###
+def split_arc_dimension(df):
+    """
+    Sépare un morceau en table de faits (comptages horaires) et lignes de la table des arcs.
+
+    Returns:
+        tuple: (faits référençant l'arc par 'Identifiant arc', arcs dédupliqués).
+    """
+    arc_cols = [c for c in ARC_COLUMNS if c in df.columns]
+    arcs = df[arc_cols].drop_duplicates(ARC_KEY, keep='last')
+    facts = df.drop(columns=[c for c in arc_cols if c != ARC_KEY])
+    return facts, arcs
+
+
+def add_arc_endpoints(arcs):
+    """Ajoute les points de départ et d'arrivée de chaque arc (géométries analysées en une passe)."""
+    arcs = arcs.copy()
+    debut, fin = shape_endpoints(parse_geo_shapes(arcs['geo_shape'], dedupe=False))
+    arcs['start_lon'], arcs['start_lat'] = debut[:, 0], debut[:, 1]
+    arcs['end_lon'], arcs['end_lat'] = fin[:, 0], fin[:, 1]
+    return arcs
+
+
+def arcs_path_for(output, output_format='csv'):
+    """Chemin de la table des arcs associée à une sortie (`<base>_arcs.csv` / `.parquet`)."""
+    base = output.rstrip('/\\')
+    base = base[:-4] if base.endswith('.csv') else base
+    return base + ('_arcs.parquet' if output_format == 'parquet' else '_arcs.csv')
+
+
+def find_arcs_table(traffic_path):
+    """Table des arcs associée à des données nettoyées, ou None si elles ne sont pas scindées."""
+    for fmt in ('parquet', 'csv'):
+        candidat = arcs_path_for(traffic_path, fmt)
+        if os.path.exists(candidat):
+            return candidat
+    return None
+
+
+def read_arcs(path, columns=None, typed=True):
+    """Lit la table des arcs (Parquet ou CSV), avec les types du schéma si `typed`."""
+    if path.endswith('.parquet'):
+        _require_pyarrow()
+        arcs = pd.read_parquet(path, columns=columns)
+        return apply_schema(arcs) if typed else arcs
+    return pd.read_csv(path, sep=';', usecols=columns, dtype=read_dtypes() if typed else None)
+
+
+def load_arc_table(traffic_path, columns=None):
+    """
+    Table des arcs des données nettoyées.
+
+    Lue directement si les données sont scindées ; sinon reconstruite en
+    dédupliquant les colonnes propres à l'arc de la table complète.
+    """
+    arcs_file = find_arcs_table(traffic_path)
+    if arcs_file is not None:
+        return read_arcs(arcs_file, columns=columns)
+    wanted = columns or [c for c in ARC_COLUMNS if c in fact_columns(traffic_path)]
+    df = read_traffic(traffic_path, columns=[ARC_KEY] + [c for c in wanted if c != ARC_KEY])
+    arcs = df.drop_duplicates(ARC_KEY, keep='last').reset_index(drop=True)
+    return arcs if columns is None else arcs[columns]
+
+
+def write_arcs(arcs, path):
+    """Écrit la table des arcs de façon atomique."""
+    tmp = path + '.tmp'
+    if path.endswith('.parquet'):
+        _require_pyarrow()
+        arcs.to_parquet(tmp, index=False)
+    else:
+        arcs.to_csv(tmp, sep=';', index=False)
+    os.replace(tmp, path)
+
+
+class ArcSplitWriter:
+    """
+    Écrivain qui scinde la sortie en table de faits et table des arcs.
+
+    Les faits sont transmis à l'écrivain sous-jacent au fil de l'eau ; les arcs
+    (quelques milliers de lignes) sont dédupliqués en mémoire et écrits à la fin,
+    ou à chaque point de validation en mode `append` (la table existante est alors
+    complétée).
+    """
+
+    def __init__(self, fact_writer, arcs_file, append=False):
+        self.fact_writer = fact_writer
+        self.arcs_file = arcs_file
+        self.arcs = None
+        self.modifie = False
+        if append and os.path.exists(arcs_file):
+            self.arcs = read_arcs(arcs_file, typed=False).drop(columns=ARC_ENDPOINTS, errors='ignore')
+
+    @property
+    def rows(self):
+        return self.fact_writer.rows
+
+    def write(self, df, part_name=None):
+        facts, arcs = split_arc_dimension(df)
+        self.fact_writer.write(facts, part_name=part_name)
+        if self.arcs is not None:
+            arcs = pd.concat([self.arcs, arcs]).drop_duplicates(ARC_KEY, keep='last')
+        self.arcs = arcs
+        self.modifie = True
+
+    def _write_arcs(self):
+        if self.arcs is not None and self.modifie:
+            write_arcs(add_arc_endpoints(self.arcs).reset_index(drop=True), self.arcs_file)
+            self.modifie = False
+
+    def checkpoint(self):
+        # La table des arcs est écrite avant les faits : elle couvre toujours les faits validés
+        self._write_arcs()
+        self.fact_writer.checkpoint()
+
+    def commit(self):
+        self._write_arcs()
+        self.fact_writer.commit()
+
+    def abort(self):
+        self.fact_writer.abort()
+
+
+def open_writer(output, output_format='csv', partition_by_arc=False, split_arcs=False, append=False):
+    """
+    Crée l'écrivain correspondant au format de sortie ('csv' ou 'parquet').
+
+    Avec `split_arcs`, les colonnes propres à l'arc sont écrites une seule fois dans
+    la table des arcs (voir arcs_path_for) au lieu d'être répétées à chaque ligne.
+    Avec `append`, la sortie existante est complétée au lieu d'être remplacée.
+    """
+    if output_format == 'csv':
+        writer = CsvWriter(output, append=append)
+    elif output_format == 'parquet':
+        writer = ParquetDatasetWriter(output, partition_by_arc=partition_by_arc, append=append)
+    else:
+        raise ValueError(f"Format de sortie inconnu : '{output_format}'")
+    if split_arcs:
+        writer = ArcSplitWriter(writer, arcs_path_for(output, output_format), append=append)
+    return writer
+
+
+### Sortie écrite directement par les workers (mode parallèle) ###
+class PartOutput:
+    """
+    Sortie produite en parallèle : chaque worker écrit ses propres fichiers.
+
+    Les workers écrivent leurs faits (et leurs lignes de la table des arcs) dans
+    le répertoire de travail `<sortie>.parts` via write_part, et ne renvoient que
+    la description des fichiers produits. À la validation, le processus principal
+    assemble ces fichiers dans l'ordre des morceaux : concaténation d'octets pour
+    le CSV, simple renommage du répertoire pour le jeu Parquet. Le résultat est
+    identique à celui des écrivains séquentiels (voir open_writer).
+    """
+
+    def __init__(self, output, output_format='csv', partition_by_arc=False, split_arcs=False):
+        if output_format not in ('csv', 'parquet'):
+            raise ValueError(f"Format de sortie inconnu : '{output_format}'")
+        if output_format == 'parquet':
+            _require_pyarrow()
+        self.output = output
+        self.output_format = output_format
+        self.staging_dir = output.rstrip('/\\') + '.parts'
+        self.partition_cols = [PARTITION_DATE] + ([PARTITION_ARC] if partition_by_arc else [])
+        self.arcs_file = arcs_path_for(output, output_format) if split_arcs else None
+        self.rows = 0
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+        os.makedirs(self.staging_dir)
+
+    def spec(self):
+        """Description de la sortie transmise aux workers (voir write_part)."""
+        return {'staging_dir': self.staging_dir, 'output_format': self.output_format,
+                'partition_cols': self.partition_cols, 'split_arcs': self.arcs_file is not None}
+
+    def commit(self, parts):
+        """
+        Assemble les fichiers des workers dans la sortie finale.
+
+        Args:
+            parts (list): Descriptions renvoyées par write_part, dans l'ordre des morceaux.
+        """
+        if self.arcs_file is not None:
+            # La table des arcs est écrite avant les faits : elle couvre toujours les faits publiés
+            arcs = [pd.read_pickle(p['arcs']) for p in parts if p.get('arcs')]
+            if arcs:
+                arcs = pd.concat(arcs).drop_duplicates(ARC_KEY, keep='last')
+                write_arcs(add_arc_endpoints(arcs).reset_index(drop=True), self.arcs_file)
+
+        if self.output_format == 'csv':
+            tmp = self.output + '.tmp'
+            colonnes = next((p['columns'] for p in parts if p.get('columns')), [])
+            with open(tmp, 'w', encoding='utf-8', newline='') as sortie:
+                _write_csv(pd.DataFrame(columns=colonnes), sortie, header=True)
+                for part in parts:
+                    with open(part['file'], 'r', encoding='utf-8', newline='') as morceau:
+                        shutil.copyfileobj(morceau, sortie, 1 << 22)
+            os.replace(tmp, self.output)
+        else:
+            dataset = os.path.join(self.staging_dir, 'dataset')
+            os.makedirs(dataset, exist_ok=True)
+            shutil.rmtree(self.output, ignore_errors=True)
+            os.replace(dataset, self.output)
+        self.rows = sum(p['rows'] for p in parts)
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+    def abort(self):
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+
+def write_part(df, spec, part_name):
+    """
+    Écrit un morceau traité dans le répertoire de travail d'une PartOutput (exécuté dans un worker).
+
+    Returns:
+        dict: Description des fichiers produits (lignes, chemins, colonnes).
+    """
+    staging = spec['staging_dir']
+    infos = {'part': part_name, 'rows': len(df)}
+    facts = df
+    if spec['split_arcs']:
+        facts, arcs = split_arc_dimension(df)
+        infos['arcs'] = os.path.join(staging, f'arcs-{part_name}.pkl')
+        arcs.to_pickle(infos['arcs'])
+    if spec['output_format'] == 'csv':
+        infos['file'] = os.path.join(staging, f'part-{part_name}.csv')
+        infos['columns'] = list(facts.columns)
+        with open(infos['file'], 'w', encoding='utf-8', newline='') as sortie:
+            _write_csv(facts, sortie, header=False)
+    elif len(facts):
+        _write_parquet_part(facts, os.path.join(staging, 'dataset'), spec['partition_cols'], part_name)
+    return infos
+
+
+def resolve_traffic_path(base):
+    """Préfère le jeu Parquet `<base>/` s'il existe, sinon le fichier `<base>.csv`."""
+    base = base[:-4] if base.endswith('.csv') else base
+    if os.path.isdir(base):
+        return base
+    return base + '.csv'
+
+
+def _date_bounds(start, end, last_days, available):
+    """Bornes de dates (chaînes ISO) à partir des paramètres de sélection."""
+    if last_days is not None and available:
+        end_date = date.fromisoformat(max(available))
+        start = max(start or '', (end_date - timedelta(days=last_days - 1)).isoformat())
+    return start, end
+
+
+def read_traffic(path, columns=None, start=None, end=None, last_days=None):
+    """
+    Lit les données nettoyées en ne chargeant que les colonnes et les dates utiles.
+
+    Sur un jeu Parquet, seules les partitions de dates retenues sont lues
+    (élagage des partitions) et seules les colonnes demandées sont décodées.
+    Sur un CSV, la projection est faite à la lecture et le filtre de dates ensuite.
+
+    Si les données sont scindées (table des arcs présente), les colonnes propres à
+    l'arc demandées sont jointes depuis la table des arcs par 'Identifiant arc'.
+
+    Args:
+        path (str): Répertoire du jeu Parquet ou fichier CSV.
+        columns (list): Colonnes à charger (toutes si None).
+        start (str): Première date retenue ('AAAA-MM-JJ', incluse).
+        end (str): Dernière date retenue ('AAAA-MM-JJ', incluse).
+        last_days (int): Ne retenir que les `last_days` derniers jours disponibles.
+
+    Returns:
+        DataFrame: Données sélectionnées.
+    """
+    arcs_file = find_arcs_table(path)
+    if arcs_file is not None:
+        fact_schema = fact_columns(path)
+        # Colonnes propres à l'arc absentes de la table de faits : jointes depuis la table des arcs
+        arc_cols = [c for c in (columns or read_arcs(arcs_file).columns)
+                    if c in ARC_COLUMNS + ARC_ENDPOINTS and c != ARC_KEY and c not in fact_schema]
+        if arc_cols:
+            fact_cols = None if columns is None else \
+                [c for c in columns if c not in arc_cols and c != ARC_KEY] + [ARC_KEY]
+            facts = _read_facts(path, fact_cols, start, end, last_days)
+            arcs = read_arcs(arcs_file, columns=[ARC_KEY] + arc_cols)
+            df = facts.merge(arcs, on=ARC_KEY, how='left')
+            return df if columns is None else df[columns]
+    return _read_facts(path, columns, start, end, last_days)
+
+
+def fact_columns(path):
+    """Colonnes présentes dans les données nettoyées, sans les lire."""
+    if os.path.isdir(path):
+        _require_pyarrow()
+        dataset = ds.dataset(path, format='parquet', partitioning=_partitioning(_partition_cols_of(path)))
+        return list(dataset.schema.names)
+    return list(pd.read_csv(path, sep=';', nrows=0).columns.str.strip())
+
+
+def _parquet_selection(path, start, end, last_days):
+    """Jeu Parquet et filtre des partitions de dates retenues."""
+    _require_pyarrow()
+    dataset = ds.dataset(path, format='parquet', partitioning=_partitioning(_partition_cols_of(path)))
+    available = [d.split('=', 1)[1] for d in os.listdir(path) if d.startswith(PARTITION_DATE + '=')]
+    start, end = _date_bounds(start, end, last_days, available)
+
+    filtre = None
+    if start:
+        filtre = ds.field(PARTITION_DATE) >= start
+    if end:
+        borne = ds.field(PARTITION_DATE) <= end
+        filtre = borne if filtre is None else filtre & borne
+    return dataset, filtre
+
+
+def _table_to_frame(table):
+    # Les colonnes catégorielles sont converties sans passer par des objets Python
+    return apply_schema(table.to_pandas(categories=category_columns(table.column_names)))
+
+
+def _filter_days(df, start, end):
+    """Lignes de `df` dont le jour de comptage est dans [start, end]."""
+    if not (start or end):
+        return df
+    jours = df[DATE_COLUMN].dt.floor('D')
+    garder = pd.Series(True, index=df.index)
+    if start:
+        garder &= jours >= pd.Timestamp(start)
+    if end:
+        garder &= jours <= pd.Timestamp(end)
+    return df[garder]
+
+
+def _read_facts(path, columns, start, end, last_days):
+    """Lecture des données nettoyées sans jointure (voir read_traffic)."""
+    if os.path.isdir(path):
+        dataset, filtre = _parquet_selection(path, start, end, last_days)
+        return _table_to_frame(dataset.to_table(columns=columns, filter=filtre))
+
+    usecols = None
+    if columns is not None:
+        usecols = lambda c: c.strip() in columns  # noqa: E731
+    df = pd.read_csv(path, sep=';', usecols=usecols, dtype=read_dtypes())
+    df.columns = df.columns.str.strip()
+    df = apply_schema(df)
+    if start or end or last_days is not None:
+        jours = df[DATE_COLUMN].dt.floor('D')
+        available = format_dates(pd.Series(jours.dropna().unique())).tolist()
+        start, end = _date_bounds(start, end, last_days, available)
+        df = _filter_days(df, start, end)
+    return df
+
+
+def _csv_days(path, chunksize):
+    """Jours présents dans un CSV nettoyé, en ne lisant que la colonne des dates."""
+    jours = set()
+    for chunk in pd.read_csv(path, sep=';', usecols=lambda c: c.strip() == DATE_COLUMN, chunksize=chunksize):
+        dates = parse_timestamps(chunk.iloc[:, 0], format=CLEAN_DATE_FORMAT)
+        jours.update(format_dates(pd.Series(dates.dropna().dt.floor('D').unique())).tolist())
+    return sorted(jours)
+
+
+def iter_facts(path, columns=None, start=None, end=None, last_days=None, batch_rows=500000):
+    """
+    Lecture par lots des données nettoyées (sans jointure, voir iter_traffic).
+
+    Seul un lot de `batch_rows` lignes environ est en mémoire à la fois. Sur un CSV
+    avec `last_days`, une première passe ne lit que la colonne des dates.
+    """
+    if os.path.isdir(path):
+        dataset, filtre = _parquet_selection(path, start, end, last_days)
+        lots, lignes = [], 0
+        # Les lots d'Arrow suivent les fichiers (un par jour) : regroupés jusqu'à batch_rows lignes
+        for lot in dataset.to_batches(columns=columns, filter=filtre, batch_size=batch_rows):
+            lots.append(lot)
+            lignes += lot.num_rows
+            if lignes >= batch_rows:
+                yield _table_to_frame(pa.Table.from_batches(lots))
+                lots, lignes = [], 0
+        if lignes:
+            yield _table_to_frame(pa.Table.from_batches(lots))
+        return
+
+    if last_days is not None:
+        start, end = _date_bounds(start, end, last_days, _csv_days(path, batch_rows))
+    usecols = None
+    if columns is not None:
+        usecols = lambda c: c.strip() in columns  # noqa: E731
+    for chunk in pd.read_csv(path, sep=';', usecols=usecols, dtype=read_dtypes(), chunksize=batch_rows):
+        chunk.columns = chunk.columns.str.strip()
+        chunk = _filter_days(apply_schema(chunk), start, end)
+        if len(chunk):
+            yield chunk
+
+
+def iter_traffic(path, columns=None, start=None, end=None, last_days=None, batch_rows=500000):
+    """
+    Version par lots de read_traffic : mêmes colonnes, mêmes dates, mémoire bornée.
+
+    Args:
+        batch_rows (int): Nombre de lignes visé par lot.
+
+    Yields:
+        DataFrame: Lots successifs des données sélectionnées.
+    """
+    arcs_file = find_arcs_table(path)
+    arcs, fact_cols = None, columns
+    if arcs_file is not None:
+        fact_schema = fact_columns(path)
+        arc_cols = [c for c in (columns or read_arcs(arcs_file).columns)
+                    if c in ARC_COLUMNS + ARC_ENDPOINTS and c != ARC_KEY and c not in fact_schema]
+        if arc_cols:
+            fact_cols = None if columns is None else \
+                [c for c in columns if c not in arc_cols and c != ARC_KEY] + [ARC_KEY]
+            # La table des arcs (une ligne par arc) est lue une fois et jointe à chaque lot
+            arcs = read_arcs(arcs_file, columns=[ARC_KEY] + arc_cols)
+    for lot in iter_facts(path, fact_cols, start, end, last_days, batch_rows):
+        if arcs is not None:
+            lot = lot.merge(arcs, on=ARC_KEY, how='left')
+            lot = lot if columns is None else lot[columns]
+        yield lot
+
+
+def _taille(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, fichiers in os.walk(path) for f in fichiers)
+
+
+def compare_formats(csv_file, output_dir, columns=None, chunksize=200000):
+    """
+    Compare le CSV et le jeu Parquet : débit d'écriture, taille sur disque, temps de lecture.
+
+    Le CSV est réécrit puis converti en Parquet morceau par morceau ; la lecture est
+    mesurée avec la même projection de colonnes pour les deux formats.
+
+    Returns:
+        dict: Mesures par format.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    csv_copy = os.path.join(output_dir, 'data_cleaned.csv')
+    parquet_dir = os.path.join(output_dir, 'data_cleaned')
+    rapport = {}
+
+    for fmt, cible in (('csv', csv_copy), ('parquet', parquet_dir)):
+        writer = open_writer(cible, fmt)
+        duree = 0.0
+        for chunk in pd.read_csv(csv_file, sep=';', chunksize=chunksize):
+            debut = time.perf_counter()
+            writer.write(chunk)
+            duree += time.perf_counter() - debut
+        debut = time.perf_counter()
+        writer.commit()
+        duree += time.perf_counter() - debut
+
+        debut = time.perf_counter()
+        lu = read_traffic(cible, columns=columns)
+        lecture = time.perf_counter() - debut
+        rapport[fmt] = {
+            'rows': writer.rows,
+            'write_s': duree,
+            'write_rows_per_s': writer.rows / duree if duree else None,
+            'size_mb': _taille(cible) / 1e6,
+            'read_s': lecture,
+            'read_columns': len(lu.columns),
+        }
+    return rapport
+
+
+if __name__ == '__main__':
+    source = sys.argv[1] if len(sys.argv) > 1 else 'data_cleaned.csv'
+    colonnes = [DATE_COLUMN, 'Debit_Horaire', "Taux d'occupation", 'Etat trafic', 'distance_arc', 'Emission_CO2']
+    for fmt, mesures in compare_formats(source, 'storage_benchmark', columns=colonnes).items():
+        print(f"{fmt:8s} écriture {mesures['write_s']:.2f}s ({mesures['write_rows_per_s']:.0f} lignes/s), "
+              f"taille {mesures['size_mb']:.1f} Mo, lecture {mesures['read_s']:.2f}s")
@@ -0,0 +1,268 @@
+import heapq
+import math
+import os
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# Ajouter le répertoire racine du projet à sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from backend.data_analyst.geo import haversine_np
+
+### Coûts d'arcs par heure de la semaine et itinéraires selon l'heure de départ ###
+
+HOURS_OF_WEEK = 168
+TIME_COSTS_SUFFIX = '.td.npz'
+# Vitesse qui fait avancer l'horloge le long de l'itinéraire (le coût n'est pas une durée)
+DEFAULT_SPEED_KMH = 20.0
+# Fuseau d'une heure saisie sans fuseau ; les tranches du tenseur sont en UTC, comme les
+# horodatages des comptages (etl : parse_timestamps(..., utc=True))
+LOCAL_TIMEZONE = 'Europe/Paris'
+
+
+def time_costs_path(edges_file):
+    """Fichier des coûts horaires associé à un fichier de coûts (edge_costs.csv -> edge_costs.td.npz)."""
+    return os.path.splitext(edges_file)[0] + TIME_COSTS_SUFFIX
+
+
+def to_utc(when):
+    """
+    Instant en heure UTC sans fuseau, l'échelle des comptages.
+
+    Un instant avec fuseau est converti ; un instant sans fuseau est une heure de
+    Paris (heure d'été pour une heure ambiguë, décalée vers l'avant pour une heure
+    inexistante au passage à l'heure d'été).
+    """
+    when = pd.Timestamp(when)
+    if when.tzinfo is None:
+        when = when.tz_localize(LOCAL_TIMEZONE, ambiguous=True, nonexistent='shift_forward')
+    return when.tz_convert('UTC').tz_localize(None)
+
+
+def hour_of_week(when):
+    """Heure de la semaine UTC (0 = lundi 0h, 167 = dimanche 23h), avec les minutes en fraction d'heure."""
+    when = to_utc(when)
+    return when.weekday() * 24 + when.hour + when.minute / 60
+
+
+def _partial_sums(up, down, hours, costs):
+    """Sommes et effectifs des coûts par (arc, heure de la semaine) : une agrégation np.bincount."""
+    up, down = np.asarray(up, dtype=np.int64), np.asarray(down, dtype=np.int64)
+    hours, costs = np.asarray(hours), np.asarray(costs, dtype=np.float64)
+    valides = (hours >= 0) & (hours < HOURS_OF_WEEK) & np.isfinite(costs)
+    arcs, inverse = np.unique(np.column_stack([up[valides], down[valides]]), axis=0, return_inverse=True)
+    code = inverse.ravel() * HOURS_OF_WEEK + hours[valides].astype(np.int64)
+    taille = len(arcs) * HOURS_OF_WEEK
+    sommes = np.bincount(code, weights=costs[valides], minlength=taille).reshape(-1, HOURS_OF_WEEK)
+    effectifs = np.bincount(code, minlength=taille).reshape(-1, HOURS_OF_WEEK)
+    return arcs, sommes, effectifs
+
+
+def arc_means(batches):
+    """
+    Moyenne par arc de valeurs de comptage, lues par lots (up, down, valeurs...).
+
+    Returns:
+        tuple: (arcs int64 (n_arcs, 2) en ordre lexicographique, moyennes (n_arcs,
+            n_valeurs), NaN pour un arc sans valeur finie).
+    """
+    arcs, sommes, effectifs = None, None, None
+    for up, down, *valeurs in batches:
+        a, inverse = np.unique(np.column_stack([np.asarray(up, dtype=np.int64), np.asarray(down, dtype=np.int64)]),
+                               axis=0, return_inverse=True)
+        valeurs = np.column_stack([np.asarray(v, dtype=np.float64) for v in valeurs])
+        finies = np.isfinite(valeurs)
+        s, e = np.zeros((len(a), valeurs.shape[1])), np.zeros((len(a), valeurs.shape[1]))
+        np.add.at(s, inverse.ravel(), np.where(finies, valeurs, 0.0))
+        np.add.at(e, inverse.ravel(), finies)
+        if arcs is not None:
+            a, inverse = np.unique(np.concatenate([arcs, a]), axis=0, return_inverse=True)
+            cumul_s, cumul_e = np.zeros((len(a), s.shape[1])), np.zeros((len(a), s.shape[1]))
+            np.add.at(cumul_s, inverse.ravel(), np.concatenate([sommes, s]))
+            np.add.at(cumul_e, inverse.ravel(), np.concatenate([effectifs, e]))
+            s, e = cumul_s, cumul_e
+        arcs, sommes, effectifs = a, s, e
+    if arcs is None:
+        return np.empty((0, 2), dtype=np.int64), np.empty((0, 0))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return arcs, sommes / effectifs
+
+
+@dataclass
+class TimeDependentCosts:
+    """
+    Coût moyen de chaque arc par heure de la semaine (tenseur arcs x 168, float32).
+
+    Une heure sans comptage prend le coût moyen de l'arc à la même heure les autres
+    jours, à défaut son coût moyen toutes heures confondues.
+    """
+    arcs: np.ndarray   # int64, forme (n_arcs, 2) : nœud amont, nœud aval (ordre lexicographique)
+    costs: np.ndarray  # float32, forme (n_arcs, 168)
+
+    def __len__(self):
+        return len(self.arcs)
+
+    @classmethod
+    def from_arrays(cls, up, down, hours, costs):
+        """Tenseur des coûts de comptages (nœud amont, nœud aval, heure de la semaine, coût)."""
+        return cls._from_sums(*_partial_sums(up, down, hours, costs))
+
+    @classmethod
+    def from_batches(cls, batches):
+        """Même tenseur à partir de lots (up, down, hours, costs) : seules les sommes par arc sont gardées."""
+        arcs, sommes, effectifs = None, None, None
+        for lot in batches:
+            a, s, e = _partial_sums(*lot)
+            if arcs is None:
+                arcs, sommes, effectifs = a, s, e
+                continue
+            arcs, inverse = np.unique(np.concatenate([arcs, a]), axis=0, return_inverse=True)
+            inverse = inverse.ravel()
+            cumul_s = np.zeros((len(arcs), HOURS_OF_WEEK))
+            cumul_e = np.zeros((len(arcs), HOURS_OF_WEEK), dtype=np.int64)
+            np.add.at(cumul_s, inverse, np.concatenate([sommes, s]))
+            np.add.at(cumul_e, inverse, np.concatenate([effectifs, e]))
+            sommes, effectifs = cumul_s, cumul_e
+        if arcs is None:
+            return cls(np.empty((0, 2), dtype=np.int64), np.empty((0, HOURS_OF_WEEK), dtype=np.float32))
+        return cls._from_sums(arcs, sommes, effectifs)
+
+    @classmethod
+    def _from_sums(cls, arcs, sommes, effectifs):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            couts = sommes / effectifs
+            # Même heure les autres jours (tenseur vu en 7 jours x 24 heures), puis toutes heures
+            heure = (sommes.reshape(-1, 7, 24).sum(axis=1) / effectifs.reshape(-1, 7, 24).sum(axis=1))
+            moyenne = sommes.sum(axis=1) / effectifs.sum(axis=1)
+        couts = np.where(effectifs > 0, couts, np.tile(heure, 7))
+        couts = np.where(np.isnan(couts), moyenne[:, None], couts)
+        return cls(arcs, couts.astype(np.float32))
+
+    @property
+    def static(self):
+        """Coût moyen de chaque arc sur la semaine."""
+        return self.costs.mean(axis=1)
+
+    def static_for(self, up, down):
+        """Coût moyen sur la semaine de chaque arc (NaN pour un arc absent du tenseur, sens compris)."""
+        lignes = self.rows(up, down, undirected=False)
+        return np.where(lignes >= 0, self.static[lignes.clip(0)], np.nan) if len(self) else np.full(len(lignes), np.nan)
+
+    def rows(self, up, down, undirected=True):
+        """
+        Ligne du tenseur de chaque arc (int64, -1 pour un arc inconnu).
+
+        Args:
+            undirected (bool): Un arc absent dans ce sens prend le coût du sens inverse.
+        """
+        index = pd.MultiIndex.from_arrays([self.arcs[:, 0], self.arcs[:, 1]])
+        lignes = index.get_indexer(pd.MultiIndex.from_arrays([np.asarray(up), np.asarray(down)]))
+        if undirected:
+            inverses = index.get_indexer(pd.MultiIndex.from_arrays([np.asarray(down), np.asarray(up)]))
+            lignes = np.where(lignes >= 0, lignes, inverses)
+        return lignes.astype(np.int64)
+
+    def save(self, path):
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, arcs=self.arcs, costs=self.costs)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as fichier:
+            return cls(fichier['arcs'], fichier['costs'])
+
+
+class TimeDependentGraph:
+    """
+    Recherche d'itinéraire sur un CSRGraph avec les coûts de l'heure de passage.
+
+    Chaque arête du CSR est reliée à sa ligne du tenseur ; son coût est lu dans la
+    tranche horaire de l'instant où l'itinéraire l'atteint : un accès O(1) par
+    relâchement, dans le tenseur aplati. L'horloge avance de la longueur à vol
+    d'oiseau de l'arête à `speed_kmh` (elle reste fixe sans coordonnées). Une arête
+    sans ligne dans le tenseur garde son coût statique.
+    """
+
+    def __init__(self, graph, costs, speed_kmh=DEFAULT_SPEED_KMH):
+        self.graph, self.costs, self.speed_kmh = graph, costs, speed_kmh
+        sources = np.repeat(np.arange(len(graph), dtype=np.int64), np.diff(graph.indptr))
+        lignes = costs.rows(graph.node_ids[sources], graph.node_ids[graph.indices])
+        self.covered = float((lignes >= 0).mean()) if len(lignes) else 0.0
+        heures = haversine_np(graph.lon[sources], graph.lat[sources], graph.lon[graph.indices],
+                              graph.lat[graph.indices]) / speed_kmh
+        # Listes Python et vue mémoire : lecture élément par élément sans objet numpy intermédiaire
+        self._lignes = (lignes * HOURS_OF_WEEK).tolist()
+        self._heures = np.nan_to_num(heures, nan=0.0).tolist()
+        self._tenseur = memoryview(np.ascontiguousarray(costs.costs, dtype=np.float32).ravel())
+
+    def search(self, source, target, departure):
+        """
+        Plus court chemin entre deux numéros internes pour un départ à `departure`.
+
+        Les étiquettes sont réglées par coût croissant ; chaque nœud garde l'heure
+        d'arrivée de son meilleur chemin, qui fixe la tranche horaire des arêtes suivantes.
+
+        Args:
+            departure: Instant de départ (datetime, Timestamp ou chaîne ISO).
+
+        Returns:
+            tuple: (liste des numéros internes, coût total), ou (None, None) sans chemin.
+        """
+        depart = hour_of_week(departure)
+        indptr, indices, weights = self.graph.adjacency
+        lignes, heures, tenseur = self._lignes, self._heures, self._tenseur
+        distance = {source: 0.0}
+        horloge = {source: depart}
+        precedent = {}
+        fermes = set()
+        tas = [(0.0, source)]
+        while tas:
+            d, u = heapq.heappop(tas)
+            if u in fermes:
+                continue
+            if u == target:
+                break
+            fermes.add(u)
+            tranche = int(horloge[u]) % HOURS_OF_WEEK
+            for j in range(indptr[u], indptr[u + 1]):
+                v = indices[j]
+                ligne = lignes[j]
+                nd = d + (tenseur[ligne + tranche] if ligne >= 0 else weights[j])
+                if nd < distance.get(v, math.inf):
+                    distance[v] = nd
+                    horloge[v] = horloge[u] + heures[j]
+                    precedent[v] = u
+                    heapq.heappush(tas, (nd, v))
+        else:
+            return None, None
+
+        chemin = [target]
+        while chemin[-1] != source:
+            chemin.append(precedent[chemin[-1]])
+        chemin.reverse()
+        return chemin, distance[target]
+
+    def shortest_path(self, source, target, departure):
+        """Chemin de coût minimal entre deux identifiants de nœud pour un départ donné : (nœuds, coût) ou (None, None)."""
+        s, t = self.graph.position(source), self.graph.position(target)
+        if s is None or t is None:
+            return None, None
+        chemin, cout = self.search(s, t, departure)
+        if chemin is None:
+            return None, None
+        return self.graph.node_ids[chemin].tolist(), cout
+
+    @classmethod
+    def load_for(cls, graph, path, speed_kmh=DEFAULT_SPEED_KMH):
+        """Coûts horaires enregistrés pour ce graphe, ou None si le fichier est absent."""
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls(graph, TimeDependentCosts.load(path), speed_kmh)
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Coûts horaires illisibles ({path}) : {e}")
+            return None
@@ -0,0 +1,211 @@
+import os
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# Ajouter le répertoire racine du projet à sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from backend.data_analyst.geo import haversine_np
+
+### Index météo et jointure « as-of » par station la plus proche ###
+
+# Colonnes météo des features, par fichier Météo-France (quotidien : AAAAMMJJ, horaire : AAAAMMJJHH).
+# HXI2 / HXI est l'heure de la rafale maximale ; le nom 'humidex' est celui des modèles existants.
+WEATHER_FEATURES = ['precip', 'temp_min', 'temp_max', 'temp_mean', 'wind_speed', 'wind_gust', 'gust_dir', 'humidex']
+DAILY_COLUMNS = {'RR': 'precip', 'TN': 'temp_min', 'TX': 'temp_max', 'TM': 'temp_mean',
+                 'FF2M': 'wind_speed', 'FXI2': 'wind_gust', 'DXI2': 'gust_dir', 'HXI2': 'humidex'}
+HOURLY_COLUMNS = {'RR1': 'precip', 'TN': 'temp_min', 'TX': 'temp_max', 'T': 'temp_mean',
+                  'FF': 'wind_speed', 'FXI': 'wind_gust', 'DXI': 'gust_dir', 'HXI': 'humidex'}
+# Clé de temps, format et pas des relevés
+TIME_COLUMNS = {'AAAAMMJJHH': ('%Y%m%d%H', pd.Timedelta(hours=1), HOURLY_COLUMNS),
+                'AAAAMMJJ': ('%Y%m%d', pd.Timedelta(days=1), DAILY_COLUMNS)}
+# Nombre de stations essayées par arc, de la plus proche à la plus éloignée
+STATION_FALLBACKS = 2
+
+
+@dataclass
+class WeatherIndex:
+    """
+    Relevés météo triés par (station, instant), prêts pour une jointure « as-of ».
+
+    Les relevés de la station i sont `times[offsets[i]:offsets[i + 1]]` (secondes
+    depuis l'époque, croissantes) et les lignes correspondantes de `values`. Un
+    relevé vaut de son instant jusqu'au relevé suivant, dans la limite de
+    `tolerance` (par défaut le pas des relevés : un jour ou une heure).
+    """
+    stations: pd.DataFrame  # NUM_POSTE, NOM_USUEL, LAT, LON (ligne i = station i)
+    times: np.ndarray       # int64, secondes, forme (n_relevés,)
+    offsets: np.ndarray     # int64, forme (n_stations + 1,)
+    values: np.ndarray      # float32, forme (n_relevés, len(columns))
+    columns: list
+    tolerance: pd.Timedelta
+
+    def __post_init__(self):
+        # Clé de recherche unique (station, instant), croissante : station * étendue + décalage
+        self._t0 = self.times.min() - 1 if len(self.times) else 0
+        self._etendue = self.times.max() - self._t0 + 1 if len(self.times) else 1
+        self._station_releve = np.repeat(np.arange(len(self.stations), dtype=np.int64), np.diff(self.offsets))
+        self._cles = self._station_releve * self._etendue + (self.times - self._t0)
+
+    def __len__(self):
+        return len(self.times)
+
+    @classmethod
+    def from_frame(cls, weather):
+        """
+        Construit l'index à partir d'un relevé Météo-France (quotidien ou horaire).
+
+        Les colonnes absentes du fichier donnent NaN ; sans colonne NUM_POSTE, tous
+        les relevés sont attribués à une station unique sans coordonnées.
+        """
+        cle = next((c for c in TIME_COLUMNS if c in weather.columns), None)
+        if cle is None:
+            raise ValueError(f"Colonne de date absente du fichier météo (attendue : {', '.join(TIME_COLUMNS)})")
+        format_date, pas, sources = TIME_COLUMNS[cle]
+        instants = pd.to_datetime(weather[cle].astype(str), format=format_date, errors='coerce')
+        garder = instants.notna().to_numpy()
+        weather, instants = weather[garder], instants[garder]
+
+        if 'NUM_POSTE' in weather.columns:
+            codes, postes = pd.factorize(weather['NUM_POSTE'], sort=True)
+            infos = weather.drop_duplicates('NUM_POSTE').set_index('NUM_POSTE').reindex(postes)
+            stations = pd.DataFrame({'NUM_POSTE': postes})
+            for colonne in ('NOM_USUEL', 'LAT', 'LON'):
+                stations[colonne] = infos[colonne].to_numpy() if colonne in infos.columns else np.nan
+            stations[['LAT', 'LON']] = stations[['LAT', 'LON']].apply(pd.to_numeric, errors='coerce')
+        else:
+            codes = np.zeros(len(weather), dtype=np.int64)
+            stations = pd.DataFrame({'NUM_POSTE': [None], 'NOM_USUEL': [None], 'LAT': [np.nan], 'LON': [np.nan]})
+
+        secondes = instants.to_numpy(dtype='datetime64[s]').view(np.int64)
+        ordre = np.lexsort((secondes, codes))
+        valeurs = np.full((len(weather), len(WEATHER_FEATURES)), np.nan, dtype=np.float32)
+        for source, nom in sources.items():
+            if source in weather.columns:
+                valeurs[:, WEATHER_FEATURES.index(nom)] = pd.to_numeric(weather[source], errors='coerce')
+        offsets = np.zeros(len(stations) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=len(stations)), out=offsets[1:])
+        return cls(stations, secondes[ordre], offsets, valeurs[ordre], list(WEATHER_FEATURES), pas)
+
+    @classmethod
+    def from_csv(cls, path, sep=';'):
+        return cls.from_frame(pd.read_csv(path, sep=sep))
+
+    @property
+    def fill_values(self):
+        """Médiane de chaque colonne, pour les lignes sans relevé."""
+        with np.errstate(all='ignore'):
+            return np.nanmedian(self.values, axis=0) if len(self) else np.full(len(self.columns), np.nan)
+
+    def nearest_stations(self, lon, lat, k=STATION_FALLBACKS):
+        """
+        Stations les plus proches de chaque point (distance de Haversine).
+
+        Returns:
+            ndarray: Codes des `k` stations les plus proches (int64, forme (n, k)), de
+                la plus proche à la plus éloignée ; -1 pour un point sans coordonnées.
+        """
+        lon = np.asarray(lon, dtype=np.float64)[:, None]
+        lat = np.asarray(lat, dtype=np.float64)[:, None]
+        distances = haversine_np(lon, lat, self.stations['LON'].to_numpy(dtype=np.float64)[None, :],
+                                 self.stations['LAT'].to_numpy(dtype=np.float64)[None, :])
+        # Stations sans coordonnées : classées après toutes les autres
+        distances = np.where(np.isnan(distances), np.inf, distances)
+        k = min(k, len(self.stations))
+        proches = np.argsort(distances, axis=1, kind='stable')[:, :k]
+        if len(self.stations) > 1:
+            proches[np.isnan(lon[:, 0]) | np.isnan(lat[:, 0])] = -1
+        return proches
+
+    def lookup(self, times, stations, tolerance=None):
+        """
+        Position du dernier relevé de la station à chaque instant (jointure « as-of »).
+
+        Les relevés de toutes les stations sont rangés sur une clé unique (station,
+        instant), calculée à la construction : une seule recherche dichotomique, en O(n log m).
+
+        Args:
+            times: Instants (datetime64, sans fuseau, même référence que les relevés).
+            stations (ndarray): Code de station de chaque instant (-1 : aucune).
+            tolerance (Timedelta): Écart maximal entre l'instant et le relevé.
+
+        Returns:
+            ndarray: Positions dans `times` / `values` (int64), -1 sans relevé valable.
+        """
+        tolerance = int(pd.Timedelta(tolerance or self.tolerance).total_seconds())
+        instants = np.asarray(times, dtype='datetime64[s]')
+        valides = ~np.isnat(instants)
+        stations = np.asarray(stations, dtype=np.int64)
+        valides &= stations >= 0
+        positions = np.full(len(instants), -1, dtype=np.int64)
+        if not len(self) or not valides.any():
+            return positions
+
+        requetes = instants[valides].view(np.int64)
+        cibles = stations[valides] * self._etendue + np.clip(requetes - self._t0, 0, self._etendue - 1)
+        trouve = np.searchsorted(self._cles, cibles, side='right') - 1
+        station_releve = self._station_releve
+        # Le relevé trouvé doit appartenir à la station demandée et être assez récent
+        ok = trouve >= 0
+        ok[ok] = station_releve[trouve[ok]] == stations[valides][ok]
+        ok[ok] = requetes[ok] - self.times[trouve[ok]] < tolerance
+        positions[valides] = np.where(ok, trouve, -1)
+        return positions
+
+    def join(self, times, stations, tolerance=None):
+        """
+        Valeurs météo de chaque instant, de la station la plus proche qui a un relevé.
+
+        Args:
+            times: Instants (datetime64).
+            stations (ndarray): Stations candidates de chaque instant, forme (n, k),
+                de la plus proche à la plus éloignée (voir nearest_stations).
+
+        Returns:
+            tuple: (valeurs float32 forme (n, len(columns)), NaN sans relevé ; masque
+                des lignes sans relevé).
+        """
+        stations = np.asarray(stations, dtype=np.int64).reshape(len(times), -1)
+        positions = np.full(len(times), -1, dtype=np.int64)
+        for rang in range(stations.shape[1]):
+            manquantes = np.flatnonzero(positions < 0)
+            if not len(manquantes):
+                break
+            positions[manquantes] = self.lookup(np.asarray(times)[manquantes], stations[manquantes, rang], tolerance)
+        valeurs = np.full((len(times), len(self.columns)), np.nan, dtype=np.float32)
+        trouvees = positions >= 0
+        valeurs[trouvees] = self.values[positions[trouvees]]
+        return valeurs, ~trouvees
+
+    def arc_stations(self, arcs, key, lon='start_lon', lat='start_lat', k=STATION_FALLBACKS):
+        """Stations candidates de chaque arc (DataFrame indexé par `key`, une colonne par rang)."""
+        proches = self.nearest_stations(arcs[lon], arcs[lat], k)
+        return pd.DataFrame(proches, index=pd.Index(arcs[key]), columns=[f'station_{i}' for i in range(proches.shape[1])])
+
+    def attach(self, df, arc_stations, key, time_column='DateTime', tolerance=None, fill=True):
+        """
+        Ajoute les colonnes météo à `df` en place (sans copier le reste du tableau).
+
+        Fonctionne sur un morceau à la fois : l'index et les stations des arcs sont
+        calculés une fois puis réutilisés pour chaque morceau.
+
+        Args:
+            df (DataFrame): Comptages (colonnes `key` et `time_column`).
+            arc_stations (DataFrame): Résultat de arc_stations.
+            fill (bool): Remplace les valeurs manquantes par la médiane de la colonne.
+
+        Returns:
+            int: Nombre de lignes sans relevé météo.
+        """
+        lignes = arc_stations.index.get_indexer(df[key])
+        stations = np.where(lignes[:, None] >= 0, arc_stations.to_numpy()[lignes], -1)
+        valeurs, manquantes = self.join(df[time_column].to_numpy(dtype='datetime64[ns]'), stations, tolerance)
+        if fill:
+            valeurs = np.where(np.isnan(valeurs), self.fill_values.astype(np.float32), valeurs)
+        for j, colonne in enumerate(self.columns):
+            df[colonne] = valeurs[:, j]
+        return int(manquantes.sum())
+
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Ajouter le répertoire racine du projet à sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -0,0 +1,57 @@
+import threading
+import time
+
+import numpy as np
+
+from backend.data_analyst.cost_refresh import TRAFFIC_FEATURES, CostRefresher, EdgeFeatureTable
+
+
+class ModeleLent:
+    """Modèle factice : un coût par ligne, après une attente, en comptant les appels."""
+
+    def __init__(self, attente=0.0):
+        self.attente, self.appels = attente, 0
+        self.debut = threading.Event()
+
+    def predict(self, X):
+        self.appels += 1
+        self.debut.set()
+        time.sleep(self.attente)
+        return X[:, 0].astype(np.float64)
+
+
+def _table():
+    noms = ['longueur'] + TRAFFIC_FEATURES
+    X = np.array([[1.0, 100.0, 5.0, 1.0], [2.0, 200.0, 10.0, 1.0], [3.0, 300.0, 15.0, 1.0]])
+    return EdgeFeatureTable.from_arrays(X, noms, np.array([1, 2, 3]), np.array([2, 3, 1]), np.array([8, 8, 8]))
+
+
+def test_requetes_simultanees_partagent_une_prediction():
+    modele = ModeleLent(attente=0.2)
+    refresher = CostRefresher(modele, _table())
+    resultats = []
+    threads = [threading.Thread(target=lambda: resultats.append(refresher.costs('2024-03-04T09:00')))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert modele.appels == 1
+    assert len(resultats) == 8 and all(r is resultats[0] for r in resultats)
+    np.testing.assert_allclose(resultats[0], [1.0, 2.0, 3.0])
+
+
+def test_un_contexte_en_cache_ne_attend_pas_un_calcul():
+    modele = ModeleLent()
+    refresher = CostRefresher(modele, _table())
+    refresher.costs('2024-03-04T09:00')
+    modele.attente = 1.0
+    modele.debut.clear()
+    calcul = threading.Thread(target=refresher.costs, args=('2024-03-05T09:00',))
+    calcul.start()
+    assert modele.debut.wait(5)
+    debut = time.perf_counter()
+    refresher.costs('2024-03-04T09:00')
+    assert time.perf_counter() - debut < 0.5
+    calcul.join()
+    assert modele.appels == 2
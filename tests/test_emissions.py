@@ -0,0 +1,29 @@
+import numpy as np
+
+from backend.data_analyst.emissions import load_emission_scenarios
+
+
+def type_d_origine(debit_horaire):
+    """Classe de véhicule de l'ETL d'origine (seuils écrits en dur, débits entiers)."""
+    if debit_horaire <= 50:
+        return 'Piéton/Vélo'
+    elif 51 <= debit_horaire <= 200:
+        return 'Moto'
+    elif 201 <= debit_horaire <= 800:
+        return 'Voiture essence'
+    elif 801 <= debit_horaire <= 1500:
+        return 'Voiture diesel'
+    elif 1501 <= debit_horaire <= 2500:
+        return 'Voiture électrique'
+    elif 2501 <= debit_horaire <= 4000:
+        return 'Bus'
+    return 'Camion'
+
+
+def test_seuils_identiques_a_l_etl_d_origine():
+    scenarios, defaut = load_emission_scenarios()
+    paris = scenarios[defaut]
+    seuils = np.array([0, 50, 51, 200, 201, 800, 801, 1500, 1501, 2500, 2501, 4000, 4001, 10000])
+    assert paris.vehicle_types(seuils).tolist() == [type_d_origine(d) for d in seuils]
+    facteurs = dict(zip(paris.vehicles, paris.factors))
+    np.testing.assert_allclose(paris.emissions(seuils, 2.0), [2.0 * facteurs[type_d_origine(d)] for d in seuils])
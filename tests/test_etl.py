@@ -0,0 +1,65 @@
+import pytest
+
+from backend.data_analyst import etl
+from backend.data_analyst.generate_synthetic_data import generate_traffic
+from backend.data_analyst.incremental import iter_line_blocks, read_header
+from backend.data_analyst.storage import open_writer
+
+
+@pytest.fixture(scope='module')
+def sans_saut_final(tmp_path_factory):
+    """Export synthétique dont la dernière ligne n'a pas de saut de ligne."""
+    chemin = tmp_path_factory.mktemp('etl') / 'data_frame.csv'
+    generate_traffic(str(chemin), 2000, n_arcs=50, seed=1)
+    contenu = chemin.read_bytes().rstrip(b'\r\n')
+    chemin.write_bytes(contenu)
+    return chemin
+
+
+def test_iter_line_blocks_garde_la_derniere_ligne_avec_to_eof(sans_saut_final):
+    _, debut = read_header(sans_saut_final)
+    taille = sans_saut_final.stat().st_size
+    plages = list(iter_line_blocks(sans_saut_final, debut, taille, 4096, to_eof=True))
+    assert plages[0][0] == debut and plages[-1][1] == taille
+    assert all(a[1] == b[0] for a, b in zip(plages, plages[1:]))
+
+
+def test_iter_line_blocks_laisse_la_ligne_incomplete_en_incremental(sans_saut_final):
+    _, debut = read_header(sans_saut_final)
+    contenu = sans_saut_final.read_bytes()
+    plages = list(iter_line_blocks(sans_saut_final, debut, len(contenu), 4096))
+    assert plages[-1][1] == contenu.rfind(b'\n') + 1
+
+
+@pytest.mark.parametrize('split_arcs', [True, False])
+def test_parallel_et_streaming_identiques(sans_saut_final, tmp_path, split_arcs):
+    parallele, flux = tmp_path / 'parallel.csv', tmp_path / 'streaming.csv'
+    lignes = etl.run_parallel(str(sans_saut_final), str(parallele), 2, split_arcs=split_arcs, block_bytes=16 << 10)
+    writer = open_writer(str(flux), split_arcs=split_arcs)
+    assert etl.run_streaming(str(sans_saut_final), writer, 2, chunksize=500) == lignes
+    assert parallele.read_bytes() == flux.read_bytes()
+    arcs = [tmp_path / 'parallel_arcs.csv', tmp_path / 'streaming_arcs.csv']
+    if split_arcs:
+        assert arcs[0].read_bytes() == arcs[1].read_bytes()
+    else:
+        assert not any(a.exists() for a in arcs)
+
+
+def test_incremental_identique_a_une_execution_unique(tmp_path):
+    source = tmp_path / 'complet.csv'
+    generate_traffic(str(source), 2000, n_arcs=50, seed=2)
+    contenu = source.read_bytes()
+    # Premier export coupé au milieu d'une ligne : la ligne incomplète attend l'exécution suivante
+    export, sortie = tmp_path / 'data_frame.csv', tmp_path / 'incremental.csv'
+    export.write_bytes(contenu[:len(contenu) * 3 // 5])
+    premieres = etl.run_incremental(str(export), str(sortie), 2, block_bytes=16 << 10)
+    export.write_bytes(contenu)
+    suivantes = etl.run_incremental(str(export), str(sortie), 2, block_bytes=16 << 10)
+    assert premieres > 0 and suivantes > 0
+    assert etl.run_incremental(str(export), str(sortie), 2) == 0
+
+    reference = tmp_path / 'reference.csv'
+    assert premieres + suivantes == etl.run_parallel(str(source), str(reference), 2)
+    assert sortie.read_bytes() == reference.read_bytes()
+    lignes = [sorted((tmp_path / f'{nom}_arcs.csv').read_text().splitlines()) for nom in ('incremental', 'reference')]
+    assert lignes[0] == lignes[1]
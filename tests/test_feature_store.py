@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from backend.data_analyst.feature_store import NpyAppender
+
+
+@pytest.mark.parametrize('dtype, width', [(np.float32, 3), (np.int64, None), (np.float64, 1)])
+def test_npy_appender_relu_par_numpy(tmp_path, dtype, width):
+    rng = np.random.default_rng(0)
+    forme = (lambda n: (n,)) if width is None else (lambda n: (n, width))
+    lots = [rng.integers(0, 1000, size=forme(n)).astype(dtype) for n in (5, 0, 17, 1)]
+    chemin = tmp_path / 'x.npy'
+    ecrivain = NpyAppender(str(chemin), dtype, width)
+    for lot in lots:
+        ecrivain.append(lot)
+    ecrivain.close()
+    attendu = np.concatenate(lots)
+    for mode in (None, 'r'):
+        relu = np.load(chemin, mmap_mode=mode)
+        assert relu.dtype == attendu.dtype and relu.shape == attendu.shape
+        np.testing.assert_array_equal(relu, attendu)
+
+
+def test_npy_appender_fichier_vide(tmp_path):
+    chemin = tmp_path / 'vide.npy'
+    ecrivain = NpyAppender(str(chemin), np.float32, 4)
+    ecrivain.close()
+    assert np.load(chemin).shape == (0, 4)
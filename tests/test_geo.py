@@ -0,0 +1,21 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from backend.data_analyst.geo import parse_geo_shapes
+
+
+def test_parse_geo_shapes_lignes_valides_et_invalides():
+    valeurs = pd.Series(['{coordinates: [[2.3, 48.8], [2.31, 48.81]], type: LineString}',
+                         '{coordinates: [2.35, 48.85], type: Point}',
+                         '{coordinates: [[2.3, 48.8], [2.31]], type: LineString}',
+                         'pas une géométrie', None,
+                         '{coordinates: [[2.3, 48.8], [2.31, 48.81]], type: LineString}'])
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', DeprecationWarning)
+        formes = parse_geo_shapes(valeurs)
+    assert formes.valid.tolist() == [True, True, False, False, False, True]
+    assert np.diff(formes.offsets).tolist() == [2, 1, 0, 0, 0, 2]
+    np.testing.assert_allclose(formes.coords[:3], [[2.3, 48.8], [2.31, 48.81], [2.35, 48.85]])
+    assert formes.type_codes[2] == -1
@@ -0,0 +1,119 @@
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.data_analyst.contraction import ContractionHierarchy
+from backend.data_analyst.csr_graph import CSRGraph
+from backend.data_analyst.routing import NODE_DOWN, NODE_UP, RouteGraph
+
+COTE = 10
+
+
+@pytest.fixture(scope='module')
+def reseau(tmp_path_factory):
+    """
+    Grille de COTE x COTE nœuds, plus un arc isolé (2 nœuds sans chemin vers la grille).
+
+    Chaque arête est écrite dans les deux sens avec des coûts différents (le dernier
+    lu l'emporte) : tous les nœuds sont ainsi nœud amont d'au moins un arc.
+    """
+    rng = np.random.default_rng(3)
+    position = {1000 + i: (48.85 + (i // COTE) * 0.002, 2.30 + (i % COTE) * 0.003) for i in range(COTE * COTE)}
+    position.update({5000: (48.80, 2.20), 5001: (48.801, 2.201)})
+    paires = [(1000 + i, 1000 + i + 1) for i in range(COTE * COTE) if i % COTE < COTE - 1]
+    paires += [(1000 + i, 1000 + i + COTE) for i in range(COTE * (COTE - 1))]
+    paires += [(5000, 5001)]
+    lignes = []
+    for u, v in paires:
+        for a, b in ((u, v), (v, u)):
+            lignes.append({NODE_UP: a, NODE_DOWN: b, 'cost': rng.uniform(1.0, 5.0),
+                           'Emission_CO2': rng.uniform(0.0, 100.0),
+                           'start_lat': position[a][0], 'start_lon': position[a][1],
+                           'end_lat': position[b][0], 'end_lon': position[b][1]})
+    table = pd.DataFrame(lignes)
+    dossier = tmp_path_factory.mktemp('reseau')
+    edges_file, nodes_file = dossier / 'edge_costs.csv', dossier / 'node_coords.csv'
+    table[[NODE_UP, NODE_DOWN, 'cost', 'Emission_CO2']].to_csv(edges_file, index=False)
+    table[[NODE_UP, NODE_DOWN, 'start_lon', 'start_lat', 'end_lon', 'end_lat']].to_csv(nodes_file, index=False)
+    return str(edges_file), str(nodes_file), position
+
+
+def route_d_origine(edges_file, nodes_file, start_coord, end_coord):
+    """Itinéraire calculé comme le faisait ML.predict_route avant le graphe partagé."""
+    edges = pd.read_csv(edges_file, dtype={NODE_UP: int, NODE_DOWN: int})
+    nodes = pd.read_csv(nodes_file, dtype={NODE_UP: int, NODE_DOWN: int})
+    G = nx.Graph()
+    merged = edges.merge(nodes, on=[NODE_UP, NODE_DOWN])
+    for _, r in merged.iterrows():
+        G.add_edge(int(r[NODE_UP]), int(r[NODE_DOWN]), weight=r['cost'])
+
+    def closest_node(coord):
+        dfn = nodes.assign(dist=lambda df: np.hypot(df['start_lat'] - coord[0], df['start_lon'] - coord[1]))
+        return int(dfn.loc[dfn['dist'].idxmin()][NODE_UP])
+
+    src, tgt = closest_node(start_coord), closest_node(end_coord)
+    if not nx.has_path(G, src, tgt):
+        return []
+    route = []
+    for n in nx.dijkstra_path(G, src, tgt, weight='weight'):
+        rec = nodes[nodes[NODE_UP] == n].iloc[0]
+        route.append([float(rec['start_lat']), float(rec['start_lon'])])
+    return route
+
+
+def _requetes(position, n, seed=0):
+    rng = np.random.default_rng(seed)
+    noeuds = sorted(position)
+    return [tuple(rng.choice(noeuds, 2, replace=False).tolist()) for _ in range(n)]
+
+
+def _graphes(edges_file, nodes_file):
+    csr = RouteGraph.from_files(edges_file, nodes_file, backend='csr')
+    return {'csr': csr, 'networkx': RouteGraph.from_files(edges_file, nodes_file, backend='networkx'),
+            'hierarchie': RouteGraph(csr.G, csr.index, ContractionHierarchy.build(csr.G))}
+
+
+@pytest.mark.parametrize('moteur', ['csr', 'networkx', 'hierarchie'])
+def test_route_identique_a_la_version_d_origine(reseau, moteur):
+    edges_file, nodes_file, position = reseau
+    graphe = _graphes(edges_file, nodes_file)[moteur]
+    for u, v in _requetes(position, 20) + [(1000, 5000)]:
+        attendu = route_d_origine(edges_file, nodes_file, position[u], position[v])
+        obtenu = graphe.route(position[u], position[v])
+        assert len(obtenu) == len(attendu)
+        np.testing.assert_allclose(np.array(obtenu).reshape(-1, 2), np.array(attendu).reshape(-1, 2))
+
+
+def test_astar_identique_a_dijkstra(reseau):
+    edges_file, nodes_file, position = reseau
+    G = CSRGraph.from_edges(pd.read_csv(edges_file), pd.read_csv(nodes_file))
+    assert G.cost_per_km > 0  # sinon A* se réduit à Dijkstra et le test ne vérifie rien
+    for u, v in _requetes(position, 50, seed=1):
+        chemin_a, cout_a = G.shortest_path(u, v, method='astar')
+        chemin_d, cout_d = G.shortest_path(u, v, method='dijkstra')
+        assert chemin_a == chemin_d
+        assert cout_a == pytest.approx(cout_d)
+
+
+@pytest.mark.parametrize('moteur', ['csr', 'networkx', 'hierarchie'])
+def test_matrice_identique_aux_chemins(reseau, moteur):
+    edges_file, nodes_file, position = reseau
+    graphe = _graphes(edges_file, nodes_file)[moteur]
+    noeuds = sorted(position)
+    sources, cibles = noeuds[::7] + [None, 42], noeuds[3::11]
+    couts, emissions = graphe.node_cost_matrix(sources, cibles, co2=True)
+    co2 = nx.Graph()
+    for r in pd.read_csv(edges_file).itertuples(index=False):
+        co2.add_edge(r[0], r[1], co2=r[3])
+    for i, s in enumerate(sources):
+        for j, t in enumerate(cibles):
+            chemin, cout = graphe.shortest_path(s, t) if s is not None else (None, None)
+            if chemin is None:
+                assert couts[i, j] == np.inf
+                continue
+            assert couts[i, j] == pytest.approx(cout)
+            if emissions is not None:
+                attendu = sum(co2.edges[a, b]['co2'] for a, b in zip(chemin, chemin[1:]))
+                assert emissions[i, j] == pytest.approx(attendu)
+    assert (emissions is None) == (moteur == 'networkx')